@@ -1,25 +1,497 @@
 import sys
+import argparse
+import bisect
+import time
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QLabel, QLineEdit, QPushButton, QComboBox, QTabWidget, 
-                             QGroupBox, QFormLayout, QDateEdit, QTableWidget, 
-                             QTableWidgetItem, QHeaderView)
+                             QGroupBox, QFormLayout, QDateEdit, QTableView, QHeaderView, QCheckBox,
+                             QFileDialog, QProgressBar, QSizePolicy)
 from PyQt5.QtChart import QChart, QChartView, QLineSeries, QValueAxis
 from PyQt5 import QtGui
-from PyQt5.QtCore import Qt, QDate
-from PyQt5.QtGui import QFont, QColor, QPainter
+from PyQt5.QtCore import (Qt, QDate, QAbstractTableModel, QModelIndex, QPointF, QTimer, QObject, QThread,
+                          QMetaObject, QSize, pyqtSignal, pyqtSlot)
+from PyQt5.QtGui import QFont, QColor, QPainter, QImage, QPixmap
 import numpy as np
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.figure import Figure
 
+from bmi_charts import ANIMATION_LIMIT, CHART_DELAY_MS, TREND_POINTS, ChartData
+from bmi_engine import UNITS, WHO, bmi as compute_bmi, ideal_weight
+from bmi_history import HistoryColumns
+from bmi_import import import_file
+from bmi_store import PAGE_SIZE, STORE_PATH, MeasurementStore, key_of, matches, row_keys
+
+
+class HistoryTableModel(QAbstractTableModel):
+    """History rows read straight from HistoryColumns.
+
+    The view only asks for the rows it is drawing, so nothing is built per
+    row up front. Sorting keeps a permutation of row numbers (read backwards
+    for descending order) instead of reordering the data.
+
+    With a MeasurementStore the columns hold only the rows loaded so far:
+    one page of the current filter and sort order at first, and the next
+    page whenever the view scrolls to the end (canFetchMore/fetchMore).
+    Sorting and filtering re-query the store. After another connection has
+    written (an import), refresh_request() describes the re-read and
+    refresh_rows() takes its result, read off the UI thread, in place.
+    """
+
+    COLUMNS = ["date", "name", "age", "gender", "bmi", "category"]
+    HEADERS = ["Date", "Name", "Age", "Gender", "BMI", "Category"]
+
+    def __init__(self, history=None, category_color=None, store=None, parent=None):
+        super().__init__(parent)
+        self.history = history if history is not None else HistoryColumns()
+        self.category_color = category_color # bmi -> colour for the Category column
+        self._count = len(self.history)
+        self._order = None # Storage rows in ascending order of the sort column, or None
+        self._sort_column = -1
+        self._descending = False
+        self.store = store
+        self.filters = {} # name/start/end, as for MeasurementStore.query()
+        self._keys = [] # Store mode: keyset key of each loaded row, in view order
+        self._next = None # Store mode: None once every matching row is loaded
+        self.generation = 0 # Store mode: bumped whenever the loaded rows change, to drop stale refreshes
+        if store is not None:
+            self._sort_column = self.COLUMNS.index("date")
+            self._descending = True
+            self._load()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def storage_row(self, row):
+        # View row -> HistoryColumns row
+        if self._order is None:
+            return row
+        if self.store is not None:
+            return int(self._order[row]) # Loaded in view order already
+        return int(self._order[self._count - 1 - row] if self._descending else self._order[row])
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        name = self.COLUMNS[index.column()]
+        if role == Qt.DisplayRole:
+            value = self.history.value(self.storage_row(index.row()), name)
+            return f"{value:.1f}" if name == "bmi" else str(value)
+        if role == Qt.ForegroundRole and name == "category" and self.category_color:
+            return QColor(self.category_color(self.history.value(self.storage_row(index.row()), "bmi")))
+        if role == Qt.TextAlignmentRole and name in ("age", "bmi"):
+            return Qt.AlignRight | Qt.AlignVCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        return self.HEADERS[section] if orientation == Qt.Horizontal else str(section + 1)
+
+    # --- store mode ---
+
+    def _store_order(self):
+        return self.COLUMNS[self._sort_column] if self._sort_column >= 0 else "date"
+
+    def _load(self, rows=PAGE_SIZE):
+        # Replace the loaded rows with the first `rows` of the current query
+        self.generation += 1
+        self.beginResetModel()
+        self.history = HistoryColumns()
+        self._order = None
+        self._keys = []
+        self._count = 0
+        self._take(*self._query(rows))
+        self.endResetModel()
+
+    def _query(self, rows):
+        # The next `rows` measurements after the loaded ones
+        return self.store.query(**self.filters, order=self._store_order(), descending=self._descending,
+                                limit=rows, after=self._keys[-1] if self._keys else None)
+
+    def _take(self, page, next_key):
+        self.history.extend({name: page[name] for name in self.COLUMNS})
+        if self._order is not None:
+            self._order = np.concatenate([self._order, np.arange(self._count, len(self.history))])
+        self._keys.extend(row_keys(page, self._store_order()))
+        self._count = len(self.history)
+        self._next = next_key
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return self.store is not None and not parent.isValid() and self._next is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        page, next_key = self._query(PAGE_SIZE)
+        self.generation += 1
+        if len(page["id"]):
+            self.beginInsertRows(QModelIndex(), self._count, self._count + len(page["id"]) - 1)
+            self._take(page, next_key)
+            self.endInsertRows()
+        else:
+            self._next = None
+
+    def set_filters(self, **filters):
+        """Show only measurements matching name/start/end (None for no filter)."""
+        self.filters = {key: value for key, value in filters.items() if value is not None}
+        self._load()
+
+    def reload(self):
+        # Re-read the loaded rows, after someone else (an import) wrote to the store
+        self._load(max(self._count, PAGE_SIZE))
+
+    def refresh_request(self):
+        """(generation, MeasurementStore.query() arguments) to re-read the loaded rows elsewhere."""
+        return self.generation, dict(self.filters, order=self._store_order(), descending=self._descending,
+                                     limit=max(self._count, PAGE_SIZE))
+
+    def refresh_rows(self, generation, page, next_key):
+        """Show a page read for refresh_request(), unless the loaded rows changed since.
+
+        Rows are replaced in place (inserted or removed only at the end), so
+        the view keeps its scroll position and selection.
+        """
+        if generation != self.generation:
+            return
+        count = len(page["id"])
+        history = HistoryColumns()
+        history.extend({name: page[name] for name in self.COLUMNS})
+
+        def take():
+            self.history = history
+            self._order = None
+            self._keys = row_keys(page, self._store_order())
+            self._count = count
+            self._next = next_key
+
+        if count > self._count:
+            self.beginInsertRows(QModelIndex(), self._count, count - 1)
+            take()
+            self.endInsertRows()
+        elif count < self._count:
+            self.beginRemoveRows(QModelIndex(), count, self._count - 1)
+            take()
+            self.endRemoveRows()
+        else:
+            take()
+        if count:
+            self.dataChanged.emit(self.index(0, 0), self.index(count - 1, len(self.COLUMNS) - 1))
+
+    # ---
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if self.store is not None:
+            # The store pages through in the requested order (column -1: newest first)
+            self._sort_column = column
+            self._descending = order == Qt.DescendingOrder if column >= 0 else True
+            self._load()
+            return
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        rows = [self.storage_row(index.row()) for index in persistent]
+        self._sort_column = column
+        self._descending = order == Qt.DescendingOrder
+        self._order = self.history.argsort(self.COLUMNS[column]) if column >= 0 else None
+        if persistent:
+            # Keep selections and the current cell on the same measurements
+            position = np.arange(self._count)
+            if self._order is not None:
+                position[self._order] = np.arange(self._count)
+                if self._descending:
+                    position = self._count - 1 - position
+            self.changePersistentIndexList(persistent, [self.index(int(position[row]), index.column())
+                                                        for row, index in zip(rows, persistent)])
+        self.layoutChanged.emit()
+
+    def append_row(self, **row):
+        """Add one measurement; O(1) unsorted, a binary search for its place when sorted.
+
+        In store mode it is committed to the store, and shown if it passes the
+        filters and sorts among the rows loaded so far (otherwise it arrives
+        with a later page); returns its id.
+        """
+        if self.store is not None:
+            self.store.add(**row)
+            row["id"] = self.store.flush()
+            self.generation += 1
+            if not matches(row, **self.filters):
+                return row["id"]
+            key = key_of(row, self._store_order())
+            if self._descending:
+                view_row = bisect.bisect_left(self._keys, True, key=lambda other: other < key)
+            else:
+                view_row = bisect.bisect_left(self._keys, True, key=lambda other: other > key)
+            if view_row == self._count and self._next is not None:
+                return row["id"]
+            self.beginInsertRows(QModelIndex(), view_row, view_row)
+            index = self.history.append(**row)
+            order = self._order if self._order is not None else np.arange(index)
+            self._order = np.insert(order, view_row, index)
+            self._keys.insert(view_row, key)
+            self._count += 1
+            self.endInsertRows()
+            return row["id"]
+        index = self.history.append(**row)
+        if self._order is None:
+            position = view_row = self._count
+        else:
+            name = self.COLUMNS[self._sort_column]
+            position = bisect.bisect_right(self._order, self.history.value(index, name),
+                                           key=lambda i: self.history.value(i, name))
+            view_row = self._count - position if self._descending else position
+        self.beginInsertRows(QModelIndex(), view_row, view_row)
+        if self._order is not None:
+            self._order = np.insert(self._order, position, index)
+        self._count += 1
+        self.endInsertRows()
+
+    def extend_rows(self, columns):
+        """Add many measurements at once (a dict of equal-length columns)."""
+        count = len(next(iter(columns.values())))
+        if not count:
+            return
+        if self.store is not None:
+            # Committed in batches, then the loaded rows are re-read in order
+            self.store.add_many(columns)
+            self._load(max(self._count, PAGE_SIZE))
+        elif self._order is None:
+            self.beginInsertRows(QModelIndex(), self._count, self._count + count - 1)
+            self.history.extend(columns)
+            self._count += count
+            self.endInsertRows()
+        else:
+            self.beginResetModel()
+            self.history.extend(columns)
+            self._count += count
+            self._order = self.history.argsort(self.COLUMNS[self._sort_column])
+            self.endResetModel()
+
+
+IMPORT_CHUNK_ROWS = 10_000
+IMPORT_REFRESH_MS = 1000 # The History table and charts are redrawn at most this often during an import
+
+
+class ImportWorker(QObject):
+    """Runs bmi_import.import_file() on a QThread, with its own connection to the store.
+
+    The window only hears about finished chunks (queued across threads), so
+    parsing, validation and database writes never run on the UI thread.
+    """
+
+    progress = pyqtSignal(int, int) # Rows done, total rows (0 if unknown)
+    chunk_imported = pyqtSignal(object) # Columns of the valid rows just written
+    finished = pyqtSignal(object) # Summary from import_file()
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, store_path, units, wal=None):
+        super().__init__()
+        self.path = path
+        self.store_path = store_path
+        self.units = units
+        self.wal = wal
+        self._stop = False
+
+    def stop(self):
+        # Checked between chunks; rows already imported stay
+        self._stop = True
+
+    def run(self):
+        store = MeasurementStore(self.store_path, wal=self.wal)
+        try:
+            # Small chunks: pandas holds the GIL for a whole chunk at a time, which the UI thread would feel
+            summary = import_file(self.path, store, self.units, chunk_rows=IMPORT_CHUNK_ROWS,
+                                  on_chunk=self.chunk_imported.emit,
+                                  on_progress=lambda done, total: self.progress.emit(done, total or 0),
+                                  should_stop=lambda: self._stop)
+        except Exception as error:
+            self.failed.emit(str(error))
+        else:
+            self.finished.emit(summary)
+        finally:
+            store.close()
+
+
+class StoreWorker(QObject):
+    """Reads the store and prepares chart points on a QThread, with its own connection.
+
+    The window asks with queued signals and gets back ready-made results: a
+    page of History rows (page_ready), or the trend's display points and the
+    distribution chart as an image (chart_ready). New measurements, typed or
+    imported, are merged into the trend and downsampled here, and the
+    Matplotlib figure is drawn here with Agg, so the UI thread only shows them.
+    """
+
+    page_ready = pyqtSignal(int, object, object) # Generation, page, next key (for HistoryTableModel.refresh_rows)
+    chart_ready = pyqtSignal(object) # Dict of what update_charts() draws
+
+    def __init__(self, store_path, wal=None):
+        super().__init__()
+        self.store_path = store_path
+        self.wal = wal
+        self.store = None # Opened in the worker thread; SQLite connections stay in their thread
+        self.chart_data = ChartData()
+        self.filters = None # Filters the chart data was loaded with; None until the charts are first shown
+        self.last_id = 0 # Newest row in the loaded chart data; rows up to it are in already
+        self.publish_timer = None
+        self.published = 0.0 # time.monotonic() of the last chart_ready
+        self.figure = Figure(figsize=(5, 4), dpi=100)
+        FigureCanvasAgg(self.figure)
+        self.category_bars = None # (labels, bar artists) drawn on the figure
+        self.bars_size = (500, 400, 1.0) # Width, height and device pixel ratio of the widget showing the figure
+        self.bars_stale = False
+
+    def _open(self):
+        if self.store is None:
+            self.store = MeasurementStore(self.store_path, wal=self.wal)
+            self.publish_timer = QTimer()
+            self.publish_timer.setSingleShot(True)
+            self.publish_timer.timeout.connect(self.publish)
+        return self.store
+
+    def query(self, generation, arguments):
+        page, next_key = self._open().query(**arguments)
+        self.page_ready.emit(generation, page, next_key)
+
+    def load_charts(self, filters):
+        # Start the charts over for these filters, from one consistent read of the store:
+        # the category counts are a GROUP BY, the trend comes from an index
+        store = self._open()
+        with store.snapshot():
+            self.last_id = store.last_id()
+            counts = store.band_counts(WHO.thresholds, **filters)
+            dates, bmis = store.trend(**filters)
+        self.filters = filters
+        self.chart_data.load(dates, bmis, counts)
+        self.publish()
+
+    def resize_bars(self, width, height, ratio):
+        # The distribution chart's widget changed size: draw the figure again at the new size
+        self._open()
+        self.bars_size = (width, height, ratio)
+        self.bars_stale = True
+        if self.filters is not None:
+            self._schedule()
+
+    def add_rows(self, columns):
+        """Merge newly stored rows (columns with 'id', 'date', 'name', 'bmi') into the charts."""
+        if self.filters is None:
+            return # Read from the store when the charts are first shown
+        keep = matches(columns, **self.filters) & (np.asarray(columns["id"]) > self.last_id)
+        if keep.any():
+            self.chart_data.add(columns["date"][keep], columns["bmi"][keep])
+            self._schedule()
+
+    def _schedule(self):
+        # Rows arriving close together are published once, and an import's chunks at most every IMPORT_REFRESH_MS
+        if not self.publish_timer.isActive():
+            wait = IMPORT_REFRESH_MS - (time.monotonic() - self.published) * 1e3
+            self.publish_timer.start(int(max(wait, CHART_DELAY_MS)))
+
+    def publish(self):
+        self.published = time.monotonic()
+        result = {"filters": self.filters}
+        change = self.chart_data.refresh()
+        if change != "none":
+            x, y = self.chart_data.display_points(TREND_POINTS)
+            result["trend"] = {"change": change, "x": x, "y": y, "size": len(self.chart_data.trend),
+                               "max_bmi": self.chart_data.max_bmi}
+        if change != "none" or self.bars_stale:
+            result["bars"] = self._draw_bars()
+        if len(result) > 1:
+            self.chart_ready.emit(result)
+
+    def _draw_bars(self):
+        # The distribution chart as a QImage (None when nothing matches), from the running category counts
+        self.bars_stale = False
+        labels, counts, colors = self.chart_data.categories()
+        if not labels:
+            self.figure.clear()
+            self.category_bars = None
+            return None
+        width, height, ratio = self.bars_size
+        pixels = (max(int(width * ratio), 1), max(int(height * ratio), 1))
+        if tuple(self.figure.canvas.get_width_height()) != pixels:
+            self.figure.set_size_inches(pixels[0] / self.figure.dpi, pixels[1] / self.figure.dpi)
+            self.category_bars = None # Lay the figure out again for the new size
+        if self.category_bars is not None and self.category_bars[0] == labels:
+            # Same categories as drawn: just change the bar heights
+            for bar, count in zip(self.category_bars[1], counts):
+                bar.set_height(count)
+            ax = self.figure.axes[0]
+            ax.relim()
+            ax.autoscale_view()
+        else:
+            self.figure.clear()
+            ax = self.figure.add_subplot(111)
+            self.category_bars = (labels, ax.bar(labels, counts, color=colors))
+            ax.set_title("BMI Category Distribution")
+            ax.set_ylabel("Count")
+            ax.tick_params(axis='x', rotation=45)
+            self.figure.tight_layout()
+        self.figure.canvas.draw()
+        width, height = self.figure.canvas.get_width_height()
+        # QImage is safe to build off the UI thread (QPixmap is not); copy() detaches it from the Agg buffer
+        image = QImage(bytes(self.figure.canvas.buffer_rgba()), width, height, QImage.Format_RGBA8888).copy()
+        image.setDevicePixelRatio(ratio)
+        return image
+
+    @pyqtSlot()
+    def close(self):
+        if self.store is not None:
+            self.publish_timer.stop()
+            self.store.close()
+            self.store = None
+
+
+class ChartImage(QLabel):
+    """Shows a chart drawn elsewhere (StoreWorker), and says when it needs one of a new size."""
+
+    resized = pyqtSignal(int, int, float) # Width, height, device pixel ratio
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAlignment(Qt.AlignCenter)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+
+    def sizeHint(self):
+        return QSize(500, 400) # The old FigureCanvas's 5x4 inches at 100 dpi
+
+    def minimumSizeHint(self):
+        return QSize(100, 80) # Not the image's size: the image follows the widget, not the reverse
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.resized.emit(event.size().width(), event.size().height(), self.devicePixelRatioF())
+
 
 class AdvancedBMICalculator(QMainWindow):
-    def __init__(self):
+    chart_requested = pyqtSignal(object) # Filters to load the charts for
+    rows_added = pyqtSignal(object) # Columns of rows just stored, for the charts
+    page_requested = pyqtSignal(int, object) # HistoryTableModel.refresh_request()
+
+    def __init__(self, store=None):
         super().__init__()
         self.setWindowTitle("Advanced BMI Calculator")
         self.setGeometry(100, 100, 900, 700)
         
-        # Initialize data storage
-        self.history_data = []
+        # Initialize data storage: measurements persist in SQLite, only the visible page is loaded
+        self.store = store if store is not None else MeasurementStore()
+        self.history_model = HistoryTableModel(category_color=lambda bmi: self.get_bmi_category(bmi)[1],
+                                               store=self.store)
+        
+        # Reads for the charts and History refreshes run on their own thread and connection
+        self.store_thread = QThread(self)
+        self.store_worker = StoreWorker(self.store.path, self.store.wal)
+        self.store_worker.moveToThread(self.store_thread)
+        self.chart_requested.connect(self.store_worker.load_charts)
+        self.rows_added.connect(self.store_worker.add_rows)
+        self.page_requested.connect(self.store_worker.query)
+        self.store_worker.page_ready.connect(self.history_model.refresh_rows)
+        self.store_worker.chart_ready.connect(self.chart_ready)
+        self.store_thread.start()
         
         # Create main widget and layout
         self.main_widget = QWidget()
@@ -36,6 +508,14 @@ class AdvancedBMICalculator(QMainWindow):
         self.create_history_tab()
         self.create_analysis_tab()
         self.create_about_tab()
+        self.category_image.resized.connect(self.store_worker.resize_bars)
+        
+        # Charts are only redrawn when visible, and many updates close together are drawn once
+        self.chart_timer = QTimer(self)
+        self.chart_timer.setSingleShot(True)
+        self.chart_timer.setInterval(CHART_DELAY_MS)
+        self.chart_timer.timeout.connect(self.update_charts)
+        self.tabs.currentChanged.connect(self.schedule_chart_update)
         
         # Apply styles
         self.apply_styles()
@@ -91,7 +571,7 @@ class AdvancedBMICalculator(QMainWindow):
                 border-radius: 4px;
                 font-size: 14px;
             }
-            QTableWidget {
+            QTableView {
                 border: 1px solid #d4d4d4;
                 font-size: 14px;
             }
@@ -108,7 +588,8 @@ class AdvancedBMICalculator(QMainWindow):
         unit_group = QGroupBox("Units")
         unit_layout = QHBoxLayout()
         self.unit_combo = QComboBox()
-        self.unit_combo.addItems(["Metric (kg, cm)", "Imperial (lbs, inches)"])
+        for key, unit in UNITS.items():
+            self.unit_combo.addItem(unit.label, key)
         unit_layout.addWidget(QLabel("Measurement System:"))
         unit_layout.addWidget(self.unit_combo)
         unit_layout.addStretch()
@@ -189,11 +670,65 @@ class AdvancedBMICalculator(QMainWindow):
         layout = QVBoxLayout()
         self.history_tab.setLayout(layout)
         
-        # History table
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(6)
-        self.history_table.setHorizontalHeaderLabels(["Date", "Name", "Age", "Gender", "BMI", "Category"])
+        # Filters: one person and/or a date range, answered from the store's indexes
+        filter_layout = QHBoxLayout()
+        self.name_filter = QLineEdit()
+        self.name_filter.setPlaceholderText("Name")
+        self.name_filter.returnPressed.connect(self.apply_history_filter)
+        self.date_filter = QCheckBox("From")
+        self.start_filter = QDateEdit()
+        self.start_filter.setCalendarPopup(True)
+        self.start_filter.setDate(QDate.currentDate().addYears(-1))
+        self.end_filter = QDateEdit()
+        self.end_filter.setCalendarPopup(True)
+        self.end_filter.setDate(QDate.currentDate())
+        apply_button = QPushButton("Filter")
+        apply_button.clicked.connect(self.apply_history_filter)
+        clear_button = QPushButton("Clear")
+        clear_button.clicked.connect(self.clear_history_filter)
+        filter_layout.addWidget(self.name_filter)
+        filter_layout.addWidget(self.date_filter)
+        filter_layout.addWidget(self.start_filter)
+        filter_layout.addWidget(QLabel("to"))
+        filter_layout.addWidget(self.end_filter)
+        filter_layout.addWidget(apply_button)
+        filter_layout.addWidget(clear_button)
+        layout.addLayout(filter_layout)
+        
+        # Bulk import from CSV/Excel/Parquet, run in the background
+        import_layout = QHBoxLayout()
+        self.import_units = QComboBox()
+        for key, unit in UNITS.items():
+            self.import_units.addItem(unit.label, key)
+        self.import_button = QPushButton("Import File...")
+        self.import_button.clicked.connect(self.start_import)
+        self.import_progress = QProgressBar()
+        self.import_progress.hide()
+        self.cancel_import_button = QPushButton("Cancel")
+        self.cancel_import_button.clicked.connect(self.cancel_import)
+        self.cancel_import_button.hide()
+        self.import_status = QLabel()
+        import_layout.addWidget(self.import_units)
+        import_layout.addWidget(self.import_button)
+        import_layout.addWidget(self.import_progress)
+        import_layout.addWidget(self.cancel_import_button)
+        import_layout.addWidget(self.import_status, 1)
+        layout.addLayout(import_layout)
+        self.import_thread = None
+        self.import_refresh_timer = QTimer(self)
+        self.import_refresh_timer.setSingleShot(True)
+        self.import_refresh_timer.setInterval(IMPORT_REFRESH_MS)
+        self.import_refresh_timer.timeout.connect(self.import_refresh)
+        
+        # History table: a view over the model, sortable by clicking a header
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
         self.history_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.history_table.horizontalHeader().setSortIndicator(0, Qt.DescendingOrder)
+        self.history_table.setSortingEnabled(True)
+        # Fixed row heights, so Qt never measures rows it isn't drawing
+        self.history_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.history_table.verticalHeader().setDefaultSectionSize(24)
         
         layout.addWidget(self.history_table)
         
@@ -211,18 +746,39 @@ class AdvancedBMICalculator(QMainWindow):
         self.chart_view = QChartView()
         self.chart_view.setRenderHint(QPainter.Antialiasing)
         
+        # The chart, series and axes are built once; update_charts() only feeds them points
+        self.trend_chart = QChart()
+        self.trend_chart.setTitle("BMI Trend Over Time")
+        self.trend_series = QLineSeries()
+        self.trend_series.setName("BMI")
+        self.trend_chart.addSeries(self.trend_series)
+        
+        self.axis_x = QValueAxis()
+        self.axis_x.setTitleText("Measurements")
+        self.axis_x.setLabelFormat("%d")
+        self.axis_y = QValueAxis()
+        self.axis_y.setTitleText("BMI")
+        self.axis_y.setRange(10, 50)
+        
+        self.trend_chart.addAxis(self.axis_x, Qt.AlignBottom)
+        self.trend_chart.addAxis(self.axis_y, Qt.AlignLeft)
+        self.trend_series.attachAxis(self.axis_x)
+        self.trend_series.attachAxis(self.axis_y)
+        self.chart_view.setChart(self.trend_chart)
+        self.chart_filters = None # The filters the charts were requested for; None until first shown
+        self.chart_result = None # Latest StoreWorker result not drawn yet
+        
         chart_layout.addWidget(self.chart_view)
         chart_group.setLayout(chart_layout)
         layout.addWidget(chart_group)
         
-        # BMI Distribution Chart (Matplotlib)
+        # BMI Distribution Chart (Matplotlib, drawn by the StoreWorker and shown as an image)
         dist_group = QGroupBox("BMI Distribution")
         dist_layout = QVBoxLayout()
         
-        self.figure = Figure(figsize=(5, 4), dpi=100)
-        self.canvas = FigureCanvas(self.figure)
+        self.category_image = ChartImage()
         
-        dist_layout.addWidget(self.canvas)
+        dist_layout.addWidget(self.category_image)
         dist_group.setLayout(dist_layout)
         layout.addWidget(dist_group)
         
@@ -277,23 +833,15 @@ class AdvancedBMICalculator(QMainWindow):
             return
             
         # Calculate BMI based on selected units
-        if self.unit_combo.currentText() == "Metric (kg, cm)":
-            bmi = weight / ((height / 100) ** 2)
-        else:  # Imperial
-            bmi = (weight / (height ** 2)) * 703
+        units = self.unit_combo.currentData()
+        bmi = compute_bmi(weight, height, units)
             
         # Determine category
         category, color = self.get_bmi_category(bmi)
         
         # Calculate ideal weight range
-        if self.unit_combo.currentText() == "Metric (kg, cm)":
-            min_ideal = 18.5 * ((height / 100) ** 2)
-            max_ideal = 24.9 * ((height / 100) ** 2)
-            ideal_range = f"{min_ideal:.1f} - {max_ideal:.1f} kg"
-        else:
-            min_ideal = (18.5 * (height ** 2)) / 703
-            max_ideal = (24.9 * (height ** 2)) / 703
-            ideal_range = f"{min_ideal:.1f} - {max_ideal:.1f} lbs"
+        min_ideal, max_ideal = ideal_weight(height, units)
+        ideal_range = f"{min_ideal:.1f} - {max_ideal:.1f} {UNITS[units].weight}"
             
         # Get recommendation
         recommendation = self.get_recommendation(bmi, age, gender)
@@ -307,30 +855,12 @@ class AdvancedBMICalculator(QMainWindow):
         # Show results
         self.result_group.show()
         
-        # Add to history
+        # Add to history (the charts follow when the background reader has merged it)
         self.add_to_history(date, name, age, gender, bmi, category)
         
-        # Update charts
-        self.update_charts()
-        
     def get_bmi_category(self, bmi):
-        if bmi < 16:
-            return "Severe Thinness", "#3498db"
-        elif bmi < 17:
-            return "Moderate Thinness", "#5dade2"
-        elif bmi < 18.5:
-            return "Mild Thinness", "#85c1e9"
-        elif bmi < 25:
-            return "Normal range", "#2ecc71"
-        elif bmi < 30:
-            return "Overweight", "#f39c12"
-        elif bmi < 35:
-            return "Obese Class I", "#e67e22"
-        elif bmi < 40:
-            return "Obese Class II", "#d35400"
-        else:
-            return "Obese Class III", "#c0392b"
-            
+        return WHO.category(bmi)
+        
     def get_recommendation(self, bmi, age, gender):
         if bmi < 18.5:
             return "You are underweight. Consider consulting a nutritionist for a healthy weight gain plan."
@@ -342,81 +872,77 @@ class AdvancedBMICalculator(QMainWindow):
             return "You are in the obesity range. Consult with a healthcare provider for a weight management plan."
             
     def add_to_history(self, date, name, age, gender, bmi, category):
-        # Add to data storage
-        self.history_data.append({
-            "date": date,
-            "name": name,
-            "age": age,
-            "gender": gender,
-            "bmi": bmi,
-            "category": category
-        })
-        
-        # Update table
-        self.history_table.setRowCount(len(self.history_data))
-        for row, entry in enumerate(self.history_data):
-            self.history_table.setItem(row, 0, QTableWidgetItem(entry["date"]))
-            self.history_table.setItem(row, 1, QTableWidgetItem(entry["name"]))
-            self.history_table.setItem(row, 2, QTableWidgetItem(str(entry["age"])))
-            self.history_table.setItem(row, 3, QTableWidgetItem(entry["gender"]))
-            self.history_table.setItem(row, 4, QTableWidgetItem(f"{entry['bmi']:.1f}"))
-            self.history_table.setItem(row, 5, QTableWidgetItem(entry["category"]))
+        # The model stores the row and tells the view; the background reader updates the charts
+        row_id = self.history_model.append_row(date=date, name=name, age=age, gender=gender, bmi=bmi,
+                                               category=category)
+        self.rows_added.emit({"id": np.array([row_id]), "date": np.array([date], dtype="datetime64[D]"),
+                              "name": np.array([name], dtype=object), "bmi": np.array([bmi], dtype=float)})
             
-    def update_charts(self):
-        if not self.history_data:
-            return
+    def apply_history_filter(self):
+        name = self.name_filter.text().strip() or None
+        start = end = None
+        if self.date_filter.isChecked():
+            start = self.start_filter.date().toString("yyyy-MM-dd")
+            end = self.end_filter.date().toString("yyyy-MM-dd")
+        self.history_model.set_filters(name=name, start=start, end=end)
+        self.schedule_chart_update()
+        
+    def clear_history_filter(self):
+        self.name_filter.clear()
+        self.date_filter.setChecked(False)
+        self.apply_history_filter()
             
-        # Update BMI trend chart
-        chart = QChart()
-        chart.setTitle("BMI Trend Over Time")
-        chart.setAnimationOptions(QChart.SeriesAnimations)
-        
-        series = QLineSeries()
-        series.setName("BMI")
-        
-        # Sort data by date
-        sorted_data = sorted(self.history_data, key=lambda x: x["date"])
+    def schedule_chart_update(self, *args):
+        # (Re)start the timer: a burst of new measurements is drawn once
+        self.chart_timer.start()
+        
+    def chart_ready(self, result):
+        # A StoreWorker result: kept until the Analysis tab is shown
+        if result["filters"] != self.chart_filters:
+            return # Answer for filters changed since
+        pending = self.chart_result
+        if pending is not None:
+            if "trend" in result and "trend" in pending and pending["trend"]["change"] == "rebuilt":
+                result["trend"]["change"] = "rebuilt" # The undrawn one replaced the series; so must this
+            result = dict(pending, **result)
+        self.chart_result = result
+        self.schedule_chart_update()
         
-        for i, entry in enumerate(sorted_data):
-            series.append(i, entry["bmi"])
+    def update_charts(self):
+        if self.tabs.currentWidget() is not self.analysis_tab:
+            return # Drawn when the tab is opened
+        if self.chart_filters != self.history_model.filters:
+            # The charts follow the History filter; the background reader loads them and answers with chart_ready()
+            self.chart_filters = dict(self.history_model.filters)
+            self.chart_result = None
+            self.chart_requested.emit(self.chart_filters)
+            return
+        if self.chart_result is None:
+            return
+        result, self.chart_result = self.chart_result, None
             
-        chart.addSeries(series)
-        
-        # Create axes
-        axis_x = QValueAxis()
-        axis_x.setTitleText("Measurements")
-        axis_x.setLabelFormat("%d")
-        axis_x.setRange(0, len(sorted_data) - 1)
-        
-        axis_y = QValueAxis()
-        axis_y.setTitleText("BMI")
-        axis_y.setRange(10, 50 if max(entry["bmi"] for entry in sorted_data) < 40 else 60)
-        
-        chart.addAxis(axis_x, Qt.AlignBottom)
-        chart.addAxis(axis_y, Qt.AlignLeft)
-        series.attachAxis(axis_x)
-        series.attachAxis(axis_y)
-        
-        self.chart_view.setChart(chart)
-        
-        # Update BMI distribution chart
-        self.figure.clear()
-        ax = self.figure.add_subplot(111)
-        
-        bmis = [entry["bmi"] for entry in self.history_data]
-        categories = [self.get_bmi_category(bmi)[0] for bmi in bmis]
-        
-        unique_categories = sorted(set(categories), key=lambda x: np.mean([bmi for bmi, cat in zip(bmis, categories) if cat == x]))
-        category_counts = [categories.count(cat) for cat in unique_categories]
-        
-        colors = [self.get_bmi_category(np.mean([bmi for bmi, cat in zip(bmis, categories) if cat == c]))[1] for c in unique_categories]
-        
-        ax.bar(unique_categories, category_counts, color=colors)
-        ax.set_title("BMI Category Distribution")
-        ax.set_ylabel("Count")
-        ax.tick_params(axis='x', rotation=45)
-        self.figure.tight_layout()
-        self.canvas.draw()
+        # Update BMI trend chart: the points arrive merged and downsampled
+        trend = result.get("trend")
+        if trend is not None:
+            size, y = trend["size"], trend["y"]
+            shown = self.trend_series.count()
+            self.trend_chart.setAnimationOptions(
+                QChart.SeriesAnimations if size <= ANIMATION_LIMIT else QChart.NoAnimation)
+            if trend["change"] == "appended" and size <= TREND_POINTS:
+                # Every point is on the chart already; add just the new ones
+                for i in range(shown, size):
+                    self.trend_series.append(i, y[i])
+            else:
+                self.trend_series.replace([QPointF(a, b) for a, b in zip(trend["x"].tolist(), y.tolist())])
+            self.axis_x.setRange(0, max(size - 1, 1))
+            self.axis_y.setRange(10, 50 if trend["max_bmi"] < 40 else 60)
+        
+        # Update BMI distribution chart: already drawn, or None when nothing matches the filter
+        if "bars" in result:
+            if result["bars"] is None:
+                self.category_image.clear()
+            else:
+                self.category_image.setPixmap(QPixmap.fromImage(result["bars"]))
         
     def show_error(self, message):
         error_label = QLabel(f"<span style='color:red;'>{message}</span>")
@@ -438,10 +964,95 @@ class AdvancedBMICalculator(QMainWindow):
             self.main_layout.removeWidget(self.error_label)
             self.error_label.deleteLater()
             del self.error_label
+            
+    def start_import(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import Measurements", "",
+                                              "Measurements (*.csv *.txt *.xlsx *.xlsm *.xls *.parquet)")
+        if path:
+            self.run_import(path, self.import_units.currentData())
+            
+    def run_import(self, path, units="metric"):
+        # Anything typed so far is committed first, so both connections see the same data
+        self.store.flush()
+        self.import_thread = QThread(self)
+        self.import_worker = ImportWorker(path, self.store.path, units, self.store.wal)
+        self.import_worker.moveToThread(self.import_thread)
+        self.import_thread.started.connect(self.import_worker.run)
+        self.import_worker.progress.connect(self.import_progressed)
+        self.import_worker.chunk_imported.connect(self.store_worker.add_rows) # Straight to the chart merge
+        self.import_worker.chunk_imported.connect(self.import_chunk)
+        self.import_worker.finished.connect(self.import_finished)
+        self.import_worker.failed.connect(self.import_failed)
+        self.import_worker.finished.connect(self.import_thread.quit)
+        self.import_worker.failed.connect(self.import_thread.quit)
+        self.import_thread.finished.connect(self.import_worker.deleteLater)
+        self.import_thread.finished.connect(self.import_thread.deleteLater)
+        self.import_button.setEnabled(False)
+        self.import_progress.setRange(0, 0) # Busy until the first chunk
+        self.import_progress.show()
+        self.cancel_import_button.show()
+        self.import_status.setText(f"Importing {path}...")
+        self.import_thread.start()
+        
+    def cancel_import(self):
+        if self.import_thread is not None:
+            self.import_worker.stop()
+            
+    def import_progressed(self, done, total):
+        if total:
+            self.import_progress.setRange(0, total)
+            self.import_progress.setValue(min(done, total))
+        self.import_status.setText(f"{done:,} rows read")
+        
+    def import_chunk(self, columns):
+        # A chunk is in the store (and on its way to the charts); the History re-read waits for the refresh timer
+        if not self.import_refresh_timer.isActive():
+            self.import_refresh_timer.start()
+            
+    def import_refresh(self):
+        # Re-read the loaded History rows off the UI thread; they are swapped in when they arrive
+        self.page_requested.emit(*self.history_model.refresh_request())
+        
+    def import_finished(self, summary):
+        self.import_thread = None
+        self.import_refresh_timer.stop()
+        self.import_refresh()
+        self.import_button.setEnabled(True)
+        self.import_progress.hide()
+        self.cancel_import_button.hide()
+        text = f"Imported {summary['imported']:,} rows in {summary['seconds']:.1f} s"
+        if summary["cancelled"]:
+            text += " (cancelled)"
+        if summary["rejected"]:
+            line, message = summary["errors"][0]
+            text += f"; {summary['rejected']:,} rejected (line {line}: {message})"
+        self.import_status.setText(text)
+        
+    def import_failed(self, message):
+        self.import_finished({"imported": 0, "rejected": 0, "seconds": 0, "cancelled": False, "errors": []})
+        self.import_status.setText("")
+        self.show_error(f"Import failed: {message}")
+        
+    def closeEvent(self, event):
+        if self.import_thread is not None:
+            self.import_worker.stop()
+            self.import_thread.quit()
+            self.import_thread.wait()
+        QMetaObject.invokeMethod(self.store_worker, "close", Qt.BlockingQueuedConnection)
+        self.store_thread.quit()
+        self.store_thread.wait()
+        self.store.close()
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Advanced BMI Calculator")
+    parser.add_argument("--db", default=STORE_PATH, help="measurement database (default: %(default)s)")
+    parser.add_argument("--journal", choices=["auto", "wal", "delete"], default="auto",
+                        help="SQLite journal: WAL, a rollback journal (for a database on a network share), "
+                             "or auto, which picks the rollback journal for network paths (default: %(default)s)")
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
     
     # Set application font
     font = QFont()
@@ -449,6 +1060,7 @@ if __name__ == "__main__":
     font.setPointSize(10)
     app.setFont(font)
     
-    calculator = AdvancedBMICalculator()
+    wal = {"auto": None, "wal": True, "delete": False}[args.journal]
+    calculator = AdvancedBMICalculator(MeasurementStore(args.db, wal=wal))
     calculator.show()
     sys.exit(app.exec_())
\ No newline at end of file
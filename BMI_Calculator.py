@@ -4,6 +4,8 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
 
+from bmi_engine import BASIC, bmi as compute_bmi
+
 def calculate_bmi():
     try:
         # Get values from entries
@@ -14,26 +16,12 @@ def calculate_bmi():
         if weight <= 0 or height_feet <= 0:
             raise ValueError("Values must be positive")
         
-        # Convert height to meters
-        height_meters = height_feet * 0.3048
-        
-        # Calculate BMI
-        bmi = weight / (height_meters ** 2)
+        # Calculate BMI (kg and feet)
+        bmi = compute_bmi(weight, height_feet, "feet")
         bmi_rounded = round(bmi, 2)
         
         # Determine category
-        if bmi < 18.5:
-            category = "Underweight"
-            color = "#3498db"  # Blue
-        elif 18.5 <= bmi < 25:
-            category = "Normal Weight"
-            color = "#2ecc71"  # Green
-        elif 25 <= bmi < 30:
-            category = "Overweight"
-            color = "#f39c12"  # Orange
-        else:
-            category = "Obesity"
-            color = "#e74c3c"  # Red
+        category, color = BASIC.category(bmi)
         
         # Update result label
         result_text = f"BMI: {bmi_rounded}\nCategory: {category}"
@@ -57,10 +45,10 @@ def update_gauge(bmi):
     # Gauge parameters
     max_bmi = 40
     categories = ["Underweight", "Normal", "Overweight", "Obesity"]
-    colors = ["#3498db", "#2ecc71", "#f39c12", "#e74c3c"]
+    colors = BASIC.colors
     
     # Create gauge segments
-    segments = [18.5, 25, 30, max_bmi]
+    segments = BASIC.thresholds.tolist() + [max_bmi]
     start_angle = 90
     for i in range(len(segments)):
         end_angle = start_angle - (segments[i]/(max_bmi/180))
@@ -1,3 +1,5 @@
+from bmi_engine import BASIC, bmi as compute_bmi
+
 print("Welcome To My Restaurant")
 print("Please Enter Your Info")
 
@@ -44,25 +46,17 @@ while True:
     try:
         height_ft = float(height_ft)
         if height_ft > 0:
-            # Convert feet to meters (1 foot = 0.3048 meters)
-            height = height_ft * 0.3048
             break
         else:
             print("Height must be a positive number.")
     except ValueError:
         print("Please enter a valid number for height.")
 
-# Calculate BMI
-bmi = weight / (height ** 2)
+# Calculate BMI (kg and feet)
+bmi = compute_bmi(weight, height_ft, "feet")
 print(f"Your BMI is: {bmi:.2f}")
 
 # Optional: Give a BMI category
-if bmi < 18.5:
-    print("You are underweight.")
-elif 18.5 <= bmi < 25:
-    print("You have a normal weight.")
-elif 25 <= bmi < 30:
-    print("You are overweight.")
-else:
-    print("You are obese.")
+messages = ["You are underweight.", "You have a normal weight.", "You are overweight.", "You are obese."]
+print(messages[BASIC.band(bmi)])
 
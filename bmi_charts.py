@@ -0,0 +1,186 @@
+# Incremental chart data for the AdvancedBMICalculator Analysis tab
+#
+# update_charts() used to rebuild the trend chart from a freshly sorted
+# copy of the whole history and recount every category with nested list
+# comprehensions, on every calculation. ChartData keeps what the charts
+# show and only looks at rows added since the last refresh:
+#   - the trend (BMI in date order) grows by appending when new rows are
+#     dated on or after the last charted one, which is the usual case; an
+#     older date is merged in with one binary search and insert
+#   - category counts are running totals, updated per new row in O(1)
+#   - display_points() hands the chart at most TREND_POINTS points,
+#     downsampled with LTTB (lttb.py) so peaks survive
+#
+# The calculator keeps a ChartData on its background StoreWorker thread,
+# which coalesces refreshes with a short timer (a burst of new rows costs one
+# redraw) and sends the window only the display points; the window turns
+# chart animations off above ANIMATION_LIMIT points.
+#
+#   python bmi_charts.py --rows 1000000     # headless refresh timings
+
+import argparse
+import time
+
+import numpy as np
+
+from bmi_engine import WHO
+from lttb import lttb
+
+TREND_POINTS = 2000 # More than a chart a few hundred pixels wide can show
+ANIMATION_LIMIT = 500 # Series animations only below this many points
+CHART_DELAY_MS = 50 # Refreshes requested within this window are drawn once
+
+# The bands of AdvancedBMICalculator.get_bmi_category() (bmi_engine.WHO): upper bounds, labels, colours
+BAND_THRESHOLDS = WHO.thresholds
+BAND_LABELS = WHO.labels
+BAND_COLORS = WHO.colors
+
+
+class ChartData:
+    """Trend series and category counts, fed with add() and folded in by refresh()."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Forget everything charted, e.g. when the history filter changes
+        self.rows = 0 # Measurements already included
+        self.counts = np.zeros(len(BAND_LABELS), dtype=np.int64)
+        self._dates = np.empty(1024, dtype='datetime64[D]')
+        self._trend = np.empty(1024)
+        self._trend_size = 0
+        self._pending = []
+        self._reset = True
+        self.max_bmi = -np.inf
+
+    @property
+    def trend(self):
+        """BMIs in date order (ties in the order they were added)."""
+        return self._trend[:self._trend_size]
+
+    def load(self, dates, bmis, counts):
+        """Start over from a date-sorted trend and its per-band counts (e.g. MeasurementStore.band_counts())."""
+        self.reset()
+        self._push(np.asarray(dates, dtype='datetime64[D]'), np.asarray(bmis, dtype=float))
+        self.rows = self._trend_size
+        self.counts = np.asarray(counts, dtype=np.int64).copy()
+        if self._trend_size:
+            self.max_bmi = float(self.trend.max())
+
+    def add(self, dates, bmis):
+        """Queue one measurement or arrays of them for the next refresh()."""
+        self._pending.append((np.atleast_1d(np.asarray(dates, dtype='datetime64[D]')),
+                              np.atleast_1d(np.asarray(bmis, dtype=float))))
+
+    def _push(self, dates, bmis):
+        needed = self._trend_size + len(bmis)
+        if needed > len(self._trend):
+            capacity = max(needed, 2 * len(self._trend))
+            self._dates = np.resize(self._dates, capacity)
+            self._trend = np.resize(self._trend, capacity)
+        self._dates[self._trend_size:needed] = dates
+        self._trend[self._trend_size:needed] = bmis
+        self._trend_size = needed
+
+    def refresh(self):
+        """Take in the measurements added since the last call.
+
+        Returns 'none', 'appended' (the trend grew at the end) or 'rebuilt'
+        (after a reset, or an older date was merged into the middle).
+        """
+        if not self._pending and not self._reset:
+            return 'none'
+        dates = np.concatenate([dates for dates, _ in self._pending] or [np.array([], dtype='datetime64[D]')])
+        bmis = np.concatenate([bmis for _, bmis in self._pending] or [np.array([])])
+        self._pending = []
+        self.rows += len(bmis)
+        if not len(bmis):
+            # Nothing new; after a reset that still means the old chart must go
+            rebuilt, self._reset = self._reset, False
+            return 'rebuilt' if rebuilt else 'none'
+        self.counts += np.bincount(np.searchsorted(BAND_THRESHOLDS, bmis, side='right'),
+                                   minlength=len(BAND_LABELS))
+        self.max_bmi = max(self.max_bmi, float(bmis.max()))
+
+        order = np.argsort(dates, kind='stable')
+        dates, bmis = dates[order], bmis[order]
+        charted = self._dates[:self._trend_size]
+        rebuilt, self._reset = self._reset, False
+        if not self._trend_size or dates[0] >= charted[-1]:
+            self._push(dates, bmis)
+            return 'rebuilt' if rebuilt else 'appended'
+        # Merge: each new point goes after the charted points with the same date
+        positions = np.searchsorted(charted, dates, side='right')
+        merged_dates = np.insert(charted, positions, dates)
+        merged_trend = np.insert(self.trend, positions, bmis)
+        self._trend_size = 0
+        self._push(merged_dates, merged_trend)
+        return 'rebuilt'
+
+    def display_points(self, max_points=TREND_POINTS):
+        # (x, y) for the trend chart: every point, or an LTTB selection of max_points
+        y = self.trend
+        keep = lttb(np.arange(len(y)), y, max_points)
+        return keep, y[keep]
+
+    def categories(self):
+        # (labels, counts, colours) of the bands that have any measurements, lowest BMI first
+        present = np.flatnonzero(self.counts)
+        return ([BAND_LABELS[i] for i in present], self.counts[present].tolist(),
+                [BAND_COLORS[i] for i in present])
+
+
+def _old_update(bmis, dates, get_bmi_category):
+    # The data work of the old update_charts(), without the widgets
+    sorted_data = sorted(zip(dates, bmis), key=lambda x: x[0])
+    points = [(i, bmi) for i, (_, bmi) in enumerate(sorted_data)]
+    categories = [get_bmi_category(bmi)[0] for bmi in bmis]
+    unique_categories = sorted(set(categories), key=lambda x: np.mean([bmi for bmi, cat in zip(bmis, categories)
+                                                                       if cat == x]))
+    counts = [categories.count(cat) for cat in unique_categories]
+    return points, counts
+
+
+def main():
+    from bmi_history import _synthetic_rows
+
+    parser = argparse.ArgumentParser(description="Time chart refreshes on a large history.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rows = _synthetic_rows(args.rows)
+    rows['date'] = np.sort(rows['date'])
+    data = ChartData()
+
+    start = time.perf_counter()
+    data.add(rows['date'], rows['bmi'])
+    data.refresh()
+    data.display_points()
+    print(f"{len(rows['bmi']):,} rows")
+    print(f"  first refresh + downsample:   {(time.perf_counter() - start) * 1e3:9.1f} ms")
+
+    start = time.perf_counter()
+    data.add(rows['date'][-1], 31.0)
+    data.refresh()
+    data.display_points()
+    print(f"  one new row (append + LTTB):  {(time.perf_counter() - start) * 1e3:9.1f} ms")
+
+    start = time.perf_counter()
+    data.add('2000-01-01', 22.0)
+    data.refresh()
+    data.display_points()
+    print(f"  one back-dated row (merge):   {(time.perf_counter() - start) * 1e3:9.1f} ms")
+
+    sample = min(len(rows['bmi']), 20_000)
+    start = time.perf_counter()
+    _old_update(rows['bmi'][:sample].tolist(), rows['date'][:sample].tolist(), WHO.category)
+    old_ms = (time.perf_counter() - start) * 1e3
+    print(f"  old update_charts data work:  {old_ms:9.1f} ms at {sample:,} rows "
+          f"(O(n log n) sort + O(n*k) category means, per calculation)")
+
+    assert data.counts.sum() == len(rows['bmi']) + 2
+    assert data.trend[0] == 22.0 and data.trend[-1] == 31.0
+
+
+if __name__ == "__main__":
+    main()
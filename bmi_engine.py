@@ -0,0 +1,186 @@
+# Shared BMI computation for the calculators
+#
+# AdvancedBMICalculator (8 bands, metric and imperial), BMI_Calculator
+# (4 bands, kg and feet) and Form1 each had their own copy of the formula
+# and an if/elif chain for the category, one value per call. This module is
+# the one copy, with no GUI imports, and works on whole NumPy arrays as
+# well as single numbers:
+#   - bmi() and ideal_weight() take weights and heights in any of UNITS;
+#     each unit is a single factor in bmi = factor * weight / height ** 2
+#   - a Scheme is a sorted table of band upper bounds with their labels and
+#     colours; band() is one searchsorted over it, so the same code serves
+#     the WHO bands (WHO) and the four basic ones (BASIC)
+#   - evaluate() does all three for a batch of measurements
+#
+# Scalars in give Python scalars out; arrays give arrays.
+#
+#   bmi(70, 175)                                  # 22.86
+#   WHO.label(bmi(weights, heights, 'imperial'))  # array of labels
+#   python bmi_engine.py --records 10000000       # micro-benchmark
+
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+
+Unit = namedtuple('Unit', 'factor weight height label')
+
+UNITS = {
+    'metric': Unit(1e4, 'kg', 'cm', "Metric (kg, cm)"),
+    'imperial': Unit(703.0, 'lbs', 'inches', "Imperial (lbs, inches)"), # The usual rounded factor
+    'feet': Unit(1 / 0.3048 ** 2, 'kg', 'feet', "Mixed (kg, feet)"),
+}
+IDEAL_BMI = (18.5, 24.9) # The ideal weight range is this BMI range at the given height
+
+
+def _result(values):
+    # Python scalars for scalar input, arrays otherwise
+    return values.item() if np.ndim(values) == 0 and hasattr(values, 'item') else values
+
+
+class Scheme:
+    """BMI bands: sorted upper bounds (exclusive) and one more label and colour than bounds."""
+
+    def __init__(self, thresholds, labels, colors):
+        self.thresholds = np.asarray(thresholds, dtype=float)
+        self.labels = list(labels)
+        self.colors = list(colors)
+        assert np.all(np.diff(self.thresholds) > 0) and len(self.labels) == len(self.thresholds) + 1
+        self._labels = np.array(self.labels, dtype=object)
+        self._colors = np.array(self.colors, dtype=object)
+
+    def band(self, bmi):
+        """Index of the band each BMI falls in (a BMI equal to a bound belongs to the band above)."""
+        return _result(np.searchsorted(self.thresholds, bmi, side='right'))
+
+    def label(self, bmi):
+        return _result(self._labels[np.searchsorted(self.thresholds, bmi, side='right')])
+
+    def color(self, bmi):
+        return _result(self._colors[np.searchsorted(self.thresholds, bmi, side='right')])
+
+    def category(self, bmi):
+        # (label, colour) of one BMI
+        band = int(np.searchsorted(self.thresholds, bmi, side='right'))
+        return self.labels[band], self.colors[band]
+
+
+# WHO bands, as in AdvancedBMICalculator
+WHO = Scheme([16, 17, 18.5, 25, 30, 35, 40],
+             ["Severe Thinness", "Moderate Thinness", "Mild Thinness", "Normal range", "Overweight",
+              "Obese Class I", "Obese Class II", "Obese Class III"],
+             ["#3498db", "#5dade2", "#85c1e9", "#2ecc71", "#f39c12", "#e67e22", "#d35400", "#c0392b"])
+
+# The four basic bands of BMI_Calculator and Form1
+BASIC = Scheme([18.5, 25, 30],
+               ["Underweight", "Normal Weight", "Overweight", "Obesity"],
+               ["#3498db", "#2ecc71", "#f39c12", "#e74c3c"])
+
+
+def bmi(weight, height, units='metric'):
+    """BMI from weight and height in `units` (a key of UNITS)."""
+    weight = np.asarray(weight, dtype=float)
+    height = np.asarray(height, dtype=float)
+    return _result(UNITS[units].factor * weight / (height * height))
+
+
+def ideal_weight(height, units='metric', low=IDEAL_BMI[0], high=IDEAL_BMI[1]):
+    """(min, max) weight in `units` for a BMI from low to high at this height."""
+    height = np.asarray(height, dtype=float)
+    area = height * height / UNITS[units].factor
+    return _result(low * area), _result(high * area)
+
+
+def evaluate(weight, height, units='metric', scheme=WHO):
+    """BMI, band index and ideal weight range of each measurement, as a dict."""
+    values = bmi(weight, height, units)
+    ideal_min, ideal_max = ideal_weight(height, units)
+    return {'bmi': values, 'band': scheme.band(values), 'ideal_min': ideal_min, 'ideal_max': ideal_max}
+
+
+# --- the per-call code this replaces, for the benchmark ---
+
+def _old_advanced(weight, height, metric=True):
+    # AdvancedBMICalculator.calculate_bmi() + get_bmi_category()
+    if metric:
+        value = weight / ((height / 100) ** 2)
+    else:
+        value = (weight / (height ** 2)) * 703
+    if value < 16:
+        category, color = "Severe Thinness", "#3498db"
+    elif value < 17:
+        category, color = "Moderate Thinness", "#5dade2"
+    elif value < 18.5:
+        category, color = "Mild Thinness", "#85c1e9"
+    elif value < 25:
+        category, color = "Normal range", "#2ecc71"
+    elif value < 30:
+        category, color = "Overweight", "#f39c12"
+    elif value < 35:
+        category, color = "Obese Class I", "#e67e22"
+    elif value < 40:
+        category, color = "Obese Class II", "#d35400"
+    else:
+        category, color = "Obese Class III", "#c0392b"
+    if metric:
+        ideal = (18.5 * ((height / 100) ** 2), 24.9 * ((height / 100) ** 2))
+    else:
+        ideal = ((18.5 * (height ** 2)) / 703, (24.9 * (height ** 2)) / 703)
+    return value, category, color, ideal
+
+
+def _old_basic(weight, height_feet):
+    # BMI_Calculator.calculate_bmi() (and Form1)
+    height_meters = height_feet * 0.3048
+    value = weight / (height_meters ** 2)
+    if value < 18.5:
+        category = "Underweight"
+    elif 18.5 <= value < 25:
+        category = "Normal Weight"
+    elif 25 <= value < 30:
+        category = "Overweight"
+    else:
+        category = "Obesity"
+    return value, category
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorised BMI engine against the per-call code.")
+    parser.add_argument('--records', type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    count = args.records
+    weight = rng.normal(75, 18, count).clip(30, 250)
+    height = rng.normal(170, 12, count).clip(120, 220)
+    feet = height / 30.48
+    print(f"{count:,} records")
+
+    def run(label, function):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        print(f"  {label:<44} {seconds:8.3f} s  {count / seconds / 1e6:8.2f} M records/s")
+        return result, seconds
+
+    new, new_seconds = run("engine: BMI + WHO band + ideal range", lambda: evaluate(weight, height))
+    labels, _ = run("engine: WHO labels for all", lambda: WHO.label(new['bmi']))
+    basic, _ = run("engine: BMI + basic band (feet)", lambda: BASIC.band(bmi(weight, feet, 'feet')))
+    weights, heights, feets = weight.tolist(), height.tolist(), feet.tolist()
+    old, old_seconds = run("per call: AdvancedBMICalculator methods",
+                           lambda: [_old_advanced(w, h) for w, h in zip(weights, heights)])
+    old_basic, _ = run("per call: BMI_Calculator formula",
+                       lambda: [_old_basic(w, f) for w, f in zip(weights, feets)])
+    print(f"  speed-up (Advanced): {old_seconds / new_seconds:,.0f}x")
+
+    # Same answers as the code being replaced
+    check = slice(0, count, max(count // 100_000, 1))
+    assert np.allclose(new['bmi'][check], [row[0] for row in old[check]])
+    assert list(labels[check]) == [row[1] for row in old[check]]
+    assert np.allclose(new['ideal_max'][check], [row[3][1] for row in old[check]])
+    assert [BASIC.labels[band] for band in basic[check]] == [row[1] for row in old_basic[check]]
+
+
+if __name__ == "__main__":
+    main()
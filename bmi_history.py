@@ -0,0 +1,204 @@
+# Columnar measurement history for AdvancedBMICalculator
+#
+# The calculator kept its history as a list of dicts and rebuilt every
+# QTableWidgetItem on each insert. HistoryColumns stores the same fields as
+# one NumPy array per column instead:
+#   - appends write into preallocated arrays that double when full, so an
+#     append is amortised O(1) and a million rows take a few tens of MB
+#   - text columns (name, gender, category) hold small integer codes into a
+#     table of distinct values, so repeated strings are stored once
+#   - argsort() returns a permutation of row numbers; a view sorts by any
+#     column through it without copying or reordering the data
+#
+# HistoryTableModel in AdvancedBMICalculator.py serves these columns to a
+# QTableView, which only asks for the rows it is drawing.
+#
+# Run this file for a headless benchmark at 1M rows:
+#   python bmi_history.py --rows 1000000
+
+import argparse
+import time
+
+import numpy as np
+
+from bmi_engine import WHO
+
+# Column name -> dtype; str columns are stored as int32 codes
+HISTORY_SCHEMA = {
+    'date': 'datetime64[D]',
+    'name': str,
+    'age': 'int16',
+    'gender': str,
+    'bmi': 'float64',
+    'category': str,
+}
+
+
+class StringColumn:
+    """int32 codes plus the table of distinct strings they point into."""
+
+    def __init__(self, capacity):
+        self.codes = np.zeros(capacity, dtype=np.int32)
+        self.values = []
+        self._lookup = {}
+
+    def code(self, value):
+        value = str(value) # So 1 and '1' (or np.str_ and str) share one code
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def encode(self, values):
+        if isinstance(values, np.ndarray):
+            values = values.tolist() # Plain str hashes faster than np.str_
+        return np.fromiter(map(self.code, values), dtype=np.int32, count=len(values))
+
+    def sort_keys(self, codes):
+        # Alphabetical rank of each code, so an argsort over codes sorts by the strings
+        ranks = np.empty(len(self.values), dtype=np.int32)
+        ranks[sorted(range(len(self.values)), key=self.values.__getitem__)] = np.arange(len(self.values))
+        return ranks[codes]
+
+
+class HistoryColumns:
+    """Append-only columnar table.
+
+    >>> history = HistoryColumns()
+    >>> history.append(date='2024-05-01', name='Ann', age=34, gender='Female', bmi=22.1, category='Normal range')
+    0
+    >>> history.value(0, 'name'), history.column('bmi')
+    ('Ann', array([22.1]))
+    """
+
+    def __init__(self, schema=HISTORY_SCHEMA, capacity=1024):
+        self.schema = dict(schema)
+        self._size = 0
+        self._capacity = capacity
+        self._columns = {name: StringColumn(capacity) if dtype is str else np.zeros(capacity, dtype=dtype)
+                         for name, dtype in self.schema.items()}
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, needed):
+        if needed <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        for name, column in self._columns.items():
+            if isinstance(column, StringColumn):
+                column.codes = np.resize(column.codes, capacity)
+            else:
+                self._columns[name] = np.resize(column, capacity)
+        self._capacity = capacity
+
+    def append(self, **row):
+        """Add one row; returns its row number."""
+        self._reserve(self._size + 1)
+        index = self._size
+        for name, column in self._columns.items():
+            if isinstance(column, StringColumn):
+                column.codes[index] = column.code(row[name])
+            else:
+                column[index] = row[name]
+        self._size += 1
+        return index
+
+    def extend(self, columns):
+        """Add many rows from a dict of equal-length sequences; returns the first new row number."""
+        count = len(next(iter(columns.values())))
+        self._reserve(self._size + count)
+        start, end = self._size, self._size + count
+        for name, column in self._columns.items():
+            if isinstance(column, StringColumn):
+                column.codes[start:end] = column.encode(columns[name])
+            else:
+                column[start:end] = np.asarray(columns[name]).astype(column.dtype, copy=False)
+        self._size = end
+        return start
+
+    def column(self, name):
+        """The stored values of a numeric column, or the codes of a text column (a view, not a copy)."""
+        column = self._columns[name]
+        return (column.codes if isinstance(column, StringColumn) else column)[:self._size]
+
+    def strings(self, name):
+        # The distinct values of a text column, indexed by code
+        return self._columns[name].values
+
+    def value(self, index, name):
+        column = self._columns[name]
+        if isinstance(column, StringColumn):
+            return column.values[column.codes[index]]
+        return column[index]
+
+    def sort_keys(self, name):
+        # Values (or string ranks) for comparing rows by `name`
+        column = self._columns[name]
+        if isinstance(column, StringColumn):
+            return column.sort_keys(self.column(name))
+        return self.column(name)
+
+    def argsort(self, name):
+        """Row numbers in ascending order of `name` (stable); read it backwards for descending."""
+        return np.argsort(self.sort_keys(name), kind='stable')
+
+    def nbytes(self):
+        return sum((column.codes if isinstance(column, StringColumn) else column)[:self._size].nbytes
+                   for column in self._columns.values())
+
+
+def _synthetic_rows(count, seed=0):
+    rng = np.random.default_rng(seed)
+    bmi = rng.normal(26, 5, count).clip(12, 60)
+    return {
+        'date': np.datetime64('2015-01-01') + rng.integers(0, 3650, count),
+        'name': np.array([f"Patient {i:05d}" for i in range(50_000)])[rng.integers(0, 50_000, count)],
+        'age': rng.integers(18, 90, count),
+        'gender': np.array(["Male", "Female", "Other"])[rng.integers(0, 3, count)],
+        'bmi': bmi,
+        'category': WHO.label(bmi),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the columnar history at scale.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rows = _synthetic_rows(args.rows)
+    history = HistoryColumns()
+    start = time.perf_counter()
+    history.extend(rows)
+    bulk_seconds = time.perf_counter() - start
+
+    single = HistoryColumns()
+    sample = min(args.rows, 100_000)
+    records = [{name: values[i] for name, values in rows.items()} for i in range(sample)]
+    start = time.perf_counter()
+    for record in records:
+        single.append(**record)
+    append_us = (time.perf_counter() - start) / sample * 1e6
+
+    print(f"{len(history):,} rows, {history.nbytes() / 1e6:.1f} MB in columns")
+    print(f"  bulk extend:        {bulk_seconds * 1e3:8.1f} ms")
+    print(f"  single append:      {append_us:8.2f} us/row (over {sample:,} rows)")
+    for name in history.schema:
+        start = time.perf_counter()
+        order = history.argsort(name)
+        print(f"  sort by {name:<10} {(time.perf_counter() - start) * 1e3:8.1f} ms  "
+              f"(first: {history.value(order[0], name)}, last: {history.value(order[-1], name)})")
+
+    # What a view does per repaint: format the ~40 visible rows
+    order = history.argsort('bmi')
+    start = time.perf_counter()
+    for row in range(len(history) // 2, len(history) // 2 + 40):
+        [str(history.value(order[row], name)) for name in history.schema]
+    print(f"  one visible page:   {(time.perf_counter() - start) * 1e3:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+# Bulk measurement import for AdvancedBMICalculator
+#
+# Screening days produce spreadsheets with tens of thousands of rows; typing
+# them into calculate_bmi() one by one is not an option. import_file() reads
+# CSV, Excel or Parquet in chunks and, for each chunk at once:
+#   - validates every column with vectorised checks (missing names, numbers
+#     that don't parse or are out of range, bad dates, unknown genders);
+#     bad rows are counted and reported by line, the rest of the chunk goes on
+#   - computes BMI, category and the ideal weight range as NumPy arrays with
+#     bmi_engine.evaluate(), the category from a searchsorted over the band
+#     thresholds instead of an if/elif chain per row
+#   - writes the chunk to the MeasurementStore in one batch
+#
+# Reading stays sequential, but prepare_chunk() for the next chunks runs on
+# a small thread pool while the current one is written (pandas and NumPy
+# release the GIL for most of the work). The calculator runs import_file()
+# on a QThread and hands each written chunk, with its new ids, to its
+# background reader, so the window stays responsive.
+#
+# Vectorising isn't where the time goes: on rows already in memory,
+# prepare_chunk() is only a little faster than the old per-row code, and it
+# also validates dates and genders, which that code never did. What the
+# import gains is batched writes, per-line error reports and not blocking
+# the window (see --bench).
+#
+# Expected columns (case and surrounding spaces ignored): name, age, weight,
+# height, and optionally date (default: today) and gender (default: Other).
+# Units are per file, any of bmi_engine.UNITS: 'metric' (kg, cm), 'imperial'
+# (lbs, inches) or 'feet' (kg, feet).
+# Excel needs openpyxl and can't be streamed: the sheet is read whole, then
+# processed in chunks.
+#
+#   python bmi_import.py screening.csv --db bmi_measurements.sqlite
+#   python bmi_import.py screening.xlsx --units imperial --out checked.csv
+#   python bmi_import.py --bench --rows 200000
+
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from bmi_engine import UNITS, WHO, evaluate
+
+CHUNK_ROWS = 50_000
+REQUIRED = ('name', 'age', 'weight', 'height')
+GENDERS = ('Male', 'Female', 'Other')
+AGE_RANGE = (1, 120) # Same limits as the calculator's age field
+MAX_ERRORS = 100 # Rejected rows reported individually; the rest are only counted
+NUMBER = r'\s*[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?\s*' # A plain decimal number, as text
+
+
+class ImportFileError(ValueError):
+    """The file can't be imported at all (unknown format, missing columns)."""
+
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield (first data line, DataFrame) chunks of a CSV, Excel or Parquet file."""
+    import pandas as pd
+
+    extension = os.path.splitext(path)[1].lower()
+    line = 2 # Line 1 is the header
+    if extension in ('.csv', '.txt'):
+        chunks = pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+    elif extension in ('.xlsx', '.xlsm', '.xls'):
+        frame = pd.read_excel(path, sheet_name=0, dtype=object)
+        chunks = (frame.iloc[start:start + chunk_rows] for start in range(0, len(frame), chunk_rows))
+    elif extension == '.parquet':
+        import pyarrow.parquet as pq
+
+        chunks = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows))
+    else:
+        raise ImportFileError(f"Unsupported file type: {extension or path}")
+    for frame in chunks:
+        yield line, frame
+        line += len(frame)
+
+
+def count_rows(path):
+    # Rows in the file, for progress; None where that would mean reading it twice
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.parquet':
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows
+    if extension in ('.csv', '.txt'):
+        with open(path, 'rb') as f:
+            return max(sum(block.count(b'\n') for block in iter(lambda: f.read(1 << 20), b'')) - 1, 0)
+    return None
+
+
+def _numbers(column):
+    # Floats of one column, NaN where a cell isn't a number
+    import pandas as pd
+
+    if isinstance(column.dtype, pd.StringDtype):
+        # Arrow-backed text: check and convert in C, instead of to_numeric's per-cell Python fallback
+        valid = column.str.fullmatch(NUMBER).to_numpy(dtype=bool, na_value=False)
+        values = np.full(len(column), np.nan)
+        values[valid] = column[valid].astype(float).to_numpy()
+        return values
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype=float)
+
+
+def prepare_chunk(frame, first_line, units='metric', today=None):
+    """Validate one chunk and compute its measurements.
+
+    Returns (columns, errors): columns is a dict of arrays for the valid rows
+    (the MeasurementStore columns plus weight, height, ideal_min, ideal_max);
+    errors is a list of (line, message) for the rejected ones.
+    """
+    import pandas as pd
+
+    frame = frame.rename(columns=lambda column: str(column).strip().lower())
+    missing = [column for column in REQUIRED if column not in frame.columns]
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(missing)}")
+    count = len(frame)
+    lines = np.arange(first_line, first_line + count)
+    reasons = np.full(count, '', dtype=object)
+
+    def reject(mask, message):
+        # Keep the first reason per row
+        reasons[mask & (reasons == '')] = message
+
+    names = frame['name'].fillna('').astype(str).str.strip()
+    reject((names == '').to_numpy(), "missing name")
+    age = _numbers(frame['age'])
+    reject(~((age >= AGE_RANGE[0]) & (age <= AGE_RANGE[1]) & (age == np.round(age))),
+           f"age must be a whole number from {AGE_RANGE[0]} to {AGE_RANGE[1]}")
+    weight = _numbers(frame['weight'])
+    height = _numbers(frame['height'])
+    reject(~(weight > 0) | ~(height > 0), "weight and height must be positive numbers")
+
+    if 'date' in frame.columns:
+        blank = (frame['date'].isna() | (frame['date'].astype(str).str.strip() == '')).to_numpy()
+        dates = pd.to_datetime(frame['date'].where(~blank), errors='coerce').to_numpy(dtype='datetime64[D]')
+        retry = np.isnat(dates) & ~blank
+        if retry.any():
+            # The format is inferred from the first date; parse the odd ones out one by one
+            dates[retry] = pd.to_datetime(frame['date'][retry], errors='coerce', format='mixed').to_numpy(
+                dtype='datetime64[D]')
+        reject(np.isnat(dates) & ~blank, "unreadable date")
+        dates = np.where(blank, np.datetime64(today or 'today', 'D'), dates)
+    else:
+        dates = np.full(count, np.datetime64(today or 'today', 'D'))
+    if 'gender' in frame.columns:
+        genders = frame['gender'].fillna('').astype(str).str.strip().str.capitalize()
+        genders = genders.replace({'': 'Other', 'M': 'Male', 'F': 'Female', 'O': 'Other'}).to_numpy(dtype=object)
+        reject(~np.isin(genders, GENDERS), f"gender must be one of {', '.join(GENDERS)}")
+    else:
+        genders = np.full(count, 'Other', dtype=object)
+
+    valid = reasons == ''
+    results = evaluate(weight[valid], height[valid], units)
+    columns = {
+        'date': dates[valid],
+        'name': names.to_numpy(dtype=object)[valid],
+        'age': age[valid].astype(np.int16),
+        'gender': genders[valid],
+        'bmi': results['bmi'],
+        'category': np.asarray(WHO.labels, dtype=object)[results['band']],
+        'weight': weight[valid],
+        'height': height[valid],
+        'ideal_min': results['ideal_min'],
+        'ideal_max': results['ideal_max'],
+    }
+    rejected = np.flatnonzero(~valid)
+    errors = list(zip(lines[rejected].tolist(), reasons[rejected].tolist()))
+    return columns, errors
+
+
+def import_file(path, store=None, units='metric', chunk_rows=CHUNK_ROWS, workers=2,
+                on_chunk=None, on_progress=None, should_stop=None, today=None):
+    """Import a file chunk by chunk; returns a summary dict.
+
+    Valid rows of each chunk go to `store` (a MeasurementStore, written with
+    add_many) and to on_chunk(columns), with an 'id' column once they are
+    in the store. on_progress(rows done, total rows or
+    None) follows every chunk. should_stop() is checked between chunks, to
+    cancel; rows already written stay.
+    """
+    total = count_rows(path)
+    summary = {'rows': 0, 'imported': 0, 'rejected': 0, 'errors': [], 'cancelled': False}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        pending = []
+        chunks = read_chunks(path, chunk_rows)
+
+        def submit():
+            # Keep a few chunks in preparation ahead of the one being written
+            for line, frame in chunks:
+                pending.append((len(frame), pool.submit(prepare_chunk, frame, line, units, today)))
+                if len(pending) >= 2 * max(workers, 1):
+                    return
+
+        submit()
+        while pending:
+            if should_stop is not None and should_stop():
+                summary['cancelled'] = True
+                for _, future in pending:
+                    future.cancel()
+                break
+            size, future = pending.pop(0)
+            columns, errors = future.result()
+            submit()
+            if store is not None and len(columns['bmi']):
+                columns['id'] = store.add_many(columns)
+            summary['rows'] += size
+            summary['imported'] += len(columns['bmi'])
+            summary['rejected'] += len(errors)
+            summary['errors'].extend(errors[:MAX_ERRORS - len(summary['errors'])])
+            if on_chunk is not None:
+                on_chunk(columns)
+            if on_progress is not None:
+                on_progress(summary['rows'], total)
+    summary['seconds'] = time.perf_counter() - started
+    return summary
+
+
+def _old_calculate(records, units='metric'):
+    # What importing through calculate_bmi() would do per row: parse, check, compute, categorise.
+    # Plain Python, as the calculator had it; dates and genders go unchecked
+    results = []
+    for record in records:
+        try:
+            weight, height, age = float(record['weight']), float(record['height']), int(record['age'])
+            if weight <= 0 or height <= 0:
+                raise ValueError
+        except ValueError:
+            continue
+        if units == 'metric':
+            bmi = weight / ((height / 100) ** 2)
+            ideal = (18.5 * ((height / 100) ** 2), 24.9 * ((height / 100) ** 2))
+        else:
+            bmi = (weight / (height ** 2)) * 703
+            ideal = ((18.5 * (height ** 2)) / 703, (24.9 * (height ** 2)) / 703)
+        for bound, category in zip(WHO.thresholds.tolist(), WHO.labels):
+            if bmi < bound:
+                break
+        else:
+            category = WHO.labels[-1]
+        results.append((record['name'], age, bmi, category) + ideal)
+    return results
+
+
+def _sample_file(path, rows, seed=0):
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'Date': (np.datetime64('2024-01-01') + rng.integers(0, 365, rows)).astype(str),
+        'Name': np.array([f"Pupil {i:05d}" for i in range(20_000)])[rng.integers(0, 20_000, rows)],
+        'Age': rng.integers(5, 90, rows).astype(object),
+        'Gender': np.array(['male', 'Female', 'other'])[rng.integers(0, 3, rows)],
+        'Weight': rng.normal(70, 15, rows).clip(20, 200).round(1),
+        'Height': rng.normal(168, 12, rows).clip(100, 210).round(1),
+    })
+    # A few typical spreadsheet mistakes
+    broken = rng.choice(rows, size=max(rows // 1000, 1), replace=False)
+    frame.loc[broken[0::3], 'Weight'] = -1
+    frame.loc[broken[1::3], 'Age'] = 'forty'
+    frame.loc[broken[2::3], 'Name'] = ''
+    if path.endswith('.parquet'):
+        frame['Age'] = frame['Age'].astype(str) # One type per Parquet column
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+    return frame
+
+
+def _bench(rows):
+    from bmi_store import MeasurementStore
+
+    folder = tempfile.mkdtemp(prefix='bmi_import_')
+    for extension in ('csv', 'parquet'):
+        path = os.path.join(folder, f"screening.{extension}")
+        frame = _sample_file(path, rows)
+        summary = import_file(path)
+        print(f"{extension:<8} {rows:,} rows: {summary['seconds']:6.2f} s ({rows / summary['seconds']:,.0f} rows/s), "
+              f"{summary['imported']:,} valid, {summary['rejected']:,} rejected (validate + compute only)")
+    store = MeasurementStore(os.path.join(folder, 'bench.sqlite'))
+    summary = import_file(os.path.join(folder, 'screening.csv'), store)
+    print(f"csv -> store:     {summary['seconds']:6.2f} s ({rows / summary['seconds']:,.0f} rows/s), "
+          f"{store.count():,} rows stored")
+    store.close()
+
+    # The same rows already in memory: one vectorised pass vs the per-row path
+    frame = frame.astype(str)
+    start = time.perf_counter()
+    prepare_chunk(frame, 2)
+    seconds = time.perf_counter() - start
+    print(f"in memory, prepare_chunk: {seconds:6.2f} s ({rows / seconds:,.0f} rows/s), all columns validated")
+    records = frame.rename(columns=str.lower).to_dict('records')
+    start = time.perf_counter()
+    _old_calculate(records)
+    seconds = time.perf_counter() - start
+    print(f"in memory, per row:       {seconds:6.2f} s ({rows / seconds:,.0f} rows/s), "
+          f"numbers only (no date or gender checks)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import BMI measurements from CSV, Excel or Parquet.")
+    parser.add_argument('path', nargs='?', help="file to import")
+    parser.add_argument('--db', default=None, help="measurement database to add the rows to")
+    parser.add_argument('--units', choices=sorted(UNITS), default='metric')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--out', help="also write the valid rows with BMI, category and ideal range to this CSV")
+    parser.add_argument('--bench', action='store_true', help="time imports of generated files")
+    parser.add_argument('--rows', type=int, default=200_000, help="rows for --bench")
+    args = parser.parse_args()
+
+    if args.bench:
+        _bench(args.rows)
+        return
+    if not args.path:
+        parser.error("a file to import is required (or --bench)")
+
+    from bmi_store import MeasurementStore
+
+    store = MeasurementStore(args.db) if args.db else None
+    out = open(args.out, 'w', newline='', encoding='utf-8') if args.out else None
+
+    def write_rows(columns):
+        import pandas as pd
+
+        pd.DataFrame(columns).to_csv(out, index=False, header=out.tell() == 0, float_format='%.2f')
+
+    def show_progress(done, total):
+        print(f"\r{done:,}" + (f"/{total:,} rows" if total else " rows"), end='', flush=True)
+
+    try:
+        summary = import_file(args.path, store, args.units, args.chunk_rows, args.workers,
+                              on_chunk=write_rows if out else None, on_progress=show_progress)
+    finally:
+        if store is not None:
+            store.close()
+        if out is not None:
+            out.close()
+    print(f"\n{summary['imported']:,} imported, {summary['rejected']:,} rejected in {summary['seconds']:.1f} s")
+    for line, message in summary['errors']:
+        print(f"  line {line}: {message}")
+    if summary['rejected'] > len(summary['errors']):
+        print(f"  ... and {summary['rejected'] - len(summary['errors']):,} more")
+
+
+if __name__ == "__main__":
+    main()
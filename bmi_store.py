@@ -0,0 +1,362 @@
+# Persistent measurement store for AdvancedBMICalculator
+#
+# The calculator's history only lived in memory. MeasurementStore keeps it
+# in SQLite instead:
+#   - WAL mode, so the GUI keeps reading while a writer (e.g. a bulk
+#     import) commits, and a commit doesn't rewrite the database file.
+#     WAL needs every process on the same machine, so a database on a
+#     network share (NFS, SMB/CIFS, a UNC path, a mapped network drive) gets
+#     a rollback journal instead; wal=True/False overrides the guess.
+#   - writes are buffered and committed `batch` rows per transaction;
+#     add_many() writes whole columns with executemany
+#   - indexes on (name, date) and (date), each covering bmi, so every
+#     filter the GUI offers (one person, a date range, both) is an index
+#     range scan, and the Analysis trend is read from the index alone
+#   - query() returns one page at a time with keyset pagination: the next
+#     page starts after the last row's key instead of using OFFSET, so
+#     page 1000 costs the same as page 1
+#   - band_counts() counts measurements per BMI band with a GROUP BY, so
+#     the Analysis tab's distribution never reads the rows themselves
+#
+#   store = MeasurementStore('bmi_measurements.sqlite')
+#   page, key = store.query(name='Ann', limit=500)           # newest first
+#   more, key = store.query(name='Ann', limit=500, after=key)
+#
+# Run this file for the 1M-row benchmark:
+#   python bmi_store.py --rows 1000000
+
+import argparse
+import contextlib
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+STORE_PATH = 'bmi_measurements.sqlite'
+COLUMNS = ('date', 'name', 'age', 'gender', 'bmi', 'category')
+PAGE_SIZE = 1000
+
+# Orders the store can page through, as keyset columns. date and name are
+# served by an index; the others sort the matching rows on every page, which
+# is fine for a person or a date range but a full scan on everything
+ORDERS = {
+    'date': ('date', 'id'),
+    'name': ('name', 'date', 'id'),
+    'age': ('age', 'id'),
+    'gender': ('gender', 'id'),
+    'bmi': ('bmi', 'id'),
+    'category': ('category', 'id'),
+}
+
+
+def _date_text(value):
+    # Dates are stored as ISO text, which sorts chronologically
+    return str(np.datetime64(value, 'D')) if value is not None else None
+
+
+def row_keys(columns, order='date'):
+    """The keyset key of every row in a page from query(), comparable with a key from key_of()."""
+    return list(zip(*(np.asarray(columns[key]).astype(str).tolist() if key == 'date' else columns[key].tolist()
+                      for key in ORDERS[order])))
+
+
+def key_of(row, order='date'):
+    # The keyset key of one row given as a dict (with its id)
+    return tuple(_date_text(row[key]) if key == 'date' else row[key] for key in ORDERS[order])
+
+
+# Filesystems where SQLite's WAL (shared memory between processes) is unsafe
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'afs', '9p', 'ceph', 'glusterfs', 'fuse.sshfs'}
+
+
+def is_network_path(path):
+    """Best guess whether a database file lives on a network share (False when unsure)."""
+    path = os.path.abspath(path)
+    if os.name == 'nt':
+        if path.startswith('\\\\'):
+            return True # UNC path
+        import ctypes
+
+        drive = os.path.splitdrive(path)[0] + '\\'
+        return ctypes.windll.kernel32.GetDriveTypeW(drive) == 4 # DRIVE_REMOTE
+    try:
+        with open('/proc/mounts') as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return False
+    # The filesystem of the longest mount point containing the path
+    path = os.path.realpath(path)
+    best, kind = '', None
+    for point, fstype in mounts:
+        point = point.replace('\\040', ' ')
+        if (path == point or path.startswith(point.rstrip('/') + '/')) and len(point) > len(best):
+            best, kind = point, fstype
+    return kind in NETWORK_FILESYSTEMS
+
+
+def matches(row, name=None, start=None, end=None):
+    """Whether a row passes the same filters as query().
+
+    `row` is a dict of values (gives a bool) or of equal-length columns
+    (gives a boolean mask).
+    """
+    date = np.asarray(row['date'], dtype='datetime64[D]')
+    keep = np.ones(date.shape, dtype=bool)
+    if name is not None:
+        keep &= np.asarray(row['name'], dtype=object) == name
+    if start is not None:
+        keep &= date >= np.datetime64(start, 'D')
+    if end is not None:
+        keep &= date <= np.datetime64(end, 'D')
+    return keep if keep.ndim else bool(keep)
+
+
+class MeasurementStore:
+    """SQLite-backed BMI measurements with buffered writes and paged, filtered reads."""
+
+    def __init__(self, path=STORE_PATH, batch=5000, wal=None):
+        self.path = path
+        self.batch = batch
+        self._pending = []
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # None: WAL unless the file is on a network share. Other connections to the same file should pass self.wal
+        self.wal = not is_network_path(path) if wal is None else wal
+        self._db = sqlite3.connect(path, isolation_level=None)
+        if self.wal:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+        else:
+            # The journal mode is stored in the file; switch back from an earlier WAL run
+            self._db.execute('PRAGMA journal_mode=DELETE')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS measurements (
+                id INTEGER PRIMARY KEY,
+                date TEXT NOT NULL,
+                name TEXT NOT NULL,
+                age INTEGER,
+                gender TEXT,
+                bmi REAL NOT NULL,
+                category TEXT);
+            CREATE INDEX IF NOT EXISTS measurements_name_date ON measurements (name, date, bmi);
+            CREATE INDEX IF NOT EXISTS measurements_date ON measurements (date, bmi);''')
+
+    # --- writes ---
+
+    def add(self, date, name, age, gender, bmi, category):
+        """Buffer one measurement; it is written with the next full batch or flush()."""
+        self._pending.append((_date_text(date), name, int(age), gender, float(bmi), category))
+        if len(self._pending) >= self.batch:
+            self.flush()
+
+    def add_many(self, columns):
+        """Write a dict of equal-length columns (COLUMNS) in batch-sized transactions.
+
+        Returns the new rows' ids, in order.
+        """
+        self.flush()
+        dates = np.asarray(columns['date']).astype('datetime64[D]').astype(str)
+        rows = zip(dates.tolist(), *(np.asarray(columns[name]).tolist() for name in COLUMNS[1:]))
+        ids = []
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.batch:
+                ids.append(self._ids(chunk))
+                chunk = []
+        ids.append(self._ids(chunk))
+        return np.concatenate(ids)
+
+    def _ids(self, rows):
+        # Write rows in one transaction; a transaction's rows get consecutive ids
+        last = self._write(rows)
+        return np.arange(last - len(rows) + 1, last + 1, dtype=np.int64) if rows else np.empty(0, dtype=np.int64)
+
+    def _write(self, rows):
+        if not rows:
+            return None
+        self._db.execute('BEGIN')
+        self._db.executemany('INSERT INTO measurements (date, name, age, gender, bmi, category) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', rows)
+        self._db.execute('COMMIT')
+        return self._db.execute('SELECT last_insert_rowid()').fetchone()[0]
+
+    def flush(self):
+        """Commit the buffered rows; returns the id of the last one (None if there were none)."""
+        rows, self._pending = self._pending, []
+        return self._write(rows)
+
+    # --- reads ---
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        """Run the reads inside the block against one state of the database, whatever other connections commit."""
+        self._db.execute('BEGIN')
+        try:
+            yield
+        finally:
+            self._db.execute('COMMIT')
+
+    def last_id(self):
+        # The newest measurement's id (0 when empty); rows written later have larger ids
+        return self._db.execute('SELECT MAX(id) FROM measurements').fetchone()[0] or 0
+
+    @staticmethod
+    def _where(name=None, start=None, end=None):
+        conditions, params = [], []
+        if name is not None:
+            conditions.append('name = ?')
+            params.append(name)
+        if start is not None:
+            conditions.append('date >= ?')
+            params.append(_date_text(start))
+        if end is not None:
+            conditions.append('date <= ?')
+            params.append(_date_text(end))
+        return conditions, params
+
+    def query(self, name=None, start=None, end=None, order='date', descending=True, limit=PAGE_SIZE, after=None):
+        """One page of measurements as a dict of NumPy columns, plus the key to pass as `after`.
+
+        Filters: name (exact), start/end (inclusive dates). order is a key of
+        ORDERS; the page also has an 'id' column, and the key is None when
+        there are no more rows.
+        """
+        conditions, params = self._where(name, start, end)
+        keys = ORDERS[order]
+        if after is not None:
+            placeholders = ', '.join('?' * len(keys))
+            conditions.append(f"({', '.join(keys)}) {'<' if descending else '>'} ({placeholders})")
+            params.extend(after)
+        direction = ' DESC' if descending else ''
+        sql = (f"SELECT id, {', '.join(COLUMNS)} FROM measurements"
+               + (f" WHERE {' AND '.join(conditions)}" if conditions else '')
+               + f" ORDER BY {', '.join(key + direction for key in keys)} LIMIT ?")
+        rows = self._db.execute(sql, params + [limit]).fetchall()
+        page = self._columns(rows)
+        if len(rows) < limit:
+            return page, None
+        last = dict(zip(('id',) + COLUMNS, rows[-1]))
+        return page, tuple(last[key] for key in keys)
+
+    @staticmethod
+    def _columns(rows):
+        values = list(zip(*rows)) if rows else [()] * (len(COLUMNS) + 1)
+        columns = dict(zip(('id',) + COLUMNS, values))
+        return {
+            'id': np.array(columns['id'], dtype=np.int64),
+            'date': np.array(columns['date'], dtype='datetime64[D]'),
+            'name': np.array(columns['name'], dtype=object),
+            'age': np.array(columns['age'], dtype=np.int16),
+            'gender': np.array(columns['gender'], dtype=object),
+            'bmi': np.array(columns['bmi'], dtype=float),
+            'category': np.array(columns['category'], dtype=object),
+        }
+
+    def trend(self, name=None, start=None, end=None):
+        """(dates, bmis) of every matching measurement in date order, read from an index."""
+        conditions, params = self._where(name, start, end)
+        rows = self._db.execute('SELECT date, bmi FROM measurements'
+                                + (f" WHERE {' AND '.join(conditions)}" if conditions else '')
+                                + ' ORDER BY date', params).fetchall()
+        # One structured array straight from the row tuples; much faster than zip(*rows)
+        table = np.array(rows, dtype=[('date', 'datetime64[D]'), ('bmi', float)])
+        return table['date'], table['bmi']
+
+    def band_counts(self, thresholds, name=None, start=None, end=None):
+        """Matching measurements per BMI band, counted by SQLite.
+
+        thresholds are sorted band upper bounds as in bmi_engine.Scheme (a BMI
+        equal to a bound is in the band above); returns len(thresholds) + 1
+        counts.
+        """
+        thresholds = [float(bound) for bound in thresholds]
+        conditions, params = self._where(name, start, end)
+        band = ('CASE ' + ' '.join(f'WHEN bmi < ? THEN {i}' for i in range(len(thresholds)))
+                + f' ELSE {len(thresholds)} END')
+        rows = self._db.execute(f'SELECT {band} AS band, COUNT(*) FROM measurements'
+                                + (f" WHERE {' AND '.join(conditions)}" if conditions else '')
+                                + ' GROUP BY band', thresholds + params).fetchall()
+        counts = np.zeros(len(thresholds) + 1, dtype=np.int64)
+        for index, count in rows:
+            counts[index] = count
+        return counts
+
+    def count(self, name=None, start=None, end=None):
+        conditions, params = self._where(name, start, end)
+        return self._db.execute('SELECT COUNT(*) FROM measurements'
+                                + (f" WHERE {' AND '.join(conditions)}" if conditions else ''),
+                                params).fetchone()[0]
+
+    def names(self):
+        # Everyone with a measurement, for filter completion (a scan of the name index)
+        return [row[0] for row in self._db.execute('SELECT DISTINCT name FROM measurements ORDER BY name')]
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+def main():
+    from bmi_history import _synthetic_rows
+
+    parser = argparse.ArgumentParser(description="Benchmark the measurement store at scale.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--path', help="database to create (default: a temporary file)")
+    args = parser.parse_args()
+
+    path = args.path or os.path.join(tempfile.mkdtemp(prefix='bmi_store_'), 'bench.sqlite')
+    rows = _synthetic_rows(args.rows)
+    store = MeasurementStore(path)
+    start = time.perf_counter()
+    store.add_many(rows)
+    insert_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(1000):
+        store.add('2025-01-01', f"Walk-in {i}", 40, 'Other', 24.0, 'Normal range')
+    store.flush()
+    single_ms = (time.perf_counter() - start) * 1e3
+    store.close()
+    print(f"{args.rows:,} rows: bulk insert {insert_seconds:.1f} s ({args.rows / insert_seconds:,.0f} rows/s), "
+          f"1000 buffered adds + flush {single_ms:.0f} ms, {os.path.getsize(path) / 1e6:.0f} MB")
+
+    # Startup: open the database and load the first page, as the GUI does
+    start = time.perf_counter()
+    store = MeasurementStore(path)
+    page, key = store.query()
+    print(f"  startup (open + first {len(page['bmi'])} rows): {(time.perf_counter() - start) * 1e3:8.1f} ms")
+
+    person = str(rows['name'][0])
+    timings = {
+        'page 2 (keyset)': lambda: store.query(after=key),
+        'one person, newest page': lambda: store.query(name=person),
+        'one year, newest page': lambda: store.query(start='2020-01-01', end='2020-12-31'),
+        'person + year': lambda: store.query(name=person, start='2018-01-01', end='2022-12-31'),
+        'by name, first page': lambda: store.query(order='name', descending=False),
+        'count for one year': lambda: store.count(start='2020-01-01', end='2020-12-31'),
+        'band counts, everything': lambda: int(store.band_counts([16, 17, 18.5, 25, 30, 35, 40]).sum()),
+        'trend for one person': lambda: store.trend(name=person),
+        'trend for one year': lambda: store.trend(start='2020-01-01', end='2020-12-31'),
+        'trend, everything': lambda: store.trend(),
+    }
+    for label, run in timings.items():
+        start = time.perf_counter()
+        result = run()
+        elapsed = (time.perf_counter() - start) * 1e3
+        size = result if isinstance(result, int) else len((result[0]['bmi'] if isinstance(result[0], dict)
+                                                          else result[1]))
+        print(f"  {label:<28} {elapsed:8.1f} ms  ({size:,} rows)")
+
+    # What filtering the old in-memory list of dicts costs
+    history_data = [{'name': name, 'bmi': bmi} for name, bmi in zip(rows['name'].tolist(), rows['bmi'].tolist())]
+    start = time.perf_counter()
+    [entry for entry in history_data if entry['name'] == person]
+    print(f"  list scan for one person:    {(time.perf_counter() - start) * 1e3:8.1f} ms (old in-memory history)")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
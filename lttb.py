@@ -0,0 +1,41 @@
+# Largest-Triangle-Three-Buckets (LTTB) downsampling, shared by the chart code
+#
+# Downsamples a series for display: the points are split into buckets and
+# LTTB keeps the one in each bucket that spans the largest triangle with the
+# last kept point and the next bucket's mean, so peaks, troughs and the
+# overall shape survive where plain striding would drop them. NumPy only;
+# used by trading_plots (prediction plots) and bmi_charts (the BMI trend).
+#
+#   keep = lttb(x, y, 2000)      # indices into x and y
+
+import numpy as np
+
+
+def lttb(x, y, threshold):
+    """Indices of the `threshold` points of (x, y) chosen by LTTB, first and last included."""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # threshold-2 buckets over the inner points 1..n-2
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(int) + 1
+    edges[-1] = n - 1
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    # Every bucket's mean up front; bucket i is compared with bucket i+1's mean,
+    # and the last bucket with the last point
+    counts = np.diff(edges)
+    next_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1])[1:] / counts[1:], x[-1])
+    next_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1])[1:] / counts[1:], y[-1])
+
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Twice the triangle area between the last kept point, each candidate and the next bucket's mean
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
@@ -0,0 +1,464 @@
+# Batch OCR client for the OCR.space API
+#
+# OCR-Api uploads one file with a one-off requests.post. This module runs a
+# whole directory or manifest through the same endpoint:
+#   - one requests.Session with a connection pool, so uploads reuse
+#     keep-alive connections instead of a new TCP/TLS handshake each
+#   - at most `concurrency` uploads in flight (worker threads; the work is
+#     network-bound, so the GIL is not a limit)
+#   - a token bucket holding the request rate under `rps`, retries included
+#   - transient failures (connection errors, timeouts, HTTP 429/5xx) retried
+#     with exponential backoff and jitter, honouring Retry-After
+#   - one JSON line per image written as soon as it finishes, so a crash
+#     keeps everything done so far
+#   - with an ocr_cache.OCRCache, images already OCRed with the same options
+#     are answered locally without an upload
+#   - with --index, each result's text also goes into an ocr_index.OCRIndex
+#
+# MockOCRServer is a local OCR.space look-alike (same form fields, same
+# response shape) with configurable latency and failure rate, for testing
+# and benchmarking without an API key or network.
+#
+# Usage:
+#   python ocr_batch.py scans/ --out results.jsonl --concurrency 8 --rps 10
+#   python ocr_batch.py manifest.txt --out results.jsonl    # one path per line
+#   python ocr_batch.py scans/ --cache ocr_cache.sqlite       # skip unchanged images on re-runs
+#   python ocr_batch.py --bench --images 500                 # against the mock server
+
+import argparse
+import email.parser
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+OCR_URL = 'https://api.ocr.space/parse/image'
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff', '.webp', '.pdf'}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def iter_inputs(source):
+    """Yield (doc_id, path) for a directory (walked recursively) or a manifest file.
+
+    A manifest has one path per line, or JSON lines with 'path' and an
+    optional 'id'. Relative paths are resolved against the manifest's folder.
+    """
+    if os.path.isdir(source):
+        for folder, dirs, names in os.walk(source):
+            dirs.sort()
+            for name in sorted(names):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    path = os.path.join(folder, name)
+                    yield os.path.relpath(path, source), path
+        return
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                record = json.loads(line)
+                path = record['path']
+                doc_id = record.get('id', path)
+            else:
+                path = doc_id = line
+            yield doc_id, os.path.join(base, path)
+
+
+class RateLimiter:
+    """Token bucket shared by all worker threads: `rate` requests/s, bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+class OCRError(Exception):
+    def __init__(self, message, transient=False, retry_after=None):
+        super().__init__(message)
+        self.transient = transient
+        self.retry_after = retry_after
+
+
+class OCRClient:
+    """Pooled, rate-limited, retrying OCR.space client; safe to share between threads.
+
+    >>> client = OCRClient(api_key, concurrency=8, rps=10)
+    >>> parsed, attempts = client.ocr(image_bytes, 'page1.png')
+    """
+
+    def __init__(self, api_key, url=OCR_URL, concurrency=4, rps=None, retries=4, backoff=0.5, timeout=60,
+                 language='eng', cache=None, **options):
+        self.api_key = api_key
+        self.cache = cache
+        self.url = url
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.options = dict(options, language=language)
+        self.limiter = RateLimiter(rps, burst=max(1, min(concurrency, int(rps or 1))))
+        self.session = requests.Session()
+        # One pooled connection per worker thread
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.stats = {'requests': 0, 'retries': 0, 'cached': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _post(self, image_bytes, filename):
+        self.limiter.acquire()
+        self._count('requests')
+        try:
+            response = self.session.post(self.url, files={'file': (filename, image_bytes)},
+                                         data=dict(self.options, apikey=self.api_key), timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            raise OCRError(f"{type(e).__name__}: {e}", transient=True)
+        except requests.RequestException as e:
+            # TooManyRedirects, InvalidURL, ...: retrying won't help
+            raise OCRError(f"{type(e).__name__}: {e}")
+        if response.status_code in RETRY_STATUS:
+            retry_after = response.headers.get('Retry-After')
+            raise OCRError(f"HTTP {response.status_code}", transient=True,
+                           retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if response.status_code != 200:
+            raise OCRError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+        try:
+            result = response.json()
+        except ValueError:
+            # A gateway's HTML error page or a truncated body under load
+            raise OCRError(f"invalid JSON response: {response.text[:200]!r}", transient=True)
+        if not isinstance(result, dict):
+            raise OCRError(f"unexpected response: {response.text[:200]!r}")
+        if result.get('IsErroredOnProcessing'):
+            message = result.get('ErrorMessage') or 'IsErroredOnProcessing'
+            if isinstance(message, list):
+                message = '; '.join(message)
+            # OCR.space reports its own overload as a processing error
+            raise OCRError(message, transient='timed out' in message.lower() or 'busy' in message.lower())
+        return result.get('ParsedResults') or []
+
+    def ocr(self, image_bytes, filename='image.png'):
+        """(ParsedResults list, attempts) for one image; raises OCRError once retries are used up.
+
+        attempts is 0 when the result came from the cache.
+        """
+        if self.cache is not None:
+            from ocr_cache import cache_key
+
+            key = cache_key(image_bytes, self.options)
+            parsed = self.cache.get(key)
+            if parsed is not None:
+                self._count('cached')
+                return parsed, 0
+        for attempt in range(self.retries + 1):
+            try:
+                parsed = self._post(image_bytes, filename)
+                if self.cache is not None:
+                    self.cache.put(key, parsed)
+                return parsed, attempt + 1
+            except OCRError as e:
+                if not e.transient or attempt == self.retries:
+                    e.attempts = attempt + 1
+                    raise
+                self._count('retries')
+                delay = e.retry_after if e.retry_after is not None else self.backoff * 2 ** attempt
+                time.sleep(delay * random.uniform(0.5, 1.0) if e.retry_after is None else delay)
+
+    def close(self):
+        self.session.close()
+
+
+def parsed_text(parsed_results):
+    # All pages' text, as OCR-Api prints it for the first one
+    return '\n'.join(page.get('ParsedText', '') for page in parsed_results)
+
+
+def ocr_record(client, record, image_bytes, filename):
+    # Fill a result record (status, attempts, cached, text, parsed_results or error) for one image
+    try:
+        parsed, attempts = client.ocr(image_bytes, filename)
+        record.update(status='ok', attempts=attempts, cached=attempts == 0, text=parsed_text(parsed),
+                      parsed_results=parsed)
+    except OCRError as e:
+        record.update(status='error', attempts=e.attempts, error=str(e))
+    return record
+
+
+def _process(client, doc_id, path):
+    start = time.perf_counter()
+    record = {'id': doc_id, 'path': path}
+    try:
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+    except OSError as e:
+        record.update(status='error', attempts=0, error=f"{type(e).__name__}: {e}")
+    else:
+        ocr_record(client, record, image_bytes, os.path.basename(path))
+    record['seconds'] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def run_batch(inputs, client, out, concurrency=4, process=_process, on_record=None):
+    """OCR every (doc_id, path) of `inputs`, writing one JSON line per image to `out` as each finishes.
+
+    `out` is a path or an open text file. process(client, doc_id, item) turns
+    one input into a record; the default reads `item` as an image path
+    (ocr_preprocess.py passes prepared pages instead). on_record(record) is
+    called in this thread after each record is written. An exception from
+    `process` becomes that image's error record instead of ending the batch.
+    Only a small window of inputs is
+    read ahead, so a manifest of any size streams through. Returns a summary
+    dict (images, ok, errors, seconds, images_per_s, requests, retries, cached).
+    """
+    owns_file = isinstance(out, str)
+    f = open(out, 'a', encoding='utf-8') if owns_file else out
+    summary = {'images': 0, 'ok': 0, 'errors': 0}
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            pending = {}  # future -> (doc_id, item)
+            inputs = iter(inputs)
+
+            def drain(return_when):
+                done, _ = wait(pending, return_when=return_when)
+                for future in done:
+                    doc_id, item = pending.pop(future)
+                    try:
+                        record = future.result()
+                    except Exception as e:
+                        # Items are paths, or ocr_preprocess page dicts
+                        path = item.get('path') if isinstance(item, dict) else item
+                        record = {'id': doc_id, 'path': path, 'status': 'error', 'attempts': 0,
+                                  'error': f"{type(e).__name__}: {e}"}
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    summary['images'] += 1
+                    summary['ok' if record['status'] == 'ok' else 'errors'] += 1
+                    if on_record:
+                        on_record(record)
+                f.flush()
+
+            for doc_id, item in inputs:
+                pending[pool.submit(process, client, doc_id, item)] = doc_id, item
+                if len(pending) >= concurrency * 2:
+                    drain(FIRST_COMPLETED)
+            if pending:
+                drain(ALL_COMPLETED)
+    finally:
+        if owns_file:
+            f.close()
+    summary['seconds'] = time.perf_counter() - start
+    summary['images_per_s'] = summary['images'] / summary['seconds'] if summary['seconds'] else 0.0
+    summary.update(client.stats)
+    return summary
+
+
+class MockOCRServer:
+    """Local OCR.space look-alike on 127.0.0.1, run in a background thread.
+
+    Every request sleeps `latency` seconds, plus the upload time at
+    `upload_mbps` per connection if given; a `failure_rate` fraction get a
+    503 (or 429 with Retry-After) so retries are exercised. The "text" is
+    the uploaded file name and size.
+
+    >>> with MockOCRServer(latency=0.05) as server:
+    ...     client = OCRClient('test', url=server.url)
+    """
+
+    def __init__(self, latency=0.05, failure_rate=0.0, seed=0, upload_mbps=None):
+        latency_, failure_rate_, rng, lock = latency, failure_rate, random.Random(seed), threading.Lock()
+        self.stats = {'requests': 0, 'failures': 0}
+        stats = self.stats
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # keep-alive, like the real API
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body, headers=()):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with lock:
+                    stats['requests'] += 1
+                    fail = rng.random() < failure_rate_
+                    throttle = rng.random() < 0.5
+                    if fail:
+                        stats['failures'] += 1
+                time.sleep(latency_ + (len(body) * 8 / (upload_mbps * 1e6) if upload_mbps else 0))
+                if fail:
+                    if throttle:
+                        self._reply(429, {'ErrorMessage': 'rate limit'}, [('Retry-After', '0')])
+                    else:
+                        self._reply(503, {'ErrorMessage': 'unavailable'})
+                    return
+
+                message = email.parser.BytesParser().parsebytes(
+                    b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + body)
+                fields, files = {}, []
+                for part in message.get_payload():
+                    name = part.get_param('name', header='content-disposition')
+                    if part.get_filename():
+                        files.append((part.get_filename(), len(part.get_payload(decode=True))))
+                    else:
+                        fields[name] = part.get_payload(decode=True).decode()
+                if not fields.get('apikey') or not files:
+                    self._reply(200, {'IsErroredOnProcessing': True, 'OCRExitCode': 99,
+                                      'ErrorMessage': ['No file or API key'], 'ParsedResults': None})
+                    return
+                filename, size = files[0]
+                text = f"mock text for {filename} ({size} bytes, {fields.get('language', 'eng')})\r\n"
+                self._reply(200, {'ParsedResults': [{'TextOverlay': {'Lines': []}, 'FileParseExitCode': 1,
+                                                     'ParsedText': text, 'ErrorMessage': '',
+                                                     'ErrorDetails': ''}],
+                                  'OCRExitCode': 1, 'IsErroredOnProcessing': False,
+                                  'ProcessingTimeInMilliseconds': str(int(latency_ * 1000))})
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/parse/image"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def make_sample_images(folder, count, size=(800, 600), seed=0):
+    # Small PNGs with a line of text each, for the benchmark
+    from PIL import Image, ImageDraw
+
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    for i in range(count):
+        path = os.path.join(folder, f"doc{i:06d}.png")
+        if os.path.exists(path):
+            continue
+        image = Image.new('L', size, 255)
+        ImageDraw.Draw(image).text((40, 40 + rng.randrange(400)), f"Document {i} invoice {rng.randrange(10**6)}",
+                                   fill=0)
+        image.save(path)
+    return folder
+
+
+def _bench(args):
+    import tempfile
+
+    folder = make_sample_images(os.path.join(tempfile.gettempdir(), 'ocr_bench_images'), args.images)
+    inputs = list(iter_inputs(folder))[:args.images]
+    out_dir = tempfile.mkdtemp(prefix='ocr_bench_')
+    with MockOCRServer(latency=args.latency, failure_rate=args.failure_rate) as server:
+        print(f"{len(inputs)} images against the mock server ({args.latency * 1000:.0f} ms latency, "
+              f"{args.failure_rate:.0%} transient failures):")
+        for concurrency in sorted({1, args.concurrency}):
+            # The one-at-a-time baseline is timed on a sample and extrapolated
+            sample = inputs if concurrency > 1 else inputs[:max(10, len(inputs) // 10)]
+            client = OCRClient('mock', url=server.url, concurrency=concurrency, rps=args.rps, backoff=0.05)
+            summary = run_batch(sample, client, os.path.join(out_dir, f"c{concurrency}.jsonl"), concurrency)
+            client.close()
+            print(f"  concurrency {concurrency:>3}: {summary['images_per_s']:8.1f} images/s  "
+                  f"ok {summary['ok']}/{summary['images']}  retries {summary['retries']}")
+    print(f"Results in {out_dir}/")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR a directory or manifest of images with OCR.space.")
+    parser.add_argument('inputs', nargs='?', help="a directory of images, or a manifest file")
+    parser.add_argument('--out', default='ocr_results.jsonl', help="JSONL output, appended to")
+    parser.add_argument('--api-key', default=os.environ.get('OCR_SPACE_API_KEY'))
+    parser.add_argument('--url', default=OCR_URL)
+    parser.add_argument('--language', default='eng')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rps', type=float, default=None, help="requests per second limit (default: none)")
+    parser.add_argument('--retries', type=int, default=4)
+    parser.add_argument('--cache', metavar='SQLITE', help="reuse results for images already OCRed (ocr_cache.py)")
+    parser.add_argument('--cache-mb', type=float, default=512)
+    parser.add_argument('--index', metavar='SQLITE', help="add the text to a full-text index (ocr_index.py)")
+    parser.add_argument('--mock', action='store_true', help="send everything to a local mock server")
+    parser.add_argument('--bench', action='store_true', help="benchmark against the mock server")
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.1, help="mock server latency in seconds")
+    parser.add_argument('--failure-rate', type=float, default=0.05)
+    args = parser.parse_args()
+
+    if args.bench:
+        _bench(args)
+        return
+    if not args.inputs:
+        parser.error("give a directory or manifest, or --bench")
+
+    server = MockOCRServer(latency=args.latency, failure_rate=args.failure_rate).__enter__() if args.mock else None
+    url = server.url if server else args.url
+    if not args.api_key and not server:
+        parser.error("set --api-key or OCR_SPACE_API_KEY (free key at https://ocr.space/ocrapi)")
+    cache = index = None
+    if args.cache:
+        from ocr_cache import OCRCache
+
+        cache = OCRCache(args.cache, args.cache_mb)
+    if args.index:
+        from ocr_index import OCRIndex
+
+        index = OCRIndex(args.index)
+    client = OCRClient(args.api_key or 'mock', url=url, concurrency=args.concurrency, rps=args.rps,
+                       retries=args.retries, language=args.language, cache=cache)
+    try:
+        summary = run_batch(iter_inputs(args.inputs), client, args.out, args.concurrency,
+                            on_record=index.add_record if index is not None else None)
+    finally:
+        client.close()
+        if cache:
+            cache.close()
+        if index is not None:
+            index.close()
+        if server:
+            server.__exit__(None, None, None)
+    print(f"{summary['images']} images in {summary['seconds']:.1f} s ({summary['images_per_s']:.1f} images/s): "
+          f"{summary['ok']} ok ({summary['cached']} cached), {summary['errors']} errors, {summary['retries']} retries "
+          f"-> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# Content-hash cache of OCR results
+#
+# Re-running OCR over mostly unchanged inputs re-uploads every image. OCRCache
+# keeps each image's ParsedResults in a local SQLite file, keyed by
+#   sha256(image bytes + OCR options)
+# so a renamed or moved file is still a hit, while the same image with a
+# different language (or any other option) is a separate entry. A hit skips
+# the network, the rate limiter and the retries entirely.
+#
+# The cache is bounded: once the stored results exceed max_mb, the least
+# recently used entries are deleted. The size is summed in the database on
+# every store, so several processes sharing one file keep to the limit.
+# Hits and misses are counted in .stats (this session) and per entry in the
+# database (all sessions); storing a result again keeps its hits and created
+# time.
+#
+#   cache = OCRCache('ocr_cache.sqlite', max_mb=512)
+#   client = OCRClient(api_key, cache=cache)      # see ocr_batch.py
+#
+# Usage:
+#   python ocr_batch.py scans/ --cache ocr_cache.sqlite
+#   python ocr_cache.py stats ocr_cache.sqlite
+#   python ocr_cache.py bench --images 200         # cold vs warm run on the mock server
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = 'ocr_cache.sqlite'
+
+
+def cache_key(image_bytes, options):
+    # Options are serialised with sorted keys, so their order doesn't matter
+    digest = hashlib.sha256(image_bytes)
+    digest.update(b'\0' + json.dumps(options, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """SQLite-backed, size-bounded LRU cache of ParsedResults; safe to share between threads."""
+
+    def __init__(self, path=CACHE_PATH, max_mb=512):
+        self.path = path
+        self.max_bytes = int(max_mb * 1e6)
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evicted': 0}
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS results (
+                                key TEXT PRIMARY KEY,
+                                parsed TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                created REAL NOT NULL,
+                                last_used REAL NOT NULL,
+                                hits INTEGER NOT NULL DEFAULT 0)''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        # Lets SUM(size) read a small index instead of every stored result
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_size ON results (size)')
+
+    def _stored_bytes(self):
+        return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def get(self, key):
+        """The cached ParsedResults for `key`, or None."""
+        with self._lock:
+            row = self._db.execute('SELECT parsed FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self._db.execute('UPDATE results SET last_used = ?, hits = hits + 1 WHERE key = ?', (time.time(), key))
+            self.stats['hits'] += 1
+        return json.loads(row[0])
+
+    def put(self, key, parsed_results):
+        payload = json.dumps(parsed_results, ensure_ascii=False)
+        size = len(payload.encode())
+        now = time.time()
+        with self._lock:
+            # One write transaction, so the size checked is the size stored by
+            # every process using this file, not a count kept by this one
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._db.execute('INSERT INTO results (key, parsed, size, created, last_used) VALUES (?, ?, ?, ?, ?) '
+                                 'ON CONFLICT(key) DO UPDATE SET parsed = excluded.parsed, size = excluded.size, '
+                                 'last_used = excluded.last_used', (key, payload, size, now, now))
+                self.stats['stores'] += 1
+                stored = self._stored_bytes()
+                if stored > self.max_bytes:
+                    self._evict(stored)
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def _evict(self, stored):
+        # Delete least recently used entries until 90% of the limit, so a full
+        # cache isn't trimmed on every put; runs inside put()'s transaction
+        target = self.max_bytes * 0.9
+        for key, size in self._db.execute('SELECT key, size FROM results ORDER BY last_used').fetchall():
+            if stored <= target:
+                break
+            self._db.execute('DELETE FROM results WHERE key = ?', (key,))
+            stored -= size
+            self.stats['evicted'] += 1
+
+    def summary(self):
+        # Entries, stored MB and lifetime hits across all sessions
+        with self._lock:
+            entries, hits, stored = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(hits), 0), COALESCE(SUM(size), 0) FROM results').fetchone()
+        return {'entries': entries, 'mb': stored / 1e6, 'max_mb': self.max_bytes / 1e6, 'lifetime_hits': hits}
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM results')
+            self._db.execute('VACUUM')
+
+    def close(self):
+        self._db.close()
+
+
+def _bench(args):
+    import tempfile
+    from ocr_batch import MockOCRServer, OCRClient, iter_inputs, make_sample_images, run_batch
+
+    folder = make_sample_images(os.path.join(tempfile.gettempdir(), 'ocr_bench_images'), args.images)
+    inputs = list(iter_inputs(folder))[:args.images]
+    out_dir = tempfile.mkdtemp(prefix='ocr_cache_bench_')
+    cache = OCRCache(os.path.join(out_dir, 'cache.sqlite'))
+    with MockOCRServer(latency=args.latency) as server:
+        print(f"{len(inputs)} images, mock server latency {args.latency * 1000:.0f} ms:")
+        for run in ('cold', 'warm'):
+            client = OCRClient('mock', url=server.url, concurrency=args.concurrency, cache=cache)
+            summary = run_batch(inputs, client, os.path.join(out_dir, f"{run}.jsonl"), args.concurrency)
+            client.close()
+            print(f"  {run}: {summary['images_per_s']:8.1f} images/s  {summary['requests']:4d} requests")
+    print(f"  cache: {cache.stats}, {cache.summary()['mb']:.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or benchmark the OCR result cache.")
+    parser.add_argument('command', choices=['stats', 'clear', 'bench'])
+    parser.add_argument('path', nargs='?', default=CACHE_PATH)
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        _bench(args)
+        return
+    cache = OCRCache(args.path)
+    if args.command == 'clear':
+        cache.clear()
+    summary = cache.summary()
+    print(f"{args.path}: {summary['entries']} entries, {summary['mb']:.2f} / {summary['max_mb']:.0f} MB, "
+          f"{summary['lifetime_hits']} hits")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+# Local full-text index over OCR results
+#
+# OCR-Api prints the extracted text and forgets it. OCRIndex keeps every
+# page's text in a SQLite FTS5 table (an inverted index: token -> pages),
+# so finding which document mentions a phrase is a single indexed lookup
+# instead of re-OCRing or scanning everything:
+#   - pages are keyed by (doc_id, page); re-adding a page replaces it
+#   - inserts are batched into transactions of `batch` pages, so results
+#     can be added one at a time as they arrive (ocr_batch.py --index)
+#   - ingest() reads an ocr_batch JSONL file from where it last stopped, so
+#     re-running it only indexes the new lines
+#   - search() takes plain keywords (every word must appear), a phrase, or
+#     raw FTS5 syntax, and returns the best matches first (bm25) with a
+#     highlighted snippet. Ranking has to score every matching page, so
+#     for queries matching more than RANK_LIMIT pages (words on nearly every
+#     page) it returns the newest matches instead, which stream straight
+#     off the index.
+#
+# Usage:
+#   python ocr_batch.py scans/ --out results.jsonl --index ocr_index.sqlite
+#   python ocr_index.py ingest results.jsonl
+#   python ocr_index.py search invoice 2023
+#   python ocr_index.py search --phrase "total amount due"
+#   python ocr_index.py bench --pages 300000
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import statistics
+import time
+
+INDEX_PATH = 'ocr_index.sqlite'
+TOKEN = re.compile(r'\w+')
+RANK_LIMIT = 20_000 # Matching pages above which bm25 ranking is skipped
+
+
+def to_match(query, phrase=False):
+    """FTS5 MATCH expression for a plain query: every word (AND), or the exact phrase.
+
+    Words are quoted, so punctuation and FTS5 keywords (AND, NEAR, ...) in
+    user input are matched literally instead of being parsed as syntax.
+    """
+    words = TOKEN.findall(query)
+    if not words:
+        raise ValueError(f"No searchable words in {query!r}")
+    if phrase:
+        return '"' + ' '.join(words) + '"'
+    return ' '.join(f'"{word}"' for word in words)
+
+
+class OCRIndex:
+    """SQLite FTS5 index of OCR page text.
+
+    >>> index = OCRIndex('ocr_index.sqlite')
+    >>> index.add('scan-0001', 'Total amount due: 120.00', page=1)
+    >>> index.search('amount due', phrase=True)
+    """
+
+    def __init__(self, path=INDEX_PATH, batch=1000):
+        self.path = path
+        self.batch = batch
+        self._pending = 0
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                path TEXT,
+                added REAL NOT NULL,
+                UNIQUE (doc_id, page));
+            CREATE VIRTUAL TABLE IF NOT EXISTS page_text USING fts5(
+                text, tokenize = 'unicode61 remove_diacritics 2');
+            CREATE TABLE IF NOT EXISTS sources (
+                path TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL);''')
+
+    def _begin(self):
+        if not self._db.in_transaction:
+            self._db.execute('BEGIN')
+
+    def add(self, doc_id, text, page=1, path=None):
+        """Index one page's text, replacing whatever (doc_id, page) had before."""
+        self._begin()
+        old = self._db.execute('SELECT id FROM pages WHERE doc_id = ? AND page = ?', (doc_id, page)).fetchone()
+        if old:
+            self._db.execute('DELETE FROM page_text WHERE rowid = ?', old)
+            self._db.execute('DELETE FROM pages WHERE id = ?', old)
+        row_id = self._db.execute('INSERT INTO pages (doc_id, page, path, added) VALUES (?, ?, ?, ?)',
+                                  (doc_id, page, path, time.time())).lastrowid
+        self._db.execute('INSERT INTO page_text (rowid, text) VALUES (?, ?)', (row_id, text))
+        self._pending += 1
+        if self._pending >= self.batch:
+            self.commit()
+
+    def add_record(self, record):
+        """Index an ocr_batch / ocr_preprocess JSONL record; returns the pages added (0 for errors)."""
+        if record.get('status') != 'ok':
+            return 0
+        if 'page' in record: # ocr_preprocess: one record per page
+            self.add(record['id'], record['text'], record['page'], record.get('path'))
+            return 1
+        results = record.get('parsed_results') or [{'ParsedText': record.get('text', '')}]
+        for number, result in enumerate(results, 1): # ocr_batch: OCR.space pages a PDF itself
+            self.add(record['id'], result.get('ParsedText', ''), number, record.get('path'))
+        return len(results)
+
+    def ingest(self, jsonl_path):
+        """Index the lines of a results JSONL file added since the last ingest; returns pages added."""
+        key = os.path.abspath(jsonl_path)
+        row = self._db.execute('SELECT offset FROM sources WHERE path = ?', (key,)).fetchone()
+        offset = row[0] if row and row[0] <= os.path.getsize(jsonl_path) else 0
+        added = 0
+        with open(jsonl_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break # Still being written; picked up next time
+                added += self.add_record(json.loads(line))
+                offset += len(line)
+        self._begin()
+        self._db.execute('INSERT OR REPLACE INTO sources (path, offset) VALUES (?, ?)', (key, offset))
+        self.commit()
+        return added
+
+    def commit(self):
+        if self._db.in_transaction:
+            self._db.execute('COMMIT')
+        self._pending = 0
+
+    def search(self, query, limit=20, phrase=False, raw=False, order='auto', snippet_words=12):
+        """Matching pages as dicts with doc_id, page, path, snippet and score.
+
+        `query` is plain words (all must appear), a phrase with phrase=True,
+        or an FTS5 expression with raw=True (e.g. 'invoice NOT draft',
+        'NEAR(total due, 3)', 'inv*'). order is 'rank' (best bm25 first),
+        'recent' (last indexed first) or 'auto': rank unless more than
+        RANK_LIMIT pages match.
+        """
+        self.commit()
+        match = query if raw else to_match(query, phrase)
+        if order == 'auto':
+            # Stops after RANK_LIMIT + 1 matches, so the probe itself stays cheap
+            matches = self._db.execute('SELECT COUNT(*) FROM (SELECT rowid FROM page_text WHERE page_text MATCH ? '
+                                       'LIMIT ?)', (match, RANK_LIMIT + 1)).fetchone()[0]
+            order = 'rank' if matches <= RANK_LIMIT else 'recent'
+        # bm25() needs corpus-wide statistics for every phrase, so unranked
+        # results don't compute it at all (score None)
+        score, sort = ('bm25(page_text)', 'bm25(page_text)') if order == 'rank' else ('NULL', 'page_text.rowid DESC')
+        rows = self._db.execute(
+            f"SELECT p.doc_id, p.page, p.path, snippet(page_text, 0, '[', ']', '...', ?), {score} "
+            'FROM page_text JOIN pages p ON p.id = page_text.rowid '
+            f'WHERE page_text MATCH ? ORDER BY {sort} LIMIT ?', (snippet_words, match, limit)).fetchall()
+        return [{'doc_id': doc_id, 'page': page, 'path': path, 'snippet': snippet,
+                 'score': -score if score is not None else None}
+                for doc_id, page, path, snippet, score in rows]
+
+    def count(self, query, phrase=False, raw=False):
+        self.commit()
+        match = query if raw else to_match(query, phrase)
+        return self._db.execute('SELECT COUNT(*) FROM page_text WHERE page_text MATCH ?', (match,)).fetchone()[0]
+
+    def documents(self, query, phrase=False, raw=False):
+        # Distinct doc_ids with at least one matching page
+        self.commit()
+        match = query if raw else to_match(query, phrase)
+        return [row[0] for row in self._db.execute(
+            'SELECT DISTINCT p.doc_id FROM page_text JOIN pages p ON p.id = page_text.rowid '
+            'WHERE page_text MATCH ?', (match,))]
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def optimize(self):
+        # Merge the FTS5 segment b-trees left by many small transactions
+        self.commit()
+        self._db.execute("INSERT INTO page_text (page_text) VALUES ('optimize')")
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+
+def _synthetic_pages(count, words_per_page, seed=0, first=0):
+    # Zipf-distributed words from a fixed vocabulary, like real text: a few
+    # very common words, a long tail of rare ones
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"w{i}" for i in range(50_000)])
+    for start in range(0, count, 1000):
+        n = min(1000, count - start)
+        ids = np.minimum(rng.zipf(1.3, (n, words_per_page)), len(vocabulary)) - 1
+        for i, row in enumerate(vocabulary[ids]):
+            yield f"doc{first + start + i:07d}", ' '.join(row)
+
+
+def _bench(args):
+    import tempfile
+
+    import numpy as np
+
+    path = os.path.join(tempfile.mkdtemp(prefix='ocr_index_bench_'), 'index.sqlite')
+    index = OCRIndex(path, batch=5000)
+    texts = []
+    start = time.perf_counter()
+    for doc_id, text in _synthetic_pages(args.pages, args.words):
+        index.add(doc_id, text)
+        if len(texts) < args.scan_sample:
+            texts.append(text)
+    index.commit()
+    insert_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    index.optimize()
+    optimize_seconds = time.perf_counter() - start
+    print(f"Indexed {len(index)} pages x {args.words} words in {insert_seconds:.1f} s "
+          f"({len(index) / insert_seconds:,.0f} pages/s), optimize {optimize_seconds:.1f} s, "
+          f"{os.path.getsize(path) / 1e6:.0f} MB")
+
+    # Incremental: a small batch on top of the big index
+    start = time.perf_counter()
+    for doc_id, text in _synthetic_pages(1000, args.words, seed=1, first=args.pages):
+        index.add(doc_id, text)
+    index.commit()
+    print(f"  +1000 pages incrementally: {(time.perf_counter() - start) * 1e3:.0f} ms")
+
+    # The phrase is taken from a real page so it has at least one hit
+    phrase_words = texts[0].split()[5:8]
+    queries = {
+        'common word': ('w1', False),
+        'rare word': ('w20000', False),
+        'two words (AND)': ('w5 w700', False),
+        'three-word phrase': (' '.join(phrase_words), True),
+        'common phrase': ('w0 w1', True),
+    }
+    print(f"  {'query':<20} {'hits':>8} {'order':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, (query, phrase) in queries.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            index.search(query, limit=20, phrase=phrase)
+            timings.append((time.perf_counter() - start) * 1e3)
+        hits = index.count(query, phrase)
+        print(f"  {name:<20} {hits:>8} {'rank' if hits <= RANK_LIMIT else 'recent':>7} "
+              f"{statistics.median(timings):>8.2f} {np.percentile(timings, 95):>8.2f}")
+
+    # Linear scan for comparison, timed on a sample and scaled to the full index
+    needle = ' '.join(phrase_words)
+    start = time.perf_counter()
+    sum(needle in text for text in texts)
+    scan_ms = (time.perf_counter() - start) * 1e3 / len(texts) * len(index)
+    print(f"  linear scan for the phrase (est): {scan_ms:.0f} ms")
+    index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text index over OCR results.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest = commands.add_parser('ingest', help="index new lines of results JSONL files")
+    ingest.add_argument('jsonl', nargs='+')
+    search = commands.add_parser('search', help="keyword or phrase search")
+    search.add_argument('query', nargs='+')
+    search.add_argument('--phrase', action='store_true')
+    search.add_argument('--raw', action='store_true', help="the query is FTS5 syntax")
+    search.add_argument('--limit', type=int, default=20)
+    search.add_argument('--order', choices=['auto', 'rank', 'recent'], default='auto')
+    bench = commands.add_parser('bench', help="insert and query latency on synthetic pages")
+    bench.add_argument('--pages', type=int, default=300_000)
+    bench.add_argument('--words', type=int, default=200)
+    bench.add_argument('--repeat', type=int, default=50)
+    bench.add_argument('--scan-sample', type=int, default=20_000)
+    for sub in (ingest, search):
+        sub.add_argument('--index', default=INDEX_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        _bench(args)
+        return
+    index = OCRIndex(args.index)
+    if args.command == 'ingest':
+        for path in args.jsonl:
+            print(f"{path}: {index.ingest(path)} new pages")
+        print(f"{args.index}: {len(index)} pages")
+    else:
+        query = ' '.join(args.query)
+        start = time.perf_counter()
+        hits = index.search(query, args.limit, args.phrase, args.raw, args.order)
+        seconds = time.perf_counter() - start
+        for hit in hits:
+            score = f"{hit['score']:6.2f}" if hit['score'] is not None else '     -'
+            print(f"{hit['doc_id']}  p{hit['page']}  {score}  {hit['snippet']}")
+        print(f"{len(hits)} results in {seconds * 1e3:.1f} ms")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+# Client-side image preprocessing before OCR upload
+#
+# ocr_batch.py uploads every file as-is. Phone photos are often 3-10 MB and
+# far above the resolution OCR needs, and multi-page scans go up as one
+# large request (or exceed the API's size limit). Preprocessor shrinks them
+# first, in worker processes:
+#   - fixes the EXIF rotation, then downscales to `target_dpi`: by the DPI
+#     the file records, or, for images without one (phone photos), so the
+#     long side is at most a page's long side (page_inches) at target_dpi.
+#     Never upscales. JPEGs are decoded straight at reduced size
+#     (Image.draft), which skips most of the decoding work.
+#   - converts to grayscale and recompresses (JPEG at `quality`; bilevel
+#     scans as PNG), lowering quality and then size until a page fits
+#     `max_bytes` (OCR.space's free tier accepts 1 MB)
+#   - splits multi-page TIFFs into pages, and multi-page PDFs too when
+#     pypdfium2 is installed (each page rendered at target_dpi). Without it,
+#     PDFs are uploaded unchanged and OCR.space splits them itself.
+#   - keeps the original when recompressing wouldn't make it smaller and it
+#     is already what would be sent (e.g. grayscale when grayscale is on)
+#
+# Pages are prepared a few files ahead of the uploads, so CPU work in the
+# worker processes overlaps with the network waits in ocr_batch's threads.
+# Each JSONL record gains page, bytes_in (the file's share) and upload_bytes.
+#
+# Usage:
+#   python ocr_preprocess.py scans/ --out results.jsonl --workers 4 --concurrency 8
+#   python ocr_preprocess.py scans/ --mock --cache ocr_cache.sqlite --cache-mb 256   # no API key needed
+#   python ocr_preprocess.py --bench --images 40 --upload-mbps 20   # raw vs preprocessed, mock server
+
+import argparse
+import io
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ocr_batch import (OCR_URL, MockOCRServer, OCRClient, iter_inputs, ocr_record, run_batch,
+                       _process as _process_file)
+
+TARGET_DPI = 300
+PAGE_INCHES = 11.7 # A4's long side; US letter is 11
+MAX_BYTES = 1_000_000
+QUALITY = 80
+
+
+def _fit(image, target_dpi, page_inches):
+    # Scale factor (<= 1) that brings `image` down to target_dpi
+    dpi = image.info.get('dpi')
+    if dpi and dpi[0] > 1 and dpi[0] != 72: # 72 is a placeholder most cameras write
+        return min(1.0, target_dpi / float(dpi[0]))
+    return min(1.0, target_dpi * page_inches / max(image.size))
+
+
+def _encode(image, quality, max_bytes):
+    # Grayscale JPEG (PNG for bilevel) within max_bytes; lowers quality, then size
+    from PIL import Image
+
+    if image.mode == '1':
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue(), 'png'
+    while True:
+        for q in range(quality, 39, -15):
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=q, optimize=True)
+            if not max_bytes or buffer.tell() <= max_bytes:
+                return buffer.getvalue(), 'jpg'
+        if min(image.size) < 200:
+            return buffer.getvalue(), 'jpg'
+        image = image.resize((int(image.width * 0.8), int(image.height * 0.8)), Image.LANCZOS)
+
+
+def _normalise(image, grayscale):
+    # Alpha over white, palette/CMYK/16-bit to 8-bit L or RGB
+    from PIL import Image
+
+    if image.mode == '1':
+        return image
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    if grayscale:
+        return image.convert('L') if image.mode != 'L' else image
+    return image.convert('RGB') if image.mode != 'RGB' else image
+
+
+def _pdf_pages(path, target_dpi, grayscale):
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(path)
+    try:
+        for i in range(len(pdf)):
+            yield pdf[i].render(scale=target_dpi / 72, grayscale=grayscale).to_pil()
+    finally:
+        pdf.close()
+
+
+def prepare_file(path, target_dpi=TARGET_DPI, page_inches=PAGE_INCHES, grayscale=True, quality=QUALITY,
+                 max_bytes=MAX_BYTES):
+    """Preprocess one file into upload-ready pages.
+
+    Returns (pages, bytes_in) where each page is a dict with page (1-based),
+    filename, data (encoded bytes) and size.
+    """
+    from PIL import Image, ImageOps, ImageSequence
+
+    bytes_in = os.path.getsize(path)
+    stem, ext = os.path.splitext(os.path.basename(path))
+    pages = []
+    if ext.lower() == '.pdf':
+        try:
+            frames = list(_pdf_pages(path, target_dpi, grayscale))
+        except ImportError:
+            with open(path, 'rb') as f:
+                return [{'page': 1, 'filename': os.path.basename(path), 'data': f.read(), 'size': None}], bytes_in
+        for number, frame in enumerate(frames, 1):
+            data, fmt = _encode(_normalise(frame, grayscale), quality, max_bytes)
+            pages.append({'page': number, 'filename': f"{stem}-p{number}.{fmt}", 'data': data, 'size': frame.size})
+        return pages, bytes_in
+
+    with Image.open(path) as image:
+        original_format = image.format
+        frames = getattr(image, 'n_frames', 1)
+        for number, frame in enumerate(ImageSequence.Iterator(image), 1):
+            original_mode, orientation = frame.mode, frame.getexif().get(0x0112, 1)
+            scale = _fit(frame, target_dpi, page_inches)
+            target = (max(1, round(frame.width * scale)), max(1, round(frame.height * scale)))
+            if orientation in (5, 6, 7, 8): # Rotated 90 degrees by exif_transpose
+                target = target[::-1]
+            if frames == 1 and original_format == 'JPEG' and scale < 1:
+                # Decode at 1/2, 1/4 or 1/8 scale directly where that still covers the target
+                frame.draft('L' if grayscale else 'RGB', (target[0] + 1, target[1] + 1))
+            page = _normalise(ImageOps.exif_transpose(frame), grayscale)
+            if page.size != target:
+                page = page.resize(target, Image.LANCZOS, reducing_gap=3.0)
+            data, fmt = _encode(page, quality, max_bytes)
+            pages.append({'page': number, 'filename': f"{stem}-p{number}.{fmt}" if frames > 1 else f"{stem}.{fmt}",
+                          'data': data, 'size': page.size})
+
+    if len(pages) == 1 and scale == 1 and original_format in ('JPEG', 'PNG') and orientation == 1 and \
+            original_mode == page.mode and bytes_in <= len(pages[0]['data']):
+        # Already small, and already the image we would send (same size, mode
+        # and orientation): recompressing would only grow it. A colour
+        # original still goes up as the grayscale page when grayscale is on,
+        # so the server always gets the same kind of input
+        with open(path, 'rb') as f:
+            pages[0].update(filename=os.path.basename(path), data=f.read())
+    return pages, bytes_in
+
+
+def _prepare_job(path, settings):
+    start = time.perf_counter()
+    try:
+        pages, bytes_in = prepare_file(path, **settings)
+    except Exception as e: # Unreadable or unsupported file: reported per record, the batch goes on
+        return {'error': f"{type(e).__name__}: {e}", 'seconds': time.perf_counter() - start}
+    return {'pages': pages, 'bytes_in': bytes_in, 'seconds': time.perf_counter() - start}
+
+
+class Preprocessor:
+    """Prepares pages in worker processes, a few files ahead of the consumer.
+
+    >>> pre = Preprocessor(workers=4, target_dpi=300)
+    >>> summary = run_batch(pre.pages(iter_inputs('scans')), client, 'out.jsonl', process=process_page)
+    >>> pre.stats['bytes_in'] - pre.stats['bytes_out']
+    """
+
+    def __init__(self, workers=None, lookahead=None, **settings):
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.lookahead = lookahead or max(2, self.workers * 2)
+        self.settings = settings
+        self.stats = {'files': 0, 'pages': 0, 'errors': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_seconds': 0.0}
+
+    def _account(self, path, result):
+        # Per-page items for one prepared file; the file's bytes_in is split over its pages
+        self.stats['files'] += 1
+        self.stats['cpu_seconds'] += result['seconds']
+        if 'error' in result:
+            self.stats['errors'] += 1
+            return [{'path': path, 'page': 1, 'error': result['error']}]
+        pages = result['pages']
+        if not pages: # An empty PDF, or a render that produced nothing
+            self.stats['errors'] += 1
+            return [{'path': path, 'page': 1, 'error': "no pages to upload"}]
+        self.stats['pages'] += len(pages)
+        self.stats['bytes_in'] += result['bytes_in']
+        self.stats['bytes_out'] += sum(len(page['data']) for page in pages)
+        return [dict(page, path=path, bytes_in=result['bytes_in'] // len(pages)) for page in pages]
+
+    def pages(self, inputs):
+        """Yield (doc_id, page) for every page of every (doc_id, path), in input order."""
+        if self.workers == 0:
+            for doc_id, path in inputs:
+                for page in self._account(path, _prepare_job(path, self.settings)):
+                    yield doc_id, page
+            return
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            window = deque()
+            inputs = iter(inputs)
+            exhausted = False
+            while window or not exhausted:
+                while not exhausted and len(window) < self.lookahead:
+                    item = next(inputs, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    doc_id, path = item
+                    window.append((doc_id, path, pool.submit(_prepare_job, path, self.settings)))
+                if window:
+                    doc_id, path, future = window.popleft()
+                    for page in self._account(path, future.result()):
+                        yield doc_id, page
+
+
+def process_page(client, doc_id, page):
+    # run_batch() process function for Preprocessor pages
+    start = time.perf_counter()
+    record = {'id': doc_id, 'path': page['path'], 'page': page['page']}
+    if 'error' in page:
+        record.update(status='error', attempts=0, error=page['error'])
+    else:
+        record.update(bytes_in=page['bytes_in'], upload_bytes=len(page['data']))
+        ocr_record(client, record, page['data'], page['filename'])
+    record['seconds'] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def make_sample_photos(folder, count, size=(4032, 3024), seed=0):
+    # Noisy colour "phone photos" of a text page, plus one 4-page 300 dpi TIFF scan
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    for i in range(count):
+        path = os.path.join(folder, f"photo{i:05d}.jpg")
+        if os.path.exists(path):
+            continue
+        pixels = np.clip(rng.normal(200, 25, (size[1], size[0], 3)), 0, 255).astype(np.uint8)
+        image = Image.fromarray(pixels)
+        draw = ImageDraw.Draw(image)
+        for line in range(40):
+            draw.text((300, 200 + line * 60), f"Line {line} of document {i}: total {rng.integers(10**6)}",
+                      fill=(20, 20, 20))
+        image.save(path, quality=95)
+    path = os.path.join(folder, 'scan.tif')
+    if not os.path.exists(path):
+        frames = [Image.new('L', (2550, 3300), 255) for _ in range(4)]
+        for number, frame in enumerate(frames):
+            ImageDraw.Draw(frame).text((200, 200), f"Scanned page {number + 1}", fill=0)
+        frames[0].save(path, save_all=True, append_images=frames[1:], dpi=(600, 600), compression='raw')
+    return folder
+
+
+def _bench(args):
+    import tempfile
+
+    folder = make_sample_photos(os.path.join(tempfile.gettempdir(), 'ocr_bench_photos'), args.images)
+    inputs = list(iter_inputs(folder))
+    out_dir = tempfile.mkdtemp(prefix='ocr_preprocess_bench_')
+    total_in = sum(os.path.getsize(path) for _, path in inputs)
+    with MockOCRServer(latency=args.latency, upload_mbps=args.upload_mbps) as server:
+        print(f"{len(inputs)} files, {total_in / 1e6:.1f} MB, mock server {args.latency * 1000:.0f} ms + "
+              f"{args.upload_mbps} Mbit/s per connection, {args.concurrency} uploads in flight:")
+
+        client = OCRClient('mock', url=server.url, concurrency=args.concurrency)
+        raw = run_batch(inputs, client, os.path.join(out_dir, 'raw.jsonl'), args.concurrency, _process_file)
+        client.close()
+        print(f"  raw upload:   {raw['images'] / raw['seconds']:7.2f} files/s  {total_in / 1e6:8.1f} MB sent")
+
+        pre = Preprocessor(args.workers, target_dpi=args.dpi, quality=args.quality)
+        client = OCRClient('mock', url=server.url, concurrency=args.concurrency)
+        summary = run_batch(pre.pages(inputs), client, os.path.join(out_dir, 'pre.jsonl'), args.concurrency,
+                            process_page)
+        client.close()
+        stats = pre.stats
+        print(f"  preprocessed: {stats['files'] / summary['seconds']:7.2f} files/s  "
+              f"{stats['bytes_out'] / 1e6:8.1f} MB sent ({stats['pages']} pages, "
+              f"{1 - stats['bytes_out'] / stats['bytes_in']:.0%} saved, "
+              f"{stats['cpu_seconds']:.1f} s preprocessing in {args.workers} workers)")
+    print(f"Results in {out_dir}/")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocess images and OCR them with OCR.space.")
+    parser.add_argument('inputs', nargs='?', help="a directory of images, or a manifest file")
+    parser.add_argument('--out', default='ocr_results.jsonl')
+    parser.add_argument('--api-key', default=os.environ.get('OCR_SPACE_API_KEY'))
+    parser.add_argument('--url', default=OCR_URL)
+    parser.add_argument('--language', default='eng')
+    parser.add_argument('--concurrency', type=int, default=4, help="uploads in flight")
+    parser.add_argument('--rps', type=float, default=None)
+    parser.add_argument('--workers', type=int, default=None, help="preprocessing processes (0: inline)")
+    parser.add_argument('--dpi', type=int, default=TARGET_DPI)
+    parser.add_argument('--quality', type=int, default=QUALITY)
+    parser.add_argument('--color', action='store_true', help="keep colour instead of converting to grayscale")
+    parser.add_argument('--cache', metavar='SQLITE', help="reuse results for pages already OCRed (ocr_cache.py)")
+    parser.add_argument('--cache-mb', type=float, default=512)
+    parser.add_argument('--index', metavar='SQLITE', help="add the text to a full-text index (ocr_index.py)")
+    parser.add_argument('--mock', action='store_true', help="send everything to a local mock server")
+    parser.add_argument('--bench', action='store_true', help="raw vs preprocessed uploads against the mock server")
+    parser.add_argument('--images', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--upload-mbps', type=float, default=20)
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="mock server failure rate")
+    args = parser.parse_args()
+
+    if args.bench:
+        args.workers = args.workers if args.workers is not None else os.cpu_count() or 1
+        _bench(args)
+        return
+    if not args.inputs:
+        parser.error("give a directory or manifest, or --bench")
+    if not args.api_key and not args.mock:
+        parser.error("set --api-key or OCR_SPACE_API_KEY (free key at https://ocr.space/ocrapi)")
+
+    server = MockOCRServer(latency=args.latency, failure_rate=args.failure_rate,
+                           upload_mbps=args.upload_mbps).__enter__() if args.mock else None
+    url = server.url if server else args.url
+    cache = index = None
+    if args.cache:
+        from ocr_cache import OCRCache
+
+        cache = OCRCache(args.cache, args.cache_mb)
+    if args.index:
+        from ocr_index import OCRIndex
+
+        index = OCRIndex(args.index)
+    pre = Preprocessor(args.workers, target_dpi=args.dpi, quality=args.quality, grayscale=not args.color)
+    client = OCRClient(args.api_key or 'mock', url=url, concurrency=args.concurrency, rps=args.rps,
+                       language=args.language, cache=cache)
+    try:
+        summary = run_batch(pre.pages(iter_inputs(args.inputs)), client, args.out, args.concurrency, process_page,
+                            on_record=index.add_record if index is not None else None)
+    finally:
+        client.close()
+        if cache:
+            cache.close()
+        if index is not None:
+            index.close()
+        if server:
+            server.__exit__(None, None, None)
+    stats = pre.stats
+    print(f"{stats['files']} files / {stats['pages']} pages in {summary['seconds']:.1f} s "
+          f"({stats['files'] / summary['seconds']:.2f} files/s): {summary['ok']} ok, {summary['errors']} errors")
+    print(f"Uploaded {stats['bytes_out'] / 1e6:.1f} MB instead of {stats['bytes_in'] / 1e6:.1f} MB "
+          f"({stats['bytes_in'] - stats['bytes_out']:,} bytes saved)")
+
+
+if __name__ == "__main__":
+    main()
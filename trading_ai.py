@@ -9,17 +9,28 @@
 # pip install tensorflow==2.13.0
 #
 # Then install the other libraries:
-# pip install yfinance pandas numpy scikit-learn matplotlib ta
+# pip install yfinance pandas pyarrow numpy scikit-learn matplotlib ta
+#
+# Each numbered step below is a function so other scripts (e.g. trading_runner.py)
+# can reuse the pipeline; running this file directly still walks through all of them.
+# Indicators are read through the feature store in feature_store/ (see trading_features.py).
+# Trained models are saved under artifacts/ (see trading_artifacts.py) and reused
+# when the data and config haven't changed; pass --retrain to train anyway.
+# Pass --profile report.json to time every numbered step (see trading_profiling.py).
+# For histories too long to hold in RAM (e.g. years of minute bars), trading_outofcore.py
+# runs the same steps on chunks and trains from a memory-mapped float32 feature file.
+# TensorFlow, scikit-learn and matplotlib are imported only where they are needed,
+# so commands that don't train or plot start quickly.
 
-import yfinance as yf
+import argparse
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.model_selection import train_test_split
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense, Dropout
-import matplotlib.pyplot as plt
 import ta # Technical Analysis library
+from trading_artifacts import ArtifactStore, config_hash, data_hash
+from trading_data import PriceCache
+from trading_features import FeatureStore
+from trading_profiling import Profiler
+from trading_windows import sliding_windows, window_batches, steps_for, predict_windows
 
 # --- Configuration ---
 STOCK_TICKER = 'AAPL' # Apple Inc.
@@ -28,139 +39,275 @@ END_DATE = '2023-01-01' # Using historical data up to this point for training
 PREDICTION_DAYS = 60 # Number of past days to consider for each prediction
 EPOCHS = 25 # Number of training epochs
 BATCH_SIZE = 32 # Batch size for training
+LSTM_UNITS = 50 # Units in each of the two LSTM layers
+DROPOUT = 0.2 # Dropout after each LSTM layer
+CACHE_DIR = 'price_cache' # Downloaded prices are kept here; only missing date ranges are re-fetched
+ARTIFACT_DIR = 'artifacts' # Trained models, scalers and their metadata are versioned here
+FEATURE_DIR = 'feature_store' # Computed indicator columns are cached here and extended as new bars arrive
+
+
+def model_config(ticker=STOCK_TICKER):
+    # Everything that changes the trained model; its hash decides whether a saved model can be reused
+    return {'ticker': ticker, 'start': START_DATE, 'end': END_DATE, 'prediction_days': PREDICTION_DAYS,
+            'epochs': EPOCHS, 'batch_size': BATCH_SIZE, 'units': LSTM_UNITS, 'dropout': DROPOUT,
+            'train_fraction': 0.8}
+
 
 # --- 1. Fetch Historical Data ---
-print(f"Fetching historical data for {STOCK_TICKER} from {START_DATE} to {END_DATE}...")
-try:
-    df = yf.download(STOCK_TICKER, start=START_DATE, end=END_DATE)
-    if df.empty:
-        print(f"No data fetched for {STOCK_TICKER}. Please check the ticker symbol or date range.")
-        exit()
-    print("Data fetched successfully!")
-except Exception as e:
-    print(f"Error fetching data: {e}")
-    exit()
+def fetch_data(ticker=STOCK_TICKER, start=START_DATE, end=END_DATE, cache_dir=CACHE_DIR, source=None):
+    return PriceCache(cache_dir, source).get(ticker, start, end)
 
-# Use 'Close' price for prediction
-data = df[['Close']].copy()
 
 # --- 2. Feature Engineering ---
-print("Calculating technical indicators...")
-# Simple Moving Averages
-data['SMA_20'] = ta.trend.sma_indicator(data['Close'], window=20)
-data['SMA_50'] = ta.trend.sma_indicator(data['Close'], window=50)
+def add_indicators(df, ticker=None, store=None):
+    # With a FeatureStore (see trading_features.py), cached columns are reused and
+    # only new bars are computed; the result is the same frame as below
+    if store is not None:
+        return store.features(ticker, df)
 
-# Relative Strength Index (RSI)
-data['RSI'] = ta.momentum.rsi(data['Close'], window=14)
+    # Use 'Close' price for prediction
+    data = df[['Close']].copy()
 
-# Drop rows with NaN values resulting from indicator calculations
-data.dropna(inplace=True)
-print(f"Data after feature engineering and NaN removal. Shape: {data.shape}")
+    # Simple Moving Averages
+    data['SMA_20'] = ta.trend.sma_indicator(data['Close'], window=20)
+    data['SMA_50'] = ta.trend.sma_indicator(data['Close'], window=50)
 
-# --- 3. Data Preprocessing ---
-print("Preprocessing data for LSTM...")
+    # Relative Strength Index (RSI)
+    data['RSI'] = ta.momentum.rsi(data['Close'], window=14)
+
+    # Drop rows with NaN values resulting from indicator calculations
+    data.dropna(inplace=True)
+    return data
 
-# Scale the features
-# We scale all features, including the target 'Close'
-scaler = MinMaxScaler(feature_range=(0,1))
-scaled_data = scaler.fit_transform(data)
 
-# Create sequences for LSTM
-# X will be the input features (scaled prices and indicators for PREDICTION_DAYS)
-# Y will be the target (the next day's 'Close' price, scaled)
-X, y = [], []
-for i in range(PREDICTION_DAYS, len(scaled_data)):
-    X.append(scaled_data[i-PREDICTION_DAYS:i]) # Sequence of PREDICTION_DAYS
-    # The target is the 'Close' price of the current day (index 0 in 'data' columns after dropping NaNs)
-    y.append(scaled_data[i, 0]) # Assuming 'Close' is the first column after scaling
+# --- 3. Data Preprocessing ---
+def preprocess(data, prediction_days=PREDICTION_DAYS):
+    from sklearn.preprocessing import MinMaxScaler
 
-X, y = np.array(X), np.array(y)
+    # Scale the features
+    # We scale all features, including the target 'Close'
+    scaler = MinMaxScaler(feature_range=(0,1))
+    scaled_data = scaler.fit_transform(data)
 
-# Reshape X for LSTM input: (samples, time_steps, features)
-# The number of features is the number of columns in our 'data' DataFrame
-X = np.reshape(X, (X.shape[0], X.shape[1], X.shape[2])) # X.shape[2] is num_features
+    # Create sequences for LSTM
+    # X will be the input features (scaled prices and indicators for PREDICTION_DAYS)
+    # Y will be the target (the next day's 'Close' price, scaled)
+    # Both are strided views over scaled_data, so no window is copied here:
+    # X[k] is scaled_data[k:k+PREDICTION_DAYS] and y[k] is the 'Close' (column 0) right after it.
+    X, y = sliding_windows(scaled_data, prediction_days, target_col=0)
+    return scaler, scaled_data, X, y
 
-print(f"X shape: {X.shape} (samples, time_steps, features)")
-print(f"y shape: {y.shape} (samples, target_value)")
 
-# Split data into training and testing sets
-# It's crucial to maintain time series order for validation
-train_size = int(len(X) * 0.8) # 80% for training
-X_train, X_test = X[:train_size], X[train_size:]
-y_train, y_test = y[:train_size], y[train_size:]
+def split_train_test(X, y, train_fraction=0.8):
+    # It's crucial to maintain time series order for validation
+    train_size = int(len(X) * train_fraction)
+    return X[:train_size], X[train_size:], y[:train_size], y[train_size:]
 
-print(f"Training set size: {len(X_train)} samples")
-print(f"Test set size: {len(X_test)} samples")
 
 # --- 4. Build LSTM Model ---
-print("Building LSTM model...")
-model = Sequential()
-# First LSTM layer with return_sequences=True to pass output to next LSTM layer
-model.add(LSTM(units=50, return_sequences=True, input_shape=(X_train.shape[1], X_train.shape[2])))
-model.add(Dropout(0.2)) # Dropout for regularization to prevent overfitting
+def build_model(input_shape, units=LSTM_UNITS, dropout=DROPOUT, outputs=1, jit_compile=False):
+    # TensorFlow is imported here rather than at the top so callers can set
+    # its thread limits first, and so data-only steps don't pay its import cost
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import LSTM, Dense, Dropout
+
+    model = Sequential()
+    # First LSTM layer with return_sequences=True to pass output to next LSTM layer
+    model.add(LSTM(units=units, return_sequences=True, input_shape=input_shape))
+    model.add(Dropout(dropout)) # Dropout for regularization to prevent overfitting
 
-# Second LSTM layer
-model.add(LSTM(units=50, return_sequences=False)) # return_sequences=False for the last LSTM layer before Dense
-model.add(Dropout(0.2))
+    # Second LSTM layer
+    model.add(LSTM(units=units, return_sequences=False)) # return_sequences=False for the last LSTM layer before Dense
+    model.add(Dropout(dropout))
 
-# Output layer: Dense layer for a single price prediction
-model.add(Dense(units=1))
+    # Output layer: Dense layer for a single price prediction
+    # (or one per horizon step for direct multi-step forecasts, see trading_forecast.py)
+    # Kept in float32 even under a mixed-precision training profile (see trading_train_profiles.py)
+    model.add(Dense(units=outputs, dtype='float32'))
+
+    # Compile the model (jit_compile=True has XLA fuse each training step)
+    model.compile(optimizer='adam', loss='mean_squared_error', jit_compile=jit_compile)
+    return model
 
-# Compile the model
-model.compile(optimizer='adam', loss='mean_squared_error')
-model.summary()
 
 # --- 5. Train Model ---
-print("Training the model...")
-history = model.fit(X_train, y_train, epochs=EPOCHS, batch_size=BATCH_SIZE, validation_split=0.1, verbose=1)
-print("Model training complete.")
+def train_model(model, scaled_data, train_size, prediction_days=PREDICTION_DAYS, epochs=EPOCHS,
+                batch_size=BATCH_SIZE, verbose=1, callbacks=None, tf_data=False, seed=None):
+    # Trains on the first train_size windows. The last 10% of the training span is
+    # held out for validation, the same samples validation_split=0.1 would pick.
+    # By default shuffled batches are copied from strided views (trading_windows.py);
+    # tf_data=True gathers them in a tf.data pipeline instead (trading_tfdata.py),
+    # which is slower and larger on CPU here, so it is opt-in.
+    # seed fixes the batch order (None: a fresh shuffle every run).
+    if tf_data:
+        from trading_tfdata import make_datasets
+
+        train_ds, val_ds = make_datasets(scaled_data, prediction_days, train_size, batch_size, seed=seed)
+        return model.fit(train_ds, validation_data=val_ds, epochs=epochs, verbose=verbose, callbacks=callbacks)
+
+    X, y = sliding_windows(scaled_data, prediction_days, target_col=0)
+    X_train, y_train = X[:train_size], y[:train_size]
+    split_at = int(len(X_train) * 0.9) # Floor, like Keras's validation_split
+    X_fit, X_val = X_train[:split_at], X_train[split_at:]
+    y_fit, y_val = y_train[:split_at], y_train[split_at:]
+    return model.fit(window_batches(X_fit, y_fit, batch_size, seed=seed),
+                     steps_per_epoch=steps_for(len(X_fit), batch_size),
+                     validation_data=window_batches(X_val, y_val, batch_size, shuffle=False),
+                     validation_steps=steps_for(len(X_val), batch_size),
+                     epochs=epochs, verbose=verbose, callbacks=callbacks)
+
 
 # --- 6. Make Predictions ---
-print("Making predictions on test data...")
-predictions = model.predict(X_test)
+def unscale_close(scaler, values, n_features):
+    # Inverse transform 'Close' values back to the original scale
+    # We need to create a dummy array with the same number of features as scaled_data
+    # so that the inverse_transform can correctly convert back only the 'Close' price.
+    # The 'Close' price is the first column (index 0).
+    dummy = np.zeros(shape=(len(values), n_features))
+    dummy[:,0] = values
+    return scaler.inverse_transform(dummy)[:,0]
+
 
-# Inverse transform the predictions and actual values to original scale
-# We need to create a dummy array with the same number of features as scaled_data
-# so that the inverse_transform can correctly convert back only the 'Close' price.
-# The 'Close' price is the first column (index 0).
-dummy_predictions = np.zeros(shape=(len(predictions), scaled_data.shape[1]))
-dummy_predictions[:,0] = predictions[:,0]
-predictions = scaler.inverse_transform(dummy_predictions)[:,0]
+def predict_prices(model, scaler, X_test, y_test, batch_size=BATCH_SIZE):
+    n_features = X_test.shape[2]
+    predictions = predict_windows(model, X_test, batch_size)
+    return unscale_close(scaler, predictions[:,0], n_features), unscale_close(scaler, y_test, n_features)
 
-dummy_y_test = np.zeros(shape=(len(y_test), scaled_data.shape[1]))
-dummy_y_test[:,0] = y_test
-y_test_unscaled = scaler.inverse_transform(dummy_y_test)[:,0]
 
 # --- 7. Visualize Results ---
-print("Generating plot of predictions vs actual prices...")
-
-# Create a DataFrame for plotting, aligning predictions with original dates
-# Adjust the index of y_test_unscaled to match the original data's dates
-# The test data starts from `df.index[len(df) - len(X_test)]`
-# This can be tricky due to `dropna` and `PREDICTION_DAYS` offsetting.
-# A simpler approach for visualization is to reconstruct the full 'Close' series and overlay.
-
-# To get the full unscaled data (original 'Close' prices) for plotting
-# We use the original 'data' DataFrame and slice it correctly for the test period.
-test_dates = df.index[len(df) - len(y_test_unscaled):].values
-actual_prices = df['Close'].iloc[len(df) - len(y_test_unscaled):].values
-
-plt.figure(figsize=(14, 7))
-plt.plot(test_dates, actual_prices, color='blue', label=f'Actual {STOCK_TICKER} Price')
-plt.plot(test_dates, predictions, color='red', label=f'Predicted {STOCK_TICKER} Price')
-plt.title(f'{STOCK_TICKER} Price Prediction')
-plt.xlabel('Date')
-plt.ylabel('Price (USD)')
-plt.legend()
-plt.grid(True)
-plt.show()
-
-print("\n--- Next Steps & Considerations for Real-Time ---")
-print("1. Real-time Data: To predict in real-time, you'd integrate with a live data API (e.g., Alpaca, OANDA).")
-print("   You would continuously fetch new data, update your feature set, and pass a 'PREDICTION_DAYS' sequence to the model.")
-print("2. Deployment: Deploying this model for real-time inference would involve a server (e.g., Flask, FastAPI) that receives data, makes predictions, and potentially sends signals.")
-print("3. More Features: Explore more complex technical indicators, volume analysis, and sentiment analysis.")
-print("4. Hyperparameter Tuning: Optimize LSTM units, dropout rates, learning rates, etc.")
-print("5. Robustness: Implement error handling, logging, and monitoring for a production-ready system.")
-print("6. Backtesting: Rigorously backtest any trading strategy based on these predictions on unseen historical data, accounting for transaction costs and slippage.")
-print("7. Risk Management: Essential for any trading system. Never trade with real money based solely on AI predictions without understanding and managing the risks.")
+def plot_predictions(test_dates, actual_prices, predictions, ticker=STOCK_TICKER, out_dir=None):
+    # With out_dir, render headlessly to <out_dir>/<ticker>.png (downsampled, see
+    # trading_plots.py) instead of opening a window that blocks until it is closed
+    if out_dir:
+        from trading_plots import render_prediction_plot
+        return render_prediction_plot(out_dir, ticker, test_dates, actual_prices, predictions)
+
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(14, 7))
+    plt.plot(test_dates, actual_prices, color='blue', label=f'Actual {ticker} Price')
+    plt.plot(test_dates, predictions, color='red', label=f'Predicted {ticker} Price')
+    plt.title(f'{ticker} Price Prediction')
+    plt.xlabel('Date')
+    plt.ylabel('Price (USD)')
+    plt.legend()
+    plt.grid(True)
+    plt.show()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Train and evaluate the LSTM price model for {STOCK_TICKER}.")
+    parser.add_argument('--retrain', action='store_true', help="train even if a matching saved model exists")
+    parser.add_argument('--profile', metavar='REPORT', help="write per-step time/memory metrics to this JSON file")
+    parser.add_argument('--cprofile', action='store_true', help="with --profile, include cProfile hotspots per step")
+    parser.add_argument('--tracemalloc', action='store_true', help="with --profile, include Python allocation peaks")
+    parser.add_argument('--plot-dir', help="save the plot as a PNG in this directory instead of showing it")
+    parser.add_argument('--train-profile', choices=['default', 'threads', 'xla', 'bf16', 'xla-bf16'],
+                        help="CPU threading/XLA/precision settings for training (see trading_train_profiles.py)")
+    parser.add_argument('--tf-data', action='store_true',
+                        help="feed training from the tf.data pipeline instead of window views (trading_tfdata.py)")
+    args = parser.parse_args(argv)
+    jit_compile = False
+    if args.train_profile:
+        # Has to run before TensorFlow executes anything
+        from trading_train_profiles import apply_profile
+        applied = apply_profile(args.train_profile)
+        jit_compile = applied['jit_compile']
+        print(f"Training profile: {applied}")
+    profiler = Profiler(cprofile=args.cprofile, trace_memory=args.tracemalloc,
+                        profile_dir=args.profile and args.profile + '.prof.d')
+
+    # --- 1. Fetch Historical Data ---
+    print(f"Fetching historical data for {STOCK_TICKER} from {START_DATE} to {END_DATE}...")
+    try:
+        with profiler.stage('1. Fetch Historical Data'):
+            df = fetch_data(STOCK_TICKER, START_DATE, END_DATE)
+        if df.empty:
+            print(f"No data fetched for {STOCK_TICKER}. Please check the ticker symbol or date range.")
+            exit()
+        print("Data fetched successfully!")
+    except Exception as e:
+        print(f"Error fetching data: {e}")
+        exit()
+
+    # --- 2. Feature Engineering ---
+    print("Calculating technical indicators...")
+    with profiler.stage('2. Feature Engineering'):
+        data = add_indicators(df, STOCK_TICKER, FeatureStore(FEATURE_DIR))
+    print(f"Data after feature engineering and NaN removal. Shape: {data.shape}")
+
+    # --- 3. Data Preprocessing ---
+    print("Preprocessing data for LSTM...")
+    with profiler.stage('3. Data Preprocessing'):
+        scaler, scaled_data, X, y = preprocess(data, PREDICTION_DAYS)
+
+        # Split data into training and testing sets
+        X_train, X_test, y_train, y_test = split_train_test(X, y, 0.8) # 80% for training
+
+    print(f"X shape: {X.shape} (samples, time_steps, features)")
+    print(f"y shape: {y.shape} (samples, target_value)")
+    print(f"Training set size: {len(X_train)} samples")
+    print(f"Test set size: {len(X_test)} samples")
+
+    # Reuse a saved model if one was trained on exactly this data and config
+    config = model_config(STOCK_TICKER)
+    digest = data_hash(data)
+    store = ArtifactStore(ARTIFACT_DIR)
+    saved = None if args.retrain else store.find(STOCK_TICKER, config_hash(config), digest)
+
+    if saved is not None:
+        print(f"Loading saved model v{saved['version']:04d} from {saved['path']} (skipping training)...")
+        with profiler.stage('4. Load Saved Model'):
+            model, scaler = store.load(saved)
+    else:
+        # --- 4. Build LSTM Model ---
+        print("Building LSTM model...")
+        with profiler.stage('4. Build LSTM Model'):
+            model = build_model((X_train.shape[1], X_train.shape[2]), jit_compile=jit_compile)
+        model.summary()
+
+        # --- 5. Train Model ---
+        print("Training the model...")
+        with profiler.stage('5. Train Model', epochs=EPOCHS):
+            history = train_model(model, scaled_data, len(X_train), PREDICTION_DAYS, EPOCHS, BATCH_SIZE,
+                                  tf_data=args.tf_data)
+        print("Model training complete.")
+
+        saved = store.save(STOCK_TICKER, model, scaler, data.columns, config, digest)
+        print(f"Saved model v{saved['version']:04d} to {saved['path']}")
+
+    # --- 6. Make Predictions ---
+    print("Making predictions on test data...")
+    with profiler.stage('6. Make Predictions'):
+        predictions, y_test_unscaled = predict_prices(model, scaler, X_test, y_test, BATCH_SIZE)
+
+    # --- 7. Visualize Results ---
+    print("Generating plot of predictions vs actual prices...")
+
+    # The targets are the last len(y_test) rows of 'data', and dropna only removed
+    # rows from the start, so they line up with the last rows of the original 'df'.
+    test_dates = df.index[len(df) - len(y_test_unscaled):].values
+    actual_prices = df['Close'].iloc[len(df) - len(y_test_unscaled):].values
+    with profiler.stage('7. Visualize Results'):
+        plot_path = plot_predictions(test_dates, actual_prices, predictions, STOCK_TICKER, args.plot_dir)
+    if plot_path:
+        print(f"Plot saved to {plot_path}")
+
+    if args.profile:
+        profiler.write_report(args.profile)
+        print("\n" + profiler.summary())
+        print(f"Profile report written to {args.profile}")
+
+    print("\n--- Next Steps & Considerations for Real-Time ---")
+    print("1. Real-time Data: To predict in real-time, you'd integrate with a live data API (e.g., Alpaca, OANDA).")
+    print("   You would continuously fetch new data, update your feature set, and pass a 'PREDICTION_DAYS' sequence to the model.")
+    print("2. Deployment: Deploying this model for real-time inference would involve a server (e.g., Flask, FastAPI) that receives data, makes predictions, and potentially sends signals.")
+    print("3. More Features: Explore more complex technical indicators, volume analysis, and sentiment analysis.")
+    print("4. Hyperparameter Tuning: Optimize LSTM units, dropout rates, learning rates, etc.")
+    print("5. Robustness: Implement error handling, logging, and monitoring for a production-ready system.")
+    print("6. Backtesting: Rigorously backtest any trading strategy based on these predictions on unseen historical data, accounting for transaction costs and slippage.")
+    print("7. Risk Management: Essential for any trading system. Never trade with real money based solely on AI predictions without understanding and managing the risks.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# Versioned model/scaler artifacts for trading_ai.py
+#
+# Every training run can be saved as a numbered version under
+# artifacts/<TICKER>/vNNNN/:
+#   model.keras   the trained LSTM (architecture + weights)
+#   scaler.pkl    the fitted MinMaxScaler
+#   meta.json     feature column order, the training config and its hash, a
+#                 hash of the training data, and the scaler's parameters
+#
+# trading_ai.py looks for a version whose config hash and data hash both
+# match the current run and, if there is one, loads it instead of training.
+# The commands below only need TensorFlow for `predict`, and import it lazily:
+#   python trading_artifacts.py list AAPL
+#   python trading_artifacts.py predict AAPL     # next-day forecast, no training
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import time
+
+ARTIFACT_DIR = 'artifacts'
+
+
+def config_hash(config):
+    # Stable short hash of a JSON-serialisable config dict
+    payload = json.dumps(config, sort_keys=True, default=str).encode()
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def data_hash(data):
+    # Hash of a feature DataFrame: column names, timestamps and values
+    import numpy as np
+    digest = hashlib.sha256()
+    digest.update(json.dumps(list(map(str, data.columns))).encode())
+    digest.update(np.ascontiguousarray(data.index.values.astype('datetime64[ns]').view('int64')).tobytes())
+    digest.update(np.ascontiguousarray(data.to_numpy(dtype='float64')).tobytes())
+    return digest.hexdigest()[:16]
+
+
+class ArtifactStore:
+    """Saves and finds trained model versions under `root`/<ticker>/vNNNN."""
+
+    def __init__(self, root=ARTIFACT_DIR):
+        self.root = root
+
+    def _ticker_dir(self, ticker):
+        return os.path.join(self.root, ticker)
+
+    def versions(self, ticker):
+        """Metadata of every saved version for `ticker`, oldest first."""
+        ticker_dir = self._ticker_dir(ticker)
+        if not os.path.isdir(ticker_dir):
+            return []
+        metas = []
+        for name in sorted(os.listdir(ticker_dir)):
+            meta_path = os.path.join(ticker_dir, name, 'meta.json')
+            if name.startswith('v') and os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                meta['path'] = os.path.join(ticker_dir, name)
+                metas.append(meta)
+        return metas
+
+    def find(self, ticker, config_digest=None, data_digest=None):
+        """Newest version matching the given hashes (None matches anything)."""
+        for meta in reversed(self.versions(ticker)):
+            if config_digest is not None and meta['config_hash'] != config_digest:
+                continue
+            if data_digest is not None and meta['data_hash'] != data_digest:
+                continue
+            return meta
+        return None
+
+    def save(self, ticker, model, scaler, features, config, data_digest):
+        existing = self.versions(ticker)
+        version = int(os.path.basename(existing[-1]['path'])[1:]) + 1 if existing else 1
+        path = os.path.join(self._ticker_dir(ticker), f"v{version:04d}")
+        os.makedirs(path)
+
+        model.save(os.path.join(path, 'model.keras'))
+        with open(os.path.join(path, 'scaler.pkl'), 'wb') as f:
+            pickle.dump(scaler, f)
+        meta = {
+            'ticker': ticker,
+            'version': version,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'features': list(features),
+            'config': config,
+            'config_hash': config_hash(config),
+            'data_hash': data_digest,
+            # Kept here too so predictions can scale without importing sklearn
+            'scaler': {'scale': scaler.scale_.tolist(), 'min': scaler.min_.tolist()},
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        meta['path'] = path
+        return meta
+
+    def load(self, meta):
+        """Return (model, scaler) for a version found with find()/versions()."""
+        with open(os.path.join(meta['path'], 'scaler.pkl'), 'rb') as f:
+            scaler = pickle.load(f)
+        return self.load_model(meta), scaler
+
+    def load_model(self, meta):
+        from tensorflow.keras.models import load_model # Lazy: TensorFlow takes seconds to import
+        return load_model(os.path.join(meta['path'], 'model.keras'))
+
+
+def predict_next(ticker, store=None, end=None):
+    """Forecast the next 'Close' for `ticker` with its newest compatible model.
+
+    Uses the scaler parameters stored in meta.json, so the only heavy import
+    is TensorFlow for the model itself.
+    """
+    import numpy as np
+    import trading_ai
+
+    store = store or ArtifactStore()
+    meta = store.find(ticker, config_hash(trading_ai.model_config(ticker)))
+    if meta is None:
+        raise LookupError(f"No saved model for {ticker} with the current config; run trading_ai.py first")
+
+    config = meta['config']
+    df = trading_ai.fetch_data(ticker, config['start'], end or config['end'])
+    data = trading_ai.add_indicators(df)[meta['features']]
+    scale = np.asarray(meta['scaler']['scale'])
+    offset = np.asarray(meta['scaler']['min'])
+
+    window = data.to_numpy()[-config['prediction_days']:] * scale + offset
+    model = store.load_model(meta)
+    scaled = float(np.asarray(model.predict_on_batch(window[np.newaxis]))[0, 0])
+    return {
+        'ticker': ticker,
+        'version': meta['version'],
+        'as_of': str(data.index[-1].date()),
+        'prediction': float((scaled - offset[0]) / scale[0]),
+        'same_data_as_training': data_hash(data) == meta['data_hash'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect saved trading_ai.py models or predict without training.")
+    parser.add_argument('command', choices=['list', 'predict'])
+    parser.add_argument('ticker')
+    parser.add_argument('--root', default=ARTIFACT_DIR)
+    parser.add_argument('--end', help="use data up to this date for predict (default: the training end date)")
+    args = parser.parse_args()
+    store = ArtifactStore(args.root)
+
+    if args.command == 'list':
+        versions = store.versions(args.ticker)
+        if not versions:
+            print(f"No saved models for {args.ticker} in {args.root}/")
+        for meta in versions:
+            print(f"v{meta['version']:04d}  {meta['created']}  config={meta['config_hash']}  "
+                  f"data={meta['data_hash']}  features={','.join(meta['features'])}")
+    else:
+        result = predict_next(args.ticker, store, args.end)
+        print(f"{result['ticker']} next close after {result['as_of']}: {result['prediction']:.2f} "
+              f"(model v{result['version']:04d})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+# Local on-disk price cache in front of yf.download
+#
+# Prices are stored as one Parquet file per (ticker, interval) under a cache
+# directory, next to a small JSON file listing which date ranges have already
+# been fetched. A request for START..END only goes to the data source for the
+# parts of that range that are not covered yet; everything else is read from
+# disk. The data source is pluggable, so CSVSource (plain files on disk) or
+# SyntheticSource (generated random walks) can stand in for Yahoo in tests,
+# benchmarks and air-gapped runs.
+#
+# Needs: pip install pandas pyarrow   (yfinance only for YahooSource)
+
+import json
+import os
+
+import pandas as pd
+
+
+class DataSource:
+    """Something that can return OHLCV bars for one ticker.
+
+    fetch() must return a DataFrame indexed by timestamp for bars in
+    [start, end), the same convention as yf.download. An empty frame means
+    "no bars in that range", not an error; a failed fetch raises FetchError.
+    """
+
+    def fetch(self, ticker, start, end, interval='1d'):
+        raise NotImplementedError
+
+
+class FetchError(Exception):
+    pass
+
+
+class YahooSource(DataSource):
+    # Thin wrapper around yfinance, imported lazily so that cached and
+    # offline runs never need yfinance or a network connection.
+    def fetch(self, ticker, start, end, interval='1d'):
+        import warnings
+        import yfinance as yf
+        from yfinance.exceptions import YFPricesMissingError
+
+        # yf.download never raises: a failed request (no network, DNS, rate
+        # limit) looks exactly like a range without bars. Ticker.history with
+        # raise_errors does raise, and only "no prices in this range" is empty
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', DeprecationWarning) # raise_errors is deprecated, still honoured
+                df = yf.Ticker(ticker).history(start=start, end=end, interval=interval, actions=False,
+                                               raise_errors=True)
+        except YFPricesMissingError as e:
+            if 'status_code' in str(e): # Yahoo answered with an HTTP error, not an empty chart
+                raise FetchError(f"{ticker}: {e}") from e
+            return pd.DataFrame()
+        except Exception as e:
+            raise FetchError(f"{ticker}: {type(e).__name__}: {e}") from e
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = df.columns.get_level_values(0)
+        if getattr(df.index, 'tz', None) is not None and interval[-1] in 'dko': # 1d, 1wk, 1mo, ...
+            # Daily and longer bars keep their exchange-local dates, as yf.download gives them
+            df.index = df.index.tz_localize(None)
+        return df
+
+
+class CSVSource(DataSource):
+    # Reads <directory>/<TICKER>.csv (or <TICKER>_<interval>.csv) with a date
+    # column first, e.g. a file saved earlier with df.to_csv().
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, ticker, start, end, interval='1d'):
+        path = os.path.join(self.directory, f"{ticker}_{interval}.csv")
+        if not os.path.exists(path):
+            path = os.path.join(self.directory, f"{ticker}.csv")
+        df = pd.read_csv(path, index_col=0, parse_dates=True)
+        return df.loc[(df.index >= pd.Timestamp(start)) & (df.index < pd.Timestamp(end))]
+
+
+class SyntheticSource(DataSource):
+    # Deterministic random-walk daily bars for benchmarks and offline tests.
+    # Prices depend only on (seed, ticker, date), never on the requested range,
+    # so partial fetches through PriceCache line up exactly.
+    def __init__(self, seed=0, volatility=0.01, start_price=100.0, origin='1970-01-01'):
+        self.seed = seed
+        self.volatility = volatility
+        self.start_price = start_price
+        self.origin = pd.Timestamp(origin)
+
+    def fetch(self, ticker, start, end, interval='1d'):
+        import zlib
+        import numpy as np
+
+        if interval != '1d':
+            raise ValueError(f"SyntheticSource only generates daily bars, not {interval!r}")
+        days = pd.bdate_range(self.origin, pd.Timestamp(end), inclusive='left')
+        rng = np.random.default_rng([self.seed, zlib.crc32(ticker.encode())])
+        close = self.start_price * np.exp(np.cumsum(rng.normal(0, self.volatility, len(days))))
+        df = pd.DataFrame({'Open': close, 'High': close * 1.005, 'Low': close * 0.995,
+                           'Close': close, 'Volume': 1_000_000}, index=days)
+        df.index.name = 'Date'
+        return df.loc[df.index >= pd.Timestamp(start)]
+
+
+def _merge_ranges(ranges):
+    # Merge overlapping or touching [start, end) ranges
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(covered, start, end):
+    """Return the parts of [start, end) that are not inside any covered range."""
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in _merge_ranges(covered):
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class PriceCache:
+    """Serves price history from disk and fetches only the missing gaps.
+
+    >>> cache = PriceCache('price_cache')
+    >>> df = cache.get('AAPL', '2018-01-01', '2023-01-01')
+    """
+
+    def __init__(self, cache_dir='price_cache', source=None):
+        self.cache_dir = cache_dir
+        self.source = source if source is not None else YahooSource()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, ticker, interval):
+        stem = os.path.join(self.cache_dir, f"{ticker}_{interval}")
+        return stem + '.parquet', stem + '.json'
+
+    def _load(self, ticker, interval):
+        data_path, meta_path = self._paths(ticker, interval)
+        if not os.path.exists(data_path) or not os.path.exists(meta_path):
+            return None, []
+        with open(meta_path) as f:
+            covered = [[pd.Timestamp(s), pd.Timestamp(e)] for s, e in json.load(f)['covered']]
+        return pd.read_parquet(data_path), covered
+
+    def _save(self, ticker, interval, df, covered):
+        data_path, meta_path = self._paths(ticker, interval)
+        # Write to temporary files first so an interrupted run never leaves a
+        # data file that disagrees with its coverage list
+        df.to_parquet(data_path + '.tmp')
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump({'covered': [[s.isoformat(), e.isoformat()] for s, e in covered]}, f)
+        os.replace(data_path + '.tmp', data_path)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def get(self, ticker, start, end, interval='1d'):
+        """Return bars for [start, end), fetching only ranges not cached yet."""
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        cached, covered = self._load(ticker, interval)
+
+        # Never mark the future as covered, or later runs would miss new bars
+        fetch_end = min(end, pd.Timestamp.now().normalize())
+        gaps = missing_ranges(covered, start, fetch_end)
+
+        # A gap the source answered is covered even if it had no bars (weekends,
+        # holidays, before listing); one that failed stays missing, so the next
+        # call retries it
+        frames = [] if cached is None else [cached]
+        fetched_any = False
+        error = None
+        for gap_start, gap_end in gaps:
+            try:
+                fetched = self.source.fetch(ticker, gap_start, gap_end, interval=interval)
+            except FetchError as e:
+                error = e
+                continue
+            fetched_any = True
+            covered.append([gap_start, gap_end])
+            if fetched is not None and not fetched.empty:
+                if getattr(fetched.index, "tz", None) is not None:
+                    fetched.index = fetched.index.tz_convert(None)
+                frames.append(fetched)
+
+        if fetched_any:
+            frames = [f for f in frames if not f.empty]
+            df = pd.concat(frames) if frames else pd.DataFrame()
+            if not df.empty:
+                df = df[~df.index.duplicated(keep='last')].sort_index()
+            self._save(ticker, interval, df, _merge_ranges(covered))
+        else:
+            df = cached
+        if error is not None:
+            # Whatever did arrive is saved; the failure still reaches the caller
+            raise error
+
+        if df is None or df.empty:
+            return pd.DataFrame()
+        return df.loc[(df.index >= start) & (df.index < end)]
+
+
+def download(ticker, start, end, interval='1d', cache_dir='price_cache', source=None):
+    # Drop-in replacement for yf.download(ticker, start=..., end=...)
+    return PriceCache(cache_dir, source).get(ticker, start, end, interval=interval)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    class _FailingSource(DataSource):
+        # Fails every fetch, like YahooSource without a network connection
+        calls = 0
+
+        def fetch(self, ticker, start, end, interval='1d'):
+            self.calls += 1
+            raise FetchError(f"{ticker}: network unreachable")
+
+    # A failed fetch must leave the range uncovered and be retried next time
+    with tempfile.TemporaryDirectory() as cache_dir:
+        source = _FailingSource()
+        cache = PriceCache(cache_dir, source)
+        for _ in range(2):
+            try:
+                cache.get('AAPL', '2020-01-01', '2020-02-01')
+                raise AssertionError("a failed fetch returned data")
+            except FetchError:
+                pass
+        assert source.calls == 2, source.calls
+        assert cache._load('AAPL', '1d') == (None, []), "a failed fetch was cached as covered"
+
+        # The same through YahooSource: offline it must raise FetchError and
+        # cache nothing; online it returns January 2020 and covers it
+        cache = PriceCache(cache_dir, YahooSource())
+        try:
+            df = cache.get('AAPL', '2020-01-01', '2020-02-01')
+            assert len(df) == 21, len(df)
+            print(f"YahooSource online: {len(df)} bars cached")
+        except FetchError as e:
+            assert cache._load('AAPL', '1d') == (None, []), "a failed Yahoo fetch was cached as covered"
+            print(f"YahooSource offline: FetchError, nothing cached ({str(e)[:60]}...)")
+    print("Failed fetches are not cached")
@@ -0,0 +1,351 @@
+# Cached feature store for the trading_ai.py indicators
+#
+# Every run of trading_ai.py recomputes SMA_20, SMA_50 and RSI from the same
+# closes. FeatureStore keeps each computed indicator column so it is only
+# computed once per
+#   (ticker, interval, indicator, params, date range)
+# Because RSI is an exponential average, its values depend on where the close
+# history starts. An entry is therefore keyed by the first bar of the range;
+# the last bar can move:
+#   - a request ending at or before the stored end is a slice of the entry
+#   - a request ending later only computes the new bars, continuing the
+#     entry from its saved state (last closes for SMA, Wilder averages for RSI)
+#   - if the closes under the entry changed (e.g. a price revision), the
+#     entry is recomputed
+#
+# Under <root>/<TICKER>_<interval>/ the closes are stored once, in closes/,
+# with a generation number that changes whenever a stored bar is revised.
+# Each indicator entry is a directory beside it holding only its values
+# (.npy), plus a meta.json with its key, state, list of parts and the closes
+# generation it was computed from; an entry from another generation is
+# recomputed. So a features() call reads the closes once and one value array
+# per indicator, instead of a copy of the closes with every column, and a
+# disk hit is cheaper than recomputing with `ta`.
+# Both are stored as part files (closes as Parquet): extending writes the new
+# bars as one more part instead of rewriting the rest; after MAX_PARTS parts
+# they are rewritten as a single file. Recently used closes and entries are
+# also kept in an in-memory LRU cache (checked against meta.json, so another
+# process's writes are seen); once it holds more than max_memory_mb, the
+# least recently used are evicted.
+#
+# Values are computed with trading_indicators.py, which follows the `ta`
+# definitions that add_indicators() uses (within 1e-9).
+#
+#   store = FeatureStore('feature_store')
+#   data = store.features('AAPL', df)    # same frame as add_indicators(df)
+#   print(store.stats)
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from trading_indicators import rolling_mean, wilder_ema, _rsi_from_averages
+
+FEATURE_DIR = 'feature_store'
+MAX_PARTS = 32 # Appended part files per entry before it is rewritten as one
+
+# Output column -> (indicator, params); the columns add_indicators() builds
+FEATURE_SPEC = {
+    'SMA_20': ('sma', {'window': 20}),
+    'SMA_50': ('sma', {'window': 50}),
+    'RSI': ('rsi', {'window': 14}),
+}
+
+
+# Each indicator has compute(close, params) -> (values, state) for a full
+# history and extend(previous_closes, new_closes, state, params) -> (values,
+# state) to continue it. previous_closes holds every close already covered,
+# oldest first; state is whatever compute/extend returned last and must be
+# JSON-serialisable.
+
+def _sma_compute(close, params):
+    return rolling_mean(close, params['window']), {}
+
+
+def _sma_extend(previous, new, state, params):
+    # Only the last window-1 closes before the new ones are needed
+    window = params['window']
+    tail = previous[len(previous) - (window - 1):] if window > 1 else previous[:0]
+    return rolling_mean(np.concatenate([tail, new]), window)[len(tail):], {}
+
+
+def _rsi_continue(diff, avg_gain, avg_loss, bars_seen, window):
+    gains = wilder_ema(np.maximum(diff, 0.0), window, initial=avg_gain)
+    losses = wilder_ema(np.maximum(-diff, 0.0), window, initial=avg_loss)
+    values = _rsi_from_averages(gains, losses, bars_seen + np.arange(1, len(diff) + 1), window)
+    return values, {'avg_gain': float(gains[-1]), 'avg_loss': float(losses[-1])}
+
+
+def _rsi_compute(close, params):
+    # The first bar has diff 0, which with zero initial averages matches ta's seeding
+    diff = np.diff(close, prepend=close[:1])
+    return _rsi_continue(diff, 0.0, 0.0, 0, params['window'])
+
+
+def _rsi_extend(previous, new, state, params):
+    diff = np.diff(np.concatenate([previous[-1:], new]))
+    return _rsi_continue(diff, state['avg_gain'], state['avg_loss'], len(previous), params['window'])
+
+
+INDICATORS = {
+    'sma': (_sma_compute, _sma_extend),
+    'rsi': (_rsi_compute, _rsi_extend),
+}
+
+
+def _stamps(index):
+    # An index as a plain array for searchsorted and comparisons (int64 ns for dates)
+    return index.asi8 if isinstance(index, pd.DatetimeIndex) else np.asarray(index)
+
+
+def _nbytes(item):
+    # Memory held by a cached closes Series or value array
+    return int(item.memory_usage(index=True)) if isinstance(item, pd.Series) else item.nbytes
+
+
+class FeatureStore:
+    """Disk + in-memory LRU cache of indicator series.
+
+    >>> store = FeatureStore('feature_store', max_memory_mb=256)
+    >>> rsi = store.get('AAPL', df['Close'], 'rsi', window=14)
+    """
+
+    def __init__(self, root=FEATURE_DIR, max_memory_mb=256):
+        self.root = root
+        self.max_bytes = int(max_memory_mb * 1e6)
+        self._memory = OrderedDict() # key -> (closes Series or value array, meta), least recently used first
+        self._memory_bytes = 0
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'extended': 0, 'computed': 0, 'evicted': 0}
+
+    @staticmethod
+    def _key(ticker, interval, indicator, params, start):
+        return json.dumps([ticker, interval, indicator, params, pd.Timestamp(start).isoformat()],
+                          sort_keys=True)
+
+    def _ticker_dir(self, ticker, interval):
+        return os.path.join(self.root, f"{ticker}_{interval}")
+
+    def _entry_dir(self, ticker, interval, key):
+        return os.path.join(self._ticker_dir(ticker, interval), hashlib.sha256(key.encode()).hexdigest()[:16])
+
+    # --- in-memory LRU ---
+
+    def _remember(self, key, item, meta):
+        if key in self._memory:
+            self._memory_bytes -= _nbytes(self._memory.pop(key)[0])
+        size = _nbytes(item)
+        if size > self.max_bytes:
+            return # Bigger than the whole cache; serve it from disk
+        self._memory[key] = (item, meta)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= _nbytes(evicted)
+            self.stats['evicted'] += 1
+
+    # --- part files ---
+
+    def _load(self, key, directory, column):
+        # (closes Series or value array, meta, from memory) of a closes or entry directory, or None.
+        # The in-memory copy is only used while its meta still matches
+        # meta.json, so writes by another store or process are picked up.
+        meta_path = os.path.join(directory, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        cached = self._memory.get(key)
+        if cached is not None and cached[1] == meta:
+            self._memory.move_to_end(key)
+            return cached[0], meta, True
+        paths = [os.path.join(directory, part) for part in meta['parts']]
+        if all(path.endswith('.npy') for path in paths):
+            return np.concatenate([np.load(path) for path in paths]), meta, False
+        frame = pd.concat([pd.read_parquet(path, columns=[column]) for path in paths])
+        return frame[column], meta, False
+
+    @staticmethod
+    def _write(directory, old_meta, meta, new_rows, all_rows):
+        # Writes `new_rows` as one more part file when appending, or all_rows()
+        # as a single part otherwise: closes (a frame) as Parquet, values (an
+        # array, no index to keep) as .npy, which loads as a plain read.
+        # meta.json is replaced last, so a part only counts once the meta
+        # listing it is in place. Returns the meta.
+        os.makedirs(directory, exist_ok=True)
+        old_parts = old_meta['parts'] if old_meta else []
+        appending = new_rows is not None and len(old_parts) < MAX_PARTS
+        rows = new_rows if appending else all_rows()
+        name = f"part-{len(old_parts):04d}" if appending else f"full-{time.time_ns()}"
+        name += '.npy' if isinstance(rows, np.ndarray) else '.parquet'
+        parts = old_parts + [name] if appending else [name]
+        if isinstance(rows, np.ndarray):
+            np.save(os.path.join(directory, name), rows)
+        else:
+            rows.to_parquet(os.path.join(directory, name))
+
+        meta = dict(meta, parts=parts)
+        meta_path = os.path.join(directory, 'meta.json')
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+        for stale in set(old_parts) - set(parts):
+            os.remove(os.path.join(directory, stale))
+        return meta
+
+    # --- the ticker's closes ---
+
+    def _closes(self, ticker, interval, close):
+        """The ticker's stored closes brought in line with `close`; returns (closes, generation).
+
+        Bars outside the stored range are added. If a bar both have differs
+        (a price revision, or another calendar), the stored closes are
+        replaced by `close` under a new generation, which invalidates every
+        entry computed from the old ones.
+        """
+        key = ('closes', ticker, interval)
+        directory = os.path.join(self._ticker_dir(ticker, interval), 'closes')
+        request = pd.Series(close.to_numpy(dtype=float), index=close.index, name='close')
+        found = self._load(key, directory, 'close')
+
+        if found is not None:
+            stored, meta, in_memory = found
+            stored_at, request_at = _stamps(stored.index), _stamps(request.index)
+            # The bars both cover: [lo, hi) of the stored closes, [first, last) of the request
+            lo, hi = np.searchsorted(stored_at, [request_at[0], request_at[-1]], side='left')
+            hi += hi < len(stored_at) and stored_at[hi] == request_at[-1]
+            first, last = np.searchsorted(request_at, [stored_at[0], stored_at[-1]], side='left')
+            last += last < len(request_at) and request_at[last] == stored_at[-1]
+            if hi - lo == last - first and np.array_equal(stored_at[lo:hi], request_at[first:last]) and \
+                    np.array_equal(stored.to_numpy()[lo:hi], request.to_numpy()[first:last], equal_nan=True):
+                before, after = request.iloc[:first], request.iloc[last:]
+                if not len(before) and not len(after):
+                    if not in_memory:
+                        self._remember(key, stored, meta)
+                    return stored, meta['generation']
+                merged = pd.concat([before, stored, after])
+                if len(before): # Earlier bars: rewritten as one part
+                    meta = self._write(directory, meta, meta, None, lambda: merged.to_frame())
+                else:
+                    meta = self._write(directory, meta, meta, after.to_frame(), lambda: merged.to_frame())
+                self._remember(key, merged, meta)
+                return merged, meta['generation']
+
+        # First request for this ticker, or the closes changed
+        meta = self._write(directory, found and found[1], {'generation': time.time_ns()}, None,
+                           lambda: request.to_frame())
+        self._remember(key, request, meta)
+        return request, meta['generation']
+
+    # --- indicator entries ---
+
+    def _lookup(self, ticker, interval, key):
+        found = self._load(key, self._entry_dir(ticker, interval, key), 'value')
+        if found is None:
+            return None
+        entry, meta, in_memory = found
+        if in_memory:
+            self.stats['memory_hits'] += 1
+            return entry, meta
+        entry = np.asarray(entry, dtype=float) # Entries written before values were kept as .npy are Parquet
+        self.stats['disk_hits'] += 1
+        self._remember(key, entry, meta)
+        return entry, meta
+
+    def _save(self, ticker, interval, key, entry, meta, new_values=None, old_meta=None):
+        # meta is the entry's key, state and closes generation; the parts hold only its values
+        meta = self._write(self._entry_dir(ticker, interval, key), old_meta, meta, new_values, lambda: entry)
+        self._remember(key, entry, meta)
+
+    # --- public API ---
+
+    def get(self, ticker, close, indicator, interval='1d', **params):
+        """Indicator values for every bar of `close` (a Series covering the wanted date range).
+
+        Warm-up bars are NaN, as with `ta`; nothing is dropped here.
+        """
+        if len(close) == 0:
+            return pd.Series([], index=close.index, dtype=float)
+        return self._get(ticker, close, indicator, interval, params, *self._closes(ticker, interval, close))
+
+    def _get(self, ticker, close, indicator, interval, params, closes, generation):
+        compute, extend = INDICATORS[indicator]
+        values = close.to_numpy(dtype=float)
+        key = self._key(ticker, interval, indicator, params, close.index[0])
+        found = self._lookup(ticker, interval, key)
+
+        # An entry holds values for the bars from its first one on, computed
+        # from one generation of the ticker's closes; it can only be reused
+        # while that generation is still the stored one
+        if found is not None and found[1].get('generation') == generation:
+            entry, meta = found
+            if len(values) <= len(entry):
+                return pd.Series(entry[:len(values)], index=close.index)
+            first = closes.index.searchsorted(close.index[0])
+            previous = closes.to_numpy()[first:first + len(entry)]
+            new_values, state = extend(previous, values[len(entry):], meta['state'], params)
+            entry = np.concatenate([entry, new_values])
+            self.stats['extended'] += 1
+            self._save(ticker, interval, key, entry, dict(meta, state=state), new_values, meta)
+            return pd.Series(entry, index=close.index)
+
+        computed, state = compute(values, params)
+        self.stats['computed'] += 1
+        self._save(ticker, interval, key, computed, {'key': key, 'state': state, 'generation': generation},
+                   old_meta=found and found[1])
+        return pd.Series(computed, index=close.index)
+
+    def features(self, ticker, df, spec=FEATURE_SPEC, interval='1d'):
+        """The add_indicators() frame ('Close' plus every column of `spec`, NaN rows dropped)."""
+        data = df[['Close']].copy()
+        if not len(data):
+            return data.assign(**{column: np.nan for column in spec})
+        closes = self._closes(ticker, interval, data['Close']) # Checked once for every column
+        for column, (indicator, params) in spec.items():
+            data[column] = self._get(ticker, data['Close'], indicator, interval, params, *closes).to_numpy()
+        return data.dropna()
+
+    def clear_memory(self):
+        self._memory.clear()
+        self._memory_bytes = 0
+
+if __name__ == "__main__":
+    import tempfile
+    import trading_ai
+
+    # Check against add_indicators() and time cold/warm/incremental lookups on
+    # a year of synthetic minute bars
+    rng = np.random.default_rng(0)
+    bars = 500_000
+    index = pd.date_range('2020-01-01', periods=bars, freq='min')
+    df = pd.DataFrame({'Close': 100 * np.exp(np.cumsum(rng.normal(0, 0.0005, bars)))}, index=index)
+    store = FeatureStore(tempfile.mkdtemp(prefix='feature_store_'))
+
+    timings = {}
+    start = time.perf_counter()
+    reference = trading_ai.add_indicators(df)
+    timings['add_indicators (ta)'] = time.perf_counter() - start
+    start = time.perf_counter()
+    store.features('SYN', df.iloc[:-250])
+    timings['store, cold (compute + save)'] = time.perf_counter() - start
+    start = time.perf_counter()
+    extended = store.features('SYN', df)
+    timings['store, 250 new bars (extend)'] = time.perf_counter() - start
+    start = time.perf_counter()
+    store.features('SYN', df)
+    timings['store, warm (memory)'] = time.perf_counter() - start
+    store.clear_memory()
+    start = time.perf_counter()
+    store.features('SYN', df)
+    timings['store, warm (disk)'] = time.perf_counter() - start
+
+    assert extended.index.equals(reference.index)
+    assert np.allclose(extended.to_numpy(), reference.to_numpy(), rtol=1e-9, atol=1e-9)
+    print(f"Feature store matches add_indicators() on {len(df)} bars.")
+    for name, seconds in timings.items():
+        print(f"  {name:<30} {seconds * 1e3:8.2f} ms")
+    print(f"Stats: {store.stats}")
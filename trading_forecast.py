@@ -0,0 +1,247 @@
+# Batched multi-horizon forecasting for many tickers
+#
+# trading_ai.py predicts one bar ahead. A 5- or 20-bar forecast done naively
+# means, per ticker and per step: append the last prediction as a new bar,
+# recompute the indicators over the whole history, rescale, call
+# model.predict on one window. This module does the same for all tickers at
+# once:
+#
+#   recursive_forecast()  one model call per step for every ticker together.
+#                         Each predicted close is fed back as a synthetic bar:
+#                         StreamingIndicators (one state for all tickers)
+#                         updates SMA/RSI in O(1), and the new scaled row is
+#                         written into a preallocated (tickers, window + horizon,
+#                         features) buffer, so the next step's windows are a
+#                         view.
+#   direct_forecast()     one model call in total, with a model trained to
+#                         output all horizons at once (build_model(outputs=H)
+#                         and train_direct()). No feedback, so errors don't
+#                         compound, but it needs its own training run.
+#
+# Both return a tidy table with one row per (ticker, date, horizon).
+# The model can be a Keras model or a trading_numpy_model.NumpyLSTM.
+#
+# Usage:
+#   python trading_forecast.py --tickers 200 --horizon 20       # synthetic benchmark vs the naive loop
+#   python trading_forecast.py --saved AAPL MSFT --horizon 5    # newest saved model per ticker
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from trading_indicators import StreamingIndicators, compute_indicators
+
+FEATURES = ['Close', 'SMA_20', 'SMA_50', 'RSI'] # Same column order as trading_ai.py
+
+
+def _scaler_arrays(scalers, tickers):
+    # (tickers, features) scale and offset arrays. Each scaler is a fitted
+    # MinMaxScaler or an artifact meta['scaler'] dict; one scaler may be shared.
+    def params(scaler):
+        if isinstance(scaler, dict):
+            return scaler['scale'], scaler['min']
+        return scaler.scale_, scaler.min_
+
+    if not isinstance(scalers, dict) or set(scalers) == {'scale', 'min'}:
+        scalers = dict.fromkeys(tickers, scalers)
+    pairs = [params(scalers[ticker]) for ticker in tickers]
+    return np.array([p[0] for p in pairs], dtype=float), np.array([p[1] for p in pairs], dtype=float)
+
+
+def _feature_rows(close):
+    # add_indicators() equivalent for one close array: (rows, 4) with NaN rows dropped
+    values = compute_indicators(close)
+    rows = np.column_stack([close] + [values[name] for name in FEATURES[1:]])
+    return rows[~np.isnan(rows).any(axis=1)]
+
+
+def _future_dates(last, horizon, freq):
+    return pd.date_range(last, periods=horizon + 1, freq=freq)[1:]
+
+
+def _predict(model, windows, max_batch):
+    # Model outputs for many windows, at most max_batch per call
+    outputs = [np.asarray(model.predict_on_batch(windows[start:start + max_batch]))
+               for start in range(0, len(windows), max_batch)]
+    return np.concatenate(outputs)
+
+
+def _tidy(tickers, histories, predictions, freq):
+    horizon = predictions.shape[1]
+    frames = [pd.DataFrame({'ticker': ticker,
+                            'date': _future_dates(histories[ticker].index[-1], horizon, freq),
+                            'horizon': np.arange(1, horizon + 1),
+                            'prediction': predictions[i]})
+              for i, ticker in enumerate(tickers)]
+    return pd.concat(frames, ignore_index=True)
+
+
+def recursive_forecast(model, histories, scalers, horizon=5, prediction_days=60, freq='B', max_batch=1024):
+    """Forecast `horizon` bars for every ticker, feeding each prediction back as the next bar.
+
+    histories maps ticker -> 'Close' Series (any lengths, DatetimeIndex);
+    scalers maps ticker -> the scaler its model was trained with, or is one
+    scaler shared by all. Returns a DataFrame with ticker, date, horizon and
+    prediction (in price units).
+    """
+    tickers = list(histories)
+    scale, offset = _scaler_arrays(scalers, tickers)
+    windows = np.empty((len(tickers), prediction_days + horizon, len(FEATURES)), dtype=np.float32)
+    engines = []
+    for i, ticker in enumerate(tickers):
+        close = histories[ticker].to_numpy(dtype=float)
+        rows = _feature_rows(close)
+        if len(rows) < prediction_days:
+            raise ValueError(f"{ticker}: need {prediction_days} rows after indicator warm-up, got {len(rows)}")
+        windows[i, :prediction_days] = rows[-prediction_days:] * scale[i] + offset[i]
+        engine = StreamingIndicators()
+        engine.warm_up(close)
+        engines.append(engine)
+    indicators = StreamingIndicators.stack(engines)
+
+    predictions = np.empty((len(tickers), horizon))
+    for step in range(horizon):
+        scaled = _predict(model, windows[:, step:step + prediction_days], max_batch).reshape(len(tickers), -1)[:, 0]
+        predictions[:, step] = (scaled - offset[:, 0]) / scale[:, 0]
+        if step + 1 < horizon:
+            # The prediction becomes the newest bar: update indicators and append its scaled row
+            values = indicators.update(predictions[:, step])
+            row = np.column_stack([values[name] for name in FEATURES])
+            windows[:, prediction_days + step] = row * scale + offset
+    return _tidy(tickers, histories, predictions, freq)
+
+
+def direct_forecast(model, histories, scalers, prediction_days=60, freq='B', max_batch=1024):
+    """Forecast with a model whose Dense layer outputs one value per horizon step."""
+    tickers = list(histories)
+    scale, offset = _scaler_arrays(scalers, tickers)
+    windows = np.empty((len(tickers), prediction_days, len(FEATURES)), dtype=np.float32)
+    for i, ticker in enumerate(tickers):
+        rows = _feature_rows(histories[ticker].to_numpy(dtype=float))
+        if len(rows) < prediction_days:
+            raise ValueError(f"{ticker}: need {prediction_days} rows after indicator warm-up, got {len(rows)}")
+        windows[i] = rows[-prediction_days:] * scale[i] + offset[i]
+    scaled = _predict(model, windows, max_batch)
+    predictions = (scaled - offset[:, :1]) / scale[:, :1]
+    return _tidy(tickers, histories, predictions, freq)
+
+
+def train_direct(model, scaled_data, prediction_days, horizon, epochs, batch_size=32, train_fraction=0.8,
+                 verbose=1):
+    # Train a build_model(outputs=horizon) model on the next `horizon` closes of every window
+    from trading_tfdata import make_datasets
+
+    samples = len(scaled_data) - prediction_days - horizon + 1
+    train_ds, val_ds = make_datasets(scaled_data, prediction_days, int(samples * train_fraction), batch_size,
+                                     horizon=horizon)
+    return model.fit(train_ds, validation_data=val_ds, epochs=epochs, verbose=verbose)
+
+
+def naive_forecast(model, histories, scalers, horizon=5, prediction_days=60, freq='B'):
+    # The loop this module replaces: one ticker, one step, one model.predict at a time
+    import trading_ai
+
+    tickers = list(histories)
+    scale, offset = _scaler_arrays(scalers, tickers)
+    predictions = np.empty((len(tickers), horizon))
+    for i, ticker in enumerate(tickers):
+        df = histories[ticker].to_frame('Close')
+        for step in range(horizon):
+            data = trading_ai.add_indicators(df)
+            window = data.to_numpy()[-prediction_days:] * scale[i] + offset[i]
+            scaled = model.predict(window[np.newaxis], verbose=0)[0, 0]
+            predictions[i, step] = (scaled - offset[i, 0]) / scale[i, 0]
+            next_date = _future_dates(df.index[-1], 1, freq)[0]
+            df = pd.concat([df, pd.DataFrame({'Close': [predictions[i, step]]}, index=[next_date])])
+    return _tidy(tickers, histories, predictions, freq)
+
+
+def forecast_saved(tickers, horizon=5, store=None):
+    """Recursive forecasts from each ticker's newest saved model (see trading_artifacts.py)."""
+    import trading_ai
+    from trading_artifacts import ArtifactStore, config_hash
+
+    store = store or ArtifactStore(trading_ai.ARTIFACT_DIR)
+    frames = []
+    for ticker in tickers:
+        meta = store.find(ticker, config_hash(trading_ai.model_config(ticker)))
+        if meta is None:
+            raise LookupError(f"No saved model for {ticker} with the current config; run trading_ai.py first")
+        config = meta['config']
+        close = trading_ai.fetch_data(ticker, config['start'], config['end'])['Close']
+        frames.append(recursive_forecast(store.load_model(meta), {ticker: close}, meta['scaler'], horizon,
+                                         config['prediction_days']))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _synthetic_panel(n_tickers, bars=600):
+    # Random-walk histories of different lengths with per-ticker scalers
+    from sklearn.preprocessing import MinMaxScaler
+    from trading_data import SyntheticSource
+
+    source = SyntheticSource()
+    end = pd.Timestamp('2020-01-01')
+    histories, scalers = {}, {}
+    for i in range(n_tickers):
+        ticker = f"SYN{i:04d}"
+        close = source.fetch(ticker, end - pd.tseries.offsets.BDay(bars + i % 50), end)['Close']
+        histories[ticker] = close
+        scalers[ticker] = MinMaxScaler().fit(_feature_rows(close.to_numpy()))
+    return histories, scalers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched multi-horizon forecasts across tickers.")
+    parser.add_argument('--saved', nargs='+', metavar='TICKER', help="forecast with saved models for these tickers")
+    parser.add_argument('--horizon', type=int, default=20)
+    parser.add_argument('--tickers', type=int, default=200, help="synthetic tickers for the benchmark")
+    parser.add_argument('--naive-sample', type=int, default=3, help="tickers timed with the naive loop")
+    parser.add_argument('--out', help="write the forecast table to this CSV")
+    args = parser.parse_args()
+
+    if args.saved:
+        table = forecast_saved(args.saved, args.horizon)
+        print(table.to_string(index=False))
+        if args.out:
+            table.to_csv(args.out, index=False)
+        return
+
+    import trading_ai
+
+    # Latency doesn't depend on the weights, so untrained models will do
+    histories, scalers = _synthetic_panel(args.tickers)
+    model = trading_ai.build_model((trading_ai.PREDICTION_DAYS, len(FEATURES)))
+    direct_model = trading_ai.build_model((trading_ai.PREDICTION_DAYS, len(FEATURES)), outputs=args.horizon)
+    recursive_forecast(model, dict(list(histories.items())[:2]), scalers, 2) # Trace the model once
+    direct_forecast(direct_model, dict(list(histories.items())[:2]), scalers)
+
+    start = time.perf_counter()
+    table = recursive_forecast(model, histories, scalers, args.horizon)
+    recursive_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    direct_forecast(direct_model, histories, scalers)
+    direct_seconds = time.perf_counter() - start
+
+    # Time the naive loop on a few tickers, check it agrees, and extrapolate
+    sample = dict(list(histories.items())[:args.naive_sample])
+    start = time.perf_counter()
+    naive = naive_forecast(model, sample, scalers, args.horizon)
+    naive_seconds = (time.perf_counter() - start) / len(sample) * len(histories)
+    batched = table[table['ticker'].isin(sample)].reset_index(drop=True)
+    deviation = float(np.max(np.abs(batched['prediction'] - naive['prediction'])))
+
+    forecasts = len(histories) * args.horizon
+    print(f"{len(histories)} tickers x {args.horizon} horizons = {forecasts} forecasts")
+    print(f"  naive loop (est):  {naive_seconds:8.2f} s  {forecasts / naive_seconds:10.0f} forecasts/s")
+    print(f"  recursive batched: {recursive_seconds:8.2f} s  {forecasts / recursive_seconds:10.0f} forecasts/s")
+    print(f"  direct batched:    {direct_seconds:8.2f} s  {forecasts / direct_seconds:10.0f} forecasts/s")
+    print(f"  max |recursive - naive| on {len(sample)} tickers: {deviation:.2e}")
+    print(table.head(args.horizon).to_string(index=False))
+    if args.out:
+        table.to_csv(args.out, index=False)
+
+
+if __name__ == "__main__":
+    main()
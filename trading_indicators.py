@@ -0,0 +1,338 @@
+# Streaming SMA/RSI indicator engine for trading_ai.py features
+#
+# trading_ai.py computes SMA_20, SMA_50 and RSI(14) with the `ta` library over
+# the whole 'Close' series. That is fine for one backtest, but recomputing the
+# full history on every new bar is far too slow for live updates on many
+# tickers. This module gives the same numbers two ways:
+#
+#   compute_indicators(close)   vectorized NumPy batch mode for history
+#   StreamingIndicators(n)      O(1) per-bar updates for n tickers at once
+#
+# Both follow the `ta` definitions exactly:
+#   SMA_w = rolling mean over w bars (NaN until w bars are seen)
+#   RSI_w = Wilder RSI, i.e. an EMA with alpha=1/w (adjust=False) of gains and
+#           losses, NaN for the first w-1 bars, 100 when there are no losses
+#
+# Run this file directly to check both modes against `ta` and time them:
+#   python trading_indicators.py
+
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+SMA_WINDOWS = (20, 50)
+RSI_WINDOW = 14
+
+
+def rolling_mean(values, window):
+    # Rolling mean with NaN for the first window-1 entries, like pandas rolling().mean()
+    values = np.asarray(values, dtype=float)
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sliding_window_view(values, window).mean(axis=1)
+    return out
+
+
+def wilder_ema(values, window, block=64, initial=None):
+    """EMA with alpha=1/window, adjust=False, seeded with the first value.
+
+    The recursion y[t] = (1-a)*y[t-1] + a*x[t] is solved in closed form one
+    block at a time, so the Python loop runs len/block times instead of len.
+    Pass `initial` (the y before values[0]) to continue an earlier series.
+    """
+    values = np.asarray(values, dtype=float)
+    alpha = 1.0 / window
+    decay = 1.0 - alpha
+    if len(values) == 0 or decay == 0.0:
+        return values.copy()
+    out = np.empty(len(values))
+
+    # Within a block starting from state s:
+    #   y[j] = decay**(j+1) * s + alpha * decay**j * cumsum(x[k] / decay**k)
+    powers = decay ** np.arange(block)
+    state = values[0] if initial is None else initial  # values[0] makes y[0] == values[0]
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        p = powers[:len(chunk)]
+        out[start:start + len(chunk)] = decay * p * state + alpha * p * np.cumsum(chunk / p)
+        state = out[start + len(chunk) - 1]
+    return out
+
+
+def rsi(close, window=RSI_WINDOW):
+    # Wilder RSI, matching ta.momentum.rsi(close, window)
+    close = np.asarray(close, dtype=float)
+    diff = np.diff(close, prepend=close[:1])
+    avg_gain = wilder_ema(np.maximum(diff, 0.0), window)
+    avg_loss = wilder_ema(np.maximum(-diff, 0.0), window)
+    return _rsi_from_averages(avg_gain, avg_loss, np.arange(1, len(close) + 1), window)
+
+
+def _rsi_from_averages(avg_gain, avg_loss, bars_seen, window):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+    return np.where(bars_seen >= window, value, np.nan)
+
+
+def compute_indicators(close, sma_windows=SMA_WINDOWS, rsi_window=RSI_WINDOW):
+    """Batch mode: return {'SMA_20': ..., 'SMA_50': ..., 'RSI': ...} arrays for a close series."""
+    close = np.asarray(close, dtype=float)
+    features = {f'SMA_{w}': rolling_mean(close, w) for w in sma_windows}
+    features['RSI'] = rsi(close, rsi_window)
+    return features
+
+
+class StreamingIndicators:
+    """O(1)-per-bar SMA and RSI state for `n_series` tickers at once.
+
+    Each call to update() takes one new close per ticker and returns the
+    current indicator values for all of them, as arrays of length n_series.
+    The state is a ring buffer of the last max(sma_windows) closes plus
+    running sums and the two Wilder averages, so the cost of a bar doesn't
+    depend on how much history came before it.
+
+    >>> engine = StreamingIndicators(n_series=3)
+    >>> engine.warm_up(history)            # (bars, 3) array of past closes
+    >>> values = engine.update([187.2, 402.1, 139.9])
+    >>> values['RSI']
+    """
+
+    def __init__(self, n_series=1, sma_windows=SMA_WINDOWS, rsi_window=RSI_WINDOW, resum_every=10_000):
+        self.n_series = n_series
+        self.sma_windows = tuple(sma_windows)
+        self.rsi_window = rsi_window
+        self.buffer_size = max(self.sma_windows)
+        # Running sums pick up rounding error over very long streams, so they
+        # are rebuilt from the ring buffer every `resum_every` bars
+        self.resum_every = resum_every
+
+        self.buffer = np.zeros((n_series, self.buffer_size))
+        self.sums = np.zeros((len(self.sma_windows), n_series))
+        self.bars_seen = 0
+        self.prev_close = np.zeros(n_series)
+        self.avg_gain = np.zeros(n_series)
+        self.avg_loss = np.zeros(n_series)
+
+    def _resum(self):
+        for i, window in enumerate(self.sma_windows):
+            self.sums[i] = self._last(window).sum(axis=1)
+
+    def _last(self, count):
+        # Last `count` closes per series, oldest first
+        count = min(count, self.bars_seen)
+        pos = self.bars_seen % self.buffer_size
+        idx = (pos - count + np.arange(count)) % self.buffer_size
+        return self.buffer[:, idx]
+
+    def update(self, close):
+        """Feed one bar (one close per series) and return the new indicator values."""
+        close = np.broadcast_to(np.asarray(close, dtype=float), (self.n_series,))
+        pos = self.bars_seen % self.buffer_size
+
+        # SMA: add the new close, drop the one that just left each window
+        for i, window in enumerate(self.sma_windows):
+            self.sums[i] += close
+            if self.bars_seen >= window:
+                self.sums[i] -= self.buffer[:, (pos - window) % self.buffer_size]
+        self.buffer[:, pos] = close
+
+        # RSI: Wilder smoothing of gains and losses; the first bar has diff 0
+        diff = close - self.prev_close if self.bars_seen else np.zeros(self.n_series)
+        alpha = 1.0 / self.rsi_window
+        self.avg_gain += alpha * (np.maximum(diff, 0.0) - self.avg_gain)
+        self.avg_loss += alpha * (np.maximum(-diff, 0.0) - self.avg_loss)
+        self.prev_close = close.copy()
+
+        self.bars_seen += 1
+        if self.bars_seen % self.resum_every == 0:
+            self._resum()
+        return self.current()
+
+    def current(self):
+        """Indicator values after the most recent bar (NaN while warming up)."""
+        values = {'Close': self.prev_close.copy()}
+        for i, window in enumerate(self.sma_windows):
+            if self.bars_seen >= window:
+                values[f'SMA_{window}'] = self.sums[i] / window
+            else:
+                values[f'SMA_{window}'] = np.full(self.n_series, np.nan)
+        values['RSI'] = _rsi_from_averages(self.avg_gain, self.avg_loss,
+                                           np.full(self.n_series, self.bars_seen), self.rsi_window)
+        return values
+
+    def update_chunk(self, closes):
+        """Feed many bars at once, shape (bars,) or (bars, n_series).
+
+        Returns {'Close', 'SMA_..', 'RSI'} arrays of shape (bars, n_series),
+        the values update() would have returned bar by bar, computed with the
+        batch-mode functions. Lets long histories be processed in chunks
+        without ever holding the whole series.
+        """
+        closes = np.asarray(closes, dtype=float).reshape(len(closes), -1)
+        bars = len(closes)
+        if bars == 0:
+            return {name: np.empty((0, self.n_series)) for name in self.current()}
+
+        # Prepend the closes still inside the longest window so the rolling
+        # means continue across the chunk boundary
+        tail = self._last(self.buffer_size - 1).T
+        joined = np.concatenate([tail, closes])
+        values = {'Close': closes.copy()}
+        for window in self.sma_windows:
+            values[f'SMA_{window}'] = np.column_stack(
+                [rolling_mean(joined[:, s], window)[len(tail):] for s in range(self.n_series)])
+
+        # The first bar ever has diff 0, and with zeroed averages that gives
+        # the same values as seeding the EMA with it
+        previous = self.prev_close if self.bars_seen else closes[0]
+        diff = np.diff(closes, axis=0, prepend=previous[None, :])
+        gains = np.column_stack([wilder_ema(np.maximum(diff[:, s], 0.0), self.rsi_window, initial=self.avg_gain[s])
+                                 for s in range(self.n_series)])
+        losses = np.column_stack([wilder_ema(np.maximum(-diff[:, s], 0.0), self.rsi_window, initial=self.avg_loss[s])
+                                  for s in range(self.n_series)])
+        bars_seen = self.bars_seen + np.arange(1, bars + 1)[:, None]
+        values['RSI'] = _rsi_from_averages(gains, losses, bars_seen, self.rsi_window)
+
+        self.avg_gain, self.avg_loss = gains[-1].copy(), losses[-1].copy()
+        self.prev_close = closes[-1].copy()
+        kept = joined[-self.buffer_size:]
+        self.bars_seen += bars
+        pos = self.bars_seen % self.buffer_size
+        idx = (pos - len(kept) + np.arange(len(kept))) % self.buffer_size
+        self.buffer[:, idx] = kept.T
+        self._resum()
+        return values
+
+    @classmethod
+    def stack(cls, engines):
+        """One engine for many tickers from per-ticker engines warmed on histories of any length.
+
+        Every engine must have seen at least max(sma_windows) bars, so all
+        windows are full and only the last closes matter.
+        """
+        first = engines[0]
+        stacked = cls(sum(e.n_series for e in engines), first.sma_windows, first.rsi_window, first.resum_every)
+        if any(e.bars_seen < e.buffer_size for e in engines):
+            raise ValueError(f"Every engine needs at least {first.buffer_size} bars to be stacked")
+        stacked.bars_seen = min(e.bars_seen for e in engines)
+        pos = stacked.bars_seen % stacked.buffer_size
+        idx = (pos - stacked.buffer_size + np.arange(stacked.buffer_size)) % stacked.buffer_size
+        stacked.buffer[:, idx] = np.concatenate([e._last(e.buffer_size) for e in engines])
+        stacked.prev_close = np.concatenate([e.prev_close for e in engines])
+        stacked.avg_gain = np.concatenate([e.avg_gain for e in engines])
+        stacked.avg_loss = np.concatenate([e.avg_loss for e in engines])
+        stacked._resum()
+        return stacked
+
+    def warm_up(self, history):
+        """Load state from past closes, shape (bars,) or (bars, n_series), using batch mode.
+
+        Continues from the current state if bars were already fed, so history
+        can also be replayed in pieces.
+        """
+        history = np.asarray(history, dtype=float).reshape(len(history), -1)
+        if self.bars_seen:
+            for row in history:
+                self.update(row)
+            return self.current()
+        if len(history) == 0:
+            return self.current()
+
+        diff = np.diff(history, axis=0, prepend=history[:1])
+        for s in range(self.n_series):
+            self.avg_gain[s] = wilder_ema(np.maximum(diff[:, s], 0.0), self.rsi_window)[-1]
+            self.avg_loss[s] = wilder_ema(np.maximum(-diff[:, s], 0.0), self.rsi_window)[-1]
+        self.prev_close = history[-1].copy()
+
+        tail = history[-self.buffer_size:]
+        self.bars_seen = len(history)
+        pos = self.bars_seen % self.buffer_size
+        idx = (pos - len(tail) + np.arange(len(tail))) % self.buffer_size
+        self.buffer[:, idx] = tail.T
+        self._resum()
+        return self.current()
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    import ta
+
+    rng = np.random.default_rng(0)
+    bars = 5_000
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    series = pd.Series(close)
+
+    # Reference values: exactly what trading_ai.py computes today
+    expected = {
+        'SMA_20': ta.trend.sma_indicator(series, window=20).to_numpy(),
+        'SMA_50': ta.trend.sma_indicator(series, window=50).to_numpy(),
+        'RSI': ta.momentum.rsi(series, window=14).to_numpy(),
+    }
+
+    batch = compute_indicators(close)
+    engine = StreamingIndicators()
+    streamed = {name: np.empty(bars) for name in expected}
+    for t in range(bars):
+        values = engine.update(close[t])
+        for name in expected:
+            streamed[name][t] = values[name][0]
+
+    # Warming up from the first half and streaming the rest must agree too
+    half = StreamingIndicators()
+    half.warm_up(close[:bars // 2])
+    for t in range(bars // 2, bars):
+        resumed = half.update(close[t])
+
+    # Chunked updates with uneven chunk sizes must agree as well
+    chunked = StreamingIndicators()
+    pieces = [chunked.update_chunk(piece) for piece in np.split(close, [7, 30, 31, 800, 2600])]
+
+    # Engines warmed on histories of different lengths, stacked, then streamed
+    short, full = StreamingIndicators(), StreamingIndicators()
+    short.warm_up(close[1000:bars // 2])
+    full.warm_up(close[:bars // 2])
+    stacked = StreamingIndicators.stack([short, full])
+    for t in range(bars // 2, bars):
+        both = stacked.update([close[t], close[t]])
+    tail_reference = compute_indicators(close[1000:])
+
+    for name, reference in expected.items():
+        assert np.isclose(both[name][1], reference[-1], rtol=1e-9), name
+        assert np.isclose(both[name][0], tail_reference[name][-1], rtol=1e-9), name
+        assert np.allclose(batch[name], reference, rtol=1e-9, atol=1e-9, equal_nan=True), name
+        assert np.allclose(np.concatenate([p[name][:, 0] for p in pieces]), reference,
+                           rtol=1e-9, atol=1e-9, equal_nan=True), name
+        assert np.allclose(streamed[name], reference, rtol=1e-9, atol=1e-9, equal_nan=True), name
+        assert np.isclose(resumed[name][0], reference[-1], rtol=1e-9), name
+    print(f"Batch and streaming indicators match ta on {bars} bars.")
+
+    # Timing: one new bar for many tickers
+    tickers = 500
+    history = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (bars, tickers)), axis=0))
+    new_bar = history[-1] * 1.001
+
+    start = time.perf_counter()
+    for s in range(20):  # ta recomputes the full history per ticker
+        frame = pd.Series(np.append(history[:, s], new_bar[s]))
+        ta.trend.sma_indicator(frame, window=20)
+        ta.trend.sma_indicator(frame, window=50)
+        ta.momentum.rsi(frame, window=14)
+    ta_per_bar = (time.perf_counter() - start) / 20 * tickers
+
+    engine = StreamingIndicators(n_series=tickers)
+    engine.warm_up(history)
+    start = time.perf_counter()
+    for _ in range(1000):
+        engine.update(new_bar)
+    stream_per_bar = (time.perf_counter() - start) / 1000
+
+    start = time.perf_counter()
+    for s in range(tickers):
+        compute_indicators(history[:, s])
+    batch_time = time.perf_counter() - start
+
+    print(f"New bar for {tickers} tickers ({bars} bars of history):")
+    print(f"  ta full recompute: {ta_per_bar * 1e3:10.2f} ms")
+    print(f"  streaming update:  {stream_per_bar * 1e3:10.3f} ms")
+    print(f"Batch mode over full history for {tickers} tickers: {batch_time:.2f} s")
@@ -0,0 +1,260 @@
+# NumPy-only inference for the trading_ai.py LSTM
+#
+# Scoring one window per ticker per bar through model.predict() pays for the
+# TensorFlow import (seconds) and for Keras' per-call machinery (milliseconds),
+# both far more than the arithmetic of a 2 x LSTM(50) + Dense(1) network.
+# This module exports the trained weights to one small .npz file and runs the
+# same forward pass with plain NumPy matrix products:
+#
+#   export_weights(model, 'weights.npz', scaler, dtype='float32')
+#   net = NumpyLSTM.load('weights.npz')
+#   net.predict(X)            # (batch, PREDICTION_DAYS, 4) -> (batch, 1), like model.predict
+#
+# Weights can be stored as float64, float32 or int8. int8 keeps one float32
+# scale per output column of each kernel (symmetric quantization), making
+# the file about 4x smaller than float32. The arithmetic still runs in float32,
+# because NumPy has no fast int8 matrix product; the int8 weights are expanded
+# once at load time.
+#
+# NumpyLSTM has predict_on_batch() too, so it can stand in for the Keras model
+# in trading_service.InferenceService.
+#
+# Usage:
+#   python trading_numpy_model.py export artifacts/AAPL/v0001 [--dtype int8]
+#   python trading_numpy_model.py bench [--model artifacts/AAPL/v0001]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+DTYPES = ('float64', 'float32', 'int8')
+
+
+def _quantize(kernel):
+    # Symmetric per-column int8: kernel ~= q * scale
+    scale = np.abs(kernel).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    return np.round(kernel / scale).astype(np.int8), scale.astype(np.float32)
+
+
+def export_weights(model, path, scaler=None, dtype='float32'):
+    """Write the weights of a Sequential of LSTM/Dropout/Dense layers to a .npz file.
+
+    Dropout does nothing at inference time and is skipped. If `scaler` (the
+    fitted MinMaxScaler) is given, its parameters are stored too, so
+    predictions can be unscaled without sklearn.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {DTYPES}, got {dtype!r}")
+    arrays = {}
+    layers = []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        config = layer.get_config()
+        if kind == 'Dropout':
+            continue
+        if kind == 'LSTM':
+            if config['activation'] != 'tanh' or config['recurrent_activation'] != 'sigmoid':
+                raise ValueError(f"{layer.name}: only tanh/sigmoid LSTM layers are supported")
+            kernels = dict(zip(('kernel', 'recurrent', 'bias'), layer.get_weights()))
+            layers.append({'kind': 'lstm', 'units': config['units'],
+                           'return_sequences': config['return_sequences']})
+        elif kind == 'Dense':
+            if config['activation'] != 'linear':
+                raise ValueError(f"{layer.name}: only linear Dense layers are supported")
+            kernels = dict(zip(('kernel', 'bias'), layer.get_weights()))
+            layers.append({'kind': 'dense', 'units': config['units']})
+        else:
+            raise ValueError(f"Unsupported layer {layer.name} ({kind})")
+
+        prefix = f"layer{len(layers) - 1}_"
+        for name, weights in kernels.items():
+            if dtype == 'int8' and name != 'bias':
+                arrays[prefix + name], arrays[prefix + name + '_scale'] = _quantize(weights)
+            else:
+                arrays[prefix + name] = weights.astype('float32' if dtype == 'int8' else dtype)
+
+    if scaler is not None:
+        arrays['scaler_scale'] = np.asarray(scaler.scale_, dtype=np.float64)
+        arrays['scaler_min'] = np.asarray(scaler.min_, dtype=np.float64)
+    header = {'layers': layers, 'dtype': dtype, 'input_shape': list(model.input_shape[1:])}
+    arrays['header'] = np.frombuffer(json.dumps(header).encode(), dtype=np.uint8)
+    np.savez(path, **arrays)
+    return path
+
+
+def _sigmoid(x):
+    # Same as 1 / (1 + exp(-x)) but never overflows
+    return 0.5 * np.tanh(0.5 * x) + 0.5
+
+
+class NumpyLSTM:
+    """Forward pass of an exported LSTM stack in NumPy.
+
+    Computation runs in float64 for float64 files and in float32 otherwise.
+    """
+
+    def __init__(self, header, arrays):
+        self.header = header
+        self.dtype = np.float64 if header['dtype'] == 'float64' else np.float32
+        self.input_shape = tuple(header['input_shape'])
+        self.layers = []
+        for i, layer in enumerate(header['layers']):
+            weights = {}
+            for name in ('kernel', 'recurrent', 'bias'):
+                key = f"layer{i}_{name}"
+                if key not in arrays:
+                    continue
+                values = arrays[key]
+                if key + '_scale' in arrays:
+                    values = values * arrays[key + '_scale'] # Expand int8 once, here
+                weights[name] = np.ascontiguousarray(values, dtype=self.dtype)
+            self.layers.append((layer, weights))
+        self.scale = arrays['scaler_scale'] if 'scaler_scale' in arrays else None
+        self.offset = arrays['scaler_min'] if 'scaler_min' in arrays else None
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(json.loads(arrays.pop('header').tobytes()), arrays)
+
+    def _lstm(self, x, weights, return_sequences):
+        # x: (batch, steps, features). Keras gate order in the 4*units axis is i, f, c, o.
+        batch, steps, _ = x.shape
+        units = weights['recurrent'].shape[0]
+        # The input projection doesn't depend on the state, so it is one big
+        # matrix product for all time steps; only h @ U stays in the loop
+        projected = (x.reshape(batch * steps, -1) @ weights['kernel'] + weights['bias']).reshape(batch, steps, -1)
+        h = np.zeros((batch, units), dtype=self.dtype)
+        c = np.zeros((batch, units), dtype=self.dtype)
+        outputs = np.empty((batch, steps, units), dtype=self.dtype) if return_sequences else None
+        for t in range(steps):
+            z = projected[:, t] + h @ weights['recurrent']
+            gates = _sigmoid(z)
+            c = gates[:, units:2 * units] * c + gates[:, :units] * np.tanh(z[:, 2 * units:3 * units])
+            h = gates[:, 3 * units:] * np.tanh(c)
+            if return_sequences:
+                outputs[:, t] = h
+        return outputs if return_sequences else h
+
+    def predict(self, X):
+        """Scaled predictions of shape (batch, 1) for windows of shape (batch, steps, features)."""
+        x = np.asarray(X, dtype=self.dtype)
+        if x.ndim == 2:
+            x = x[np.newaxis]
+        for layer, weights in self.layers:
+            if layer['kind'] == 'lstm':
+                x = self._lstm(x, weights, layer['return_sequences'])
+            else:
+                x = x @ weights['kernel'] + weights['bias']
+        return x
+
+    predict_on_batch = predict # Drop-in for the Keras method used by trading_windows and trading_service
+
+    def unscale_close(self, values):
+        # Inverse of the stored scaler for the 'Close' column (index 0)
+        if self.scale is None:
+            raise ValueError("These weights were exported without a scaler")
+        return (np.asarray(values, dtype=float) - self.offset[0]) / self.scale[0]
+
+
+def export_version(version_dir, dtype='float32'):
+    # Export an ArtifactStore version (artifacts/<T>/vNNNN) next to its model.keras
+    from trading_artifacts import ArtifactStore
+
+    with open(os.path.join(version_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    meta['path'] = version_dir
+    model, scaler = ArtifactStore().load(meta)
+    return export_weights(model, os.path.join(version_dir, f"weights.{dtype}.npz"), scaler, dtype)
+
+
+def _time_call(function, repeats):
+    # Median seconds per call after one warm-up call
+    function()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def _import_seconds(module):
+    # Import time in a fresh interpreter, so nothing is already loaded
+    code = f"import time; s = time.perf_counter(); import {module}; print(time.perf_counter() - s)"
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL='3')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark(model, batch_sizes=(1, 64, 1024), repeats=20, workdir='.'):
+    """Latency of model.predict / predict_on_batch vs NumpyLSTM for each weight dtype."""
+    rng = np.random.default_rng(0)
+    steps, features = model.input_shape[1:]
+    nets = {}
+    for dtype in DTYPES:
+        path = export_weights(model, os.path.join(workdir, f"bench_weights.{dtype}.npz"), dtype=dtype)
+        nets[dtype] = (NumpyLSTM.load(path), os.path.getsize(path))
+        os.remove(path)
+
+    print(f"Import time: tensorflow {_import_seconds('tensorflow'):.2f} s, "
+          f"trading_numpy_model {_import_seconds('trading_numpy_model'):.2f} s")
+    print("File size: " + ", ".join(f"{dtype} {size / 1e3:.0f} kB" for dtype, (_, size) in nets.items()))
+    print(f"\n{'batch':>6} {'path':<22} {'ms/call':>9} {'windows/s':>10} {'max |diff|':>11}")
+    for batch in batch_sizes:
+        X = rng.random((batch, steps, features)).astype(np.float32)
+        reference = np.asarray(model.predict_on_batch(X))
+        rows = [('model.predict', lambda: model.predict(X, verbose=0), reference),
+                ('model.predict_on_batch', lambda: model.predict_on_batch(X), reference)]
+        for dtype, (net, _) in nets.items():
+            rows.append((f"numpy {dtype}", lambda net=net: net.predict(X), net.predict(X)))
+        for name, function, output in rows:
+            seconds = _time_call(function, repeats if batch < 1024 else max(3, repeats // 4))
+            diff = float(np.max(np.abs(np.asarray(output) - reference)))
+            print(f"{batch:>6} {name:<22} {seconds * 1e3:>9.3f} {batch / seconds:>10.0f} {diff:>11.2e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the LSTM to NumPy weights and benchmark NumPy inference.")
+    parser.add_argument('command', choices=['export', 'bench'])
+    parser.add_argument('model', nargs='?', help="artifact version dir (artifacts/<T>/vNNNN) or a .keras file")
+    parser.add_argument('--dtype', choices=DTYPES, default='float32')
+    parser.add_argument('--out', help="output .npz for a .keras model")
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+    if args.command == 'export':
+        if not args.model:
+            parser.error("export needs a model")
+        if os.path.isdir(args.model):
+            path = export_version(args.model, args.dtype)
+        else:
+            from tensorflow.keras.models import load_model
+            path = export_weights(load_model(args.model), args.out or f"weights.{args.dtype}.npz", dtype=args.dtype)
+        print(f"Wrote {path} ({os.path.getsize(path) / 1e3:.0f} kB)")
+        return
+
+    if args.model and os.path.isdir(args.model):
+        from tensorflow.keras.models import load_model
+        model = load_model(os.path.join(args.model, 'model.keras'))
+    elif args.model:
+        from tensorflow.keras.models import load_model
+        model = load_model(args.model)
+    else:
+        # Latency doesn't depend on the weights; an untrained model of the same shape will do
+        import trading_ai
+        model = trading_ai.build_model((trading_ai.PREDICTION_DAYS, 4))
+    benchmark(model, repeats=args.repeats)
+
+
+if __name__ == "__main__":
+    main()
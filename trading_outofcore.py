@@ -0,0 +1,384 @@
+# Out-of-core dataset mode for long (e.g. multi-year 1-minute) price histories
+#
+# trading_ai.py loads the whole history, fits MinMaxScaler on it in one go and
+# keeps float64 scaled_data in RAM. That is fine for a few thousand daily bars
+# but not for years of minute bars. Here every step works on fixed-size chunks:
+#
+#   1. Close prices are read chunk by chunk (Parquet row batches or CSV chunks).
+#      Indicators are continued across chunks with
+#      StreamingIndicators.update_chunk(), so they equal the ones computed over
+#      the full series. The scaler is fitted with MinMaxScaler.partial_fit().
+#   2. Features are scaled chunk by chunk into a float32 memory-mapped file in
+#      a dataset dir, <dir>/data-<key>, keyed by the source file (path, size,
+#      mtime), the date range and the feature columns, so a grown price
+#      cache or another --start/--end builds a new dataset instead of reusing
+#      a stale one:
+#        <dataset dir>/features.f32   (rows, 4) float32, scaled, row-major
+#        <dataset dir>/index.i8       (rows,) int64 timestamps (ns)
+#        <dataset dir>/meta.json      shape, columns and scaler parameters
+#        <dataset dir>/scaler.pkl     the fitted MinMaxScaler
+#   3. Training and prediction read windows straight from the mapping, one
+#      block of consecutive samples at a time. Shuffling permutes the block
+#      order and the samples inside each block. The whole epoch is never
+#      permuted at once, so nothing grows with the length of the history.
+#
+# Peak memory depends on the chunk and block sizes, not on the number of rows.
+# Pages of the mapped files that have been read do show up in RSS as
+# file-backed memory, but the kernel can drop them whenever it needs the RAM,
+# so the benchmark reports anonymous (non-reclaimable) memory as well.
+#
+# Usage:
+#   python trading_outofcore.py price_cache/AAPL_1m.parquet ooc/AAPL_1m --epochs 5
+#   python trading_outofcore.py price_cache/AAPL_1m.parquet ooc/AAPL_1m --start 2022-01-01 --end 2024-01-01
+#   python trading_outofcore.py --bench --rows 100000 1000000 5000000
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import pickle
+import resource
+import time
+
+import numpy as np
+
+from trading_indicators import StreamingIndicators
+from trading_profiling import run_in_process
+
+FEATURES = ['Close', 'SMA_20', 'SMA_50', 'RSI'] # Same columns, same order as trading_ai.add_indicators()
+CHUNK_ROWS = 1_000_000 # Rows per chunk when reading and scaling
+BLOCK_SAMPLES = 8192 # Consecutive samples read from the mapping at a time
+
+
+def iter_price_chunks(path, chunk_rows=CHUNK_ROWS, start=None, end=None):
+    """Yield (timestamps as int64 ns, close as float64) chunks from a Parquet or CSV price file.
+
+    Parquet files (e.g. PriceCache's <TICKER>_<interval>.parquet) are read one
+    record batch at a time; CSV files with a date column first, like CSVSource
+    reads, with pandas' chunksize. Only rows from start up to (not including)
+    end are kept when either is given.
+    """
+    import pandas as pd
+
+    low = pd.Timestamp(start).value if start is not None else None
+    high = pd.Timestamp(end).value if end is not None else None
+    for timestamps, close in _read_price_chunks(path, chunk_rows):
+        if low is None and high is None:
+            yield timestamps, close
+            continue
+        if not timestamps.any():
+            raise ValueError(f"{path} has no date index to select {start}..{end} from")
+        keep = np.ones(len(timestamps), dtype=bool)
+        if low is not None:
+            keep &= timestamps >= low
+        if high is not None:
+            keep &= timestamps < high
+        if keep.any():
+            yield timestamps[keep], close[keep]
+
+
+def _read_price_chunks(path, chunk_rows):
+    import pandas as pd
+
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        index_columns = (parquet.schema_arrow.pandas_metadata or {}).get('index_columns', [])
+        index_column = index_columns[0] if index_columns and isinstance(index_columns[0], str) else None
+        columns = ['Close'] + ([index_column] if index_column else [])
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+            close = batch.column('Close').to_numpy(zero_copy_only=False).astype(float)
+            if index_column:
+                stamps = pd.DatetimeIndex(batch.column(index_column).to_pandas()).tz_localize(None)
+                timestamps = stamps.values.astype('datetime64[ns]').view('int64')
+            else:
+                timestamps = np.zeros(len(close), dtype=np.int64)
+            yield timestamps, close
+    else:
+        for frame in pd.read_csv(path, index_col=0, parse_dates=True, chunksize=chunk_rows):
+            stamps = pd.DatetimeIndex(frame.index).tz_localize(None)
+            yield stamps.values.astype('datetime64[ns]').view('int64'), frame['Close'].to_numpy(dtype=float)
+
+
+class MemmapDataset:
+    """A dataset directory written by build_dataset(), opened lazily.
+
+    >>> dataset = MemmapDataset('ooc/AAPL_1m')
+    >>> dataset.features[-60:]      # float32 view, read from disk on access
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.rows = self.meta['rows']
+        self.columns = self.meta['columns']
+        self.features = np.memmap(os.path.join(path, 'features.f32'), dtype=np.float32, mode='r',
+                                  shape=(self.rows, len(self.columns)))
+        self.timestamps = np.memmap(os.path.join(path, 'index.i8'), dtype=np.int64, mode='r',
+                                    shape=(self.rows,))
+
+    def scaler(self):
+        with open(os.path.join(self.path, 'scaler.pkl'), 'rb') as f:
+            return pickle.load(f)
+
+    def unscale_close(self, values):
+        # Same result as trading_ai.unscale_close(), from the stored parameters
+        return (np.asarray(values, dtype=float) - self.meta['scaler']['min'][0]) / self.meta['scaler']['scale'][0]
+
+
+def build_dataset(path, chunks, chunk_rows=CHUNK_ROWS):
+    """Compute features, fit the scaler and write a MemmapDataset from (timestamps, close) chunks.
+
+    Two passes over disk: raw float64 features are appended to a temporary
+    file while the scaler is fitted, then scaled chunk by chunk into the
+    float32 mapping. Rows where an indicator is still warming up are dropped,
+    like add_indicators()' dropna().
+    """
+    from sklearn.preprocessing import MinMaxScaler
+
+    os.makedirs(path, exist_ok=True)
+    raw_path = os.path.join(path, 'features.raw.tmp')
+    engine = StreamingIndicators()
+    scaler = MinMaxScaler(feature_range=(0, 1))
+    rows = 0
+
+    with open(raw_path, 'wb') as raw_file, open(os.path.join(path, 'index.i8'), 'wb') as index_file:
+        for timestamps, close in chunks:
+            values = engine.update_chunk(close)
+            block = np.column_stack([values[name][:, 0] for name in FEATURES])
+            keep = ~np.isnan(block).any(axis=1)
+            block = block[keep]
+            if not len(block):
+                continue
+            scaler.partial_fit(block)
+            raw_file.write(np.ascontiguousarray(block, dtype=np.float64).tobytes())
+            index_file.write(np.ascontiguousarray(timestamps[keep], dtype=np.int64).tobytes())
+            rows += len(block)
+    if rows == 0:
+        os.remove(raw_path)
+        raise ValueError("No rows left after indicator warm-up; is the history long enough?")
+
+    raw = np.memmap(raw_path, dtype=np.float64, mode='r', shape=(rows, len(FEATURES)))
+    features = np.memmap(os.path.join(path, 'features.f32'), dtype=np.float32, mode='w+',
+                         shape=(rows, len(FEATURES)))
+    for start in range(0, rows, chunk_rows):
+        features[start:start + chunk_rows] = scaler.transform(raw[start:start + chunk_rows])
+    features.flush()
+    del raw, features
+    os.remove(raw_path)
+
+    with open(os.path.join(path, 'scaler.pkl'), 'wb') as f:
+        pickle.dump(scaler, f)
+    meta = {
+        'rows': rows,
+        'columns': FEATURES,
+        'dtype': 'float32',
+        'scaler': {'scale': scaler.scale_.tolist(), 'min': scaler.min_.tolist(),
+                   'data_min': scaler.data_min_.tolist(), 'data_max': scaler.data_max_.tolist()},
+    }
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return MemmapDataset(path)
+
+
+def iter_window_blocks(features, start, stop, window, batch_size=32, shuffle=False, rng=None,
+                       block_samples=BLOCK_SAMPLES):
+    """Yield (X_batch, y_batch) float32 batches for samples start..stop-1 of a mapped array.
+
+    Sample k is features[k:k+window] with target features[k+window, 0], as in
+    trading_windows.sliding_windows(). Each block of consecutive samples is
+    copied out of the mapping once and windowed as a view. Blocks are a whole
+    number of batches, so only the very last batch can be short.
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    block = batch_size * max(1, block_samples // batch_size)
+    firsts = np.arange(start, stop, block)
+    if shuffle:
+        rng = rng if rng is not None else np.random.default_rng()
+        firsts = rng.permutation(firsts)
+    for first in firsts:
+        last = min(first + block, stop)
+        rows = np.array(features[first:last + window], dtype=np.float32)
+        X = sliding_window_view(rows, window, axis=0)[:last - first].transpose(0, 2, 1)
+        y = rows[window:, 0]
+        order = rng.permutation(last - first) if shuffle else np.arange(last - first)
+        for i in range(0, len(order), batch_size):
+            idx = order[i:i + batch_size]
+            yield X[idx], y[idx]
+
+
+def make_streaming_datasets(features, window, train_size, batch_size=32, validation_fraction=0.1,
+                            block_samples=BLOCK_SAMPLES, seed=None):
+    """(train_ds, val_ds) like trading_tfdata.make_datasets(), read from a memory-mapped array.
+
+    Validation is the last `validation_fraction` of the training span, in
+    order. Neither dataset is cached, since that would pull it into RAM.
+    """
+    import tensorflow as tf
+
+    split_at = int(train_size * (1 - validation_fraction)) # Floor, like Keras's validation_split
+    signature = (tf.TensorSpec((None, window, features.shape[1]), tf.float32),
+                 tf.TensorSpec((None,), tf.float32))
+    rng = np.random.default_rng(seed)
+
+    train_ds = tf.data.Dataset.from_generator(
+        lambda: iter_window_blocks(features, 0, split_at, window, batch_size, True, rng, block_samples),
+        output_signature=signature)
+    val_ds = tf.data.Dataset.from_generator(
+        lambda: iter_window_blocks(features, split_at, train_size, window, batch_size, False,
+                                   block_samples=block_samples),
+        output_signature=signature)
+    # Generators have unknown length; declaring it gives Keras a progress bar and epoch end
+    train_ds = train_ds.apply(tf.data.experimental.assert_cardinality(math.ceil(split_at / batch_size)))
+    val_ds = val_ds.apply(tf.data.experimental.assert_cardinality(math.ceil((train_size - split_at) / batch_size)))
+    return train_ds.prefetch(2), val_ds.prefetch(2)
+
+
+def train_streaming(model, dataset, train_size, prediction_days, epochs, batch_size, verbose=1, callbacks=None):
+    # trading_ai.train_model() for a MemmapDataset
+    train_ds, val_ds = make_streaming_datasets(dataset.features, prediction_days, train_size, batch_size)
+    return model.fit(train_ds, validation_data=val_ds, epochs=epochs, verbose=verbose, callbacks=callbacks)
+
+
+def predict_streaming(model, dataset, start, stop, prediction_days, batch_size=32, out_path=None):
+    """Unscaled 'Close' predictions for samples start..stop-1, plus the squared-error sum.
+
+    Predictions are written into a float32 memmap at `out_path` (or an
+    in-memory array if None), so only one batch is held at a time.
+    """
+    if out_path:
+        predictions = np.memmap(out_path, dtype=np.float32, mode='w+', shape=(stop - start,))
+    else:
+        predictions = np.empty(stop - start, dtype=np.float32)
+    squared_error = 0.0
+    pos = 0
+    for X_batch, y_batch in iter_window_blocks(dataset.features, start, stop, prediction_days, batch_size):
+        predicted = dataset.unscale_close(np.asarray(model.predict_on_batch(X_batch))[:, 0])
+        squared_error += float(np.sum((predicted - dataset.unscale_close(y_batch)) ** 2))
+        predictions[pos:pos + len(predicted)] = predicted
+        pos += len(predicted)
+    if out_path:
+        predictions.flush()
+    return predictions, squared_error
+
+
+def dataset_key(source, start=None, end=None):
+    # What the dataset is built from: the source file as it is now, the date range and the features
+    info = os.stat(source)
+    config = {'source': os.path.abspath(source), 'size': info.st_size, 'mtime_ns': info.st_mtime_ns,
+              'start': None if start is None else str(start), 'end': None if end is None else str(end),
+              'columns': FEATURES}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:10]
+
+
+def run(source, path, epochs=5, prediction_days=60, batch_size=32, chunk_rows=CHUNK_ROWS, verbose=1,
+        start=None, end=None):
+    """Build (if needed), train and evaluate out of core; returns a summary dict.
+
+    The dataset, model and predictions go in <path>/data-<dataset_key()>, so
+    a changed source file or date range gets a fresh dataset.
+    """
+    import trading_ai
+
+    path = os.path.join(path, f"data-{dataset_key(source, start, end)}")
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        dataset = MemmapDataset(path)
+        print(f"Using existing dataset {path} ({dataset.rows} rows)")
+    else:
+        print(f"Building dataset {path} from {source}...")
+        dataset = build_dataset(path, iter_price_chunks(source, chunk_rows, start, end), chunk_rows)
+        print(f"Wrote {dataset.rows} rows of scaled float32 features")
+
+    samples = dataset.rows - prediction_days
+    train_size = int(samples * 0.8) # Same 80/20 split as trading_ai.py
+    model = trading_ai.build_model((prediction_days, len(dataset.columns)))
+    train_streaming(model, dataset, train_size, prediction_days, epochs, batch_size, verbose)
+    model.save(os.path.join(path, 'model.keras'))
+
+    _, squared_error = predict_streaming(model, dataset, train_size, samples, prediction_days, batch_size,
+                                         out_path=os.path.join(path, 'predictions.f32'))
+    return {'path': path, 'rows': dataset.rows, 'train_samples': train_size, 'test_samples': samples - train_size,
+            'test_rmse': math.sqrt(squared_error / max(samples - train_size, 1)),
+            'peak_rss_mb': _peak_rss_mb()}
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _synthetic_chunks(rows, chunk_rows, seed=0):
+    # Minute-bar random walk generated chunk by chunk, never held in full
+    rng = np.random.default_rng(seed)
+    origin = np.datetime64('2010-01-01T00:00', 'ns').view('int64')
+    level = np.log(100.0)
+    for start in range(0, rows, chunk_rows):
+        steps = rng.normal(0, 0.0005, min(chunk_rows, rows - start))
+        close = np.exp(level + np.cumsum(steps))
+        level = np.log(close[-1])
+        yield origin + (start + np.arange(len(close))) * 60_000_000_000, close
+
+
+def _bench_size(rows, chunk_rows, window, batch_size, workdir, queue):
+    # Runs in a fresh process so peak RSS reflects only this history length
+    from trading_profiling import RssSampler, current_anon_mb
+
+    path = os.path.join(workdir, f"bench_{rows}")
+    baseline = _peak_rss_mb()
+    anon = RssSampler(read=current_anon_mb)
+    anon_baseline = anon.peak
+    anon.start()
+    started = time.perf_counter()
+    dataset = build_dataset(path, _synthetic_chunks(rows, chunk_rows), chunk_rows)
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    samples = 0
+    for X_batch, _ in iter_window_blocks(dataset.features, 0, dataset.rows - window, window, batch_size,
+                                         shuffle=True, rng=np.random.default_rng(0)):
+        samples += len(X_batch)
+    stream_seconds = time.perf_counter() - started
+    queue.put({'rows': rows, 'build_s': build_seconds, 'windows_per_s': samples / stream_seconds,
+               'disk_mb': os.path.getsize(os.path.join(path, 'features.f32')) / 1e6,
+               'growth_mb': _peak_rss_mb() - baseline, 'anon_growth_mb': anon.stop() - anon_baseline})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and evaluate the LSTM on histories larger than RAM.")
+    parser.add_argument('source', nargs='?', help="Parquet or CSV price file with a 'Close' column")
+    parser.add_argument('dataset', nargs='?', help="directory for the memory-mapped datasets")
+    parser.add_argument('--start', help="first date to use (default: the start of the file)")
+    parser.add_argument('--end', help="date to stop before (default: the end of the file)")
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--prediction-days', type=int, default=60)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--bench', action='store_true', help="measure memory on synthetic histories instead")
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--workdir', default='ooc_bench')
+    args = parser.parse_args()
+
+    if args.bench:
+        # Build + one shuffled pass over every window; anonymous growth should stay flat as rows grow
+        print(f"{'rows':>10} {'build s':>8} {'windows/s':>10} {'disk MB':>8} {'RSS growth MB':>14} {'anon MB':>8}")
+        for rows in args.rows:
+            result = run_in_process(_bench_size, rows, args.chunk_rows, args.prediction_days, args.batch_size,
+                                    args.workdir)
+            print(f"{result['rows']:>10} {result['build_s']:>8.1f} {result['windows_per_s']:>10.0f} "
+                  f"{result['disk_mb']:>8.0f} {result['growth_mb']:>14.0f} {result['anon_growth_mb']:>8.0f}")
+        return
+
+    if not args.source or not args.dataset:
+        parser.error("source and dataset are required unless --bench is given")
+    summary = run(args.source, args.dataset, args.epochs, args.prediction_days, args.batch_size, args.chunk_rows,
+                  start=args.start, end=args.end)
+    print(f"Test RMSE: {summary['test_rmse']:.4f} over {summary['test_samples']} samples")
+    print(f"Peak RSS: {summary['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# Headless, downsampled prediction plots for batch runs
+#
+# plot_predictions() in trading_ai.py draws every point with pyplot and then
+# blocks on plt.show(). For a batch over hundreds of tickers this module
+# instead:
+#   - renders with the Agg backend through matplotlib's object API (no pyplot
+#     global state, no window), writing <out_dir>/<TICKER>.png
+#   - downsamples each series to at most `max_points` with
+#     Largest-Triangle-Three-Buckets (LTTB, in lttb.py). LTTB keeps the
+#     point in every bucket that spans the largest triangle with its
+#     neighbours, so peaks, troughs and the overall shape survive; plain
+#     striding would drop them.
+#   - renders many tickers in parallel worker processes
+#
+# Usage:
+#   python trading_plots.py runner_results/predictions.csv --out plots --workers 4
+#   python trading_plots.py --bench --tickers 40 --points 200000
+
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from lttb import lttb
+
+MAX_POINTS = 2000 # Far more than a 14-inch wide figure can show at 100 dpi
+
+
+def downsample(dates, values, max_points=MAX_POINTS):
+    # LTTB on a date-indexed series; returns the kept (dates, values)
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    values = np.asarray(values, dtype=float)
+    keep = lttb(dates.view('int64'), values, max_points)
+    return dates[keep], values[keep]
+
+
+def render_prediction_plot(out_dir, ticker, dates, actual, predicted, max_points=MAX_POINTS, dpi=100):
+    """Write <out_dir>/<ticker>.png, styled like trading_ai.plot_predictions(); returns the path."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(14, 7))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    axes.plot(*downsample(dates, actual, max_points), color='blue', label=f'Actual {ticker} Price')
+    axes.plot(*downsample(dates, predicted, max_points), color='red', label=f'Predicted {ticker} Price')
+    axes.set_title(f'{ticker} Price Prediction')
+    axes.set_xlabel('Date')
+    axes.set_ylabel('Price (USD)')
+    axes.legend()
+    axes.grid(True)
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{ticker}.png")
+    figure.savefig(path, dpi=dpi)
+    return path
+
+
+def _render_job(job):
+    return render_prediction_plot(**job)
+
+
+def render_many(jobs, workers=None):
+    """Render a list of render_prediction_plot() keyword dicts over a process pool; returns the paths."""
+    workers = min(workers or os.cpu_count() or 1, len(jobs)) if jobs else 1
+    if workers == 1:
+        return [_render_job(job) for job in jobs]
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # A few jobs per task keeps the pickling overhead small for short series
+        return list(pool.map(_render_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+def jobs_from_predictions(predictions, out_dir, max_points=MAX_POINTS):
+    # One job per ticker from a trading_runner predictions table (ticker, date, actual, predicted)
+    return [{'out_dir': out_dir, 'ticker': ticker, 'dates': group['date'].to_numpy(dtype='datetime64[ns]'),
+             'actual': group['actual'].to_numpy(), 'predicted': group['predicted'].to_numpy(),
+             'max_points': max_points}
+            for ticker, group in predictions.groupby('ticker', sort=False)]
+
+
+def _render_full_pyplot(out_dir, ticker, dates, actual, predicted, **_):
+    # The trading_ai.py way, minus plt.show(): every point, through pyplot
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(14, 7))
+    plt.plot(dates, actual, color='blue', label=f'Actual {ticker} Price')
+    plt.plot(dates, predicted, color='red', label=f'Predicted {ticker} Price')
+    plt.title(f'{ticker} Price Prediction')
+    plt.legend()
+    plt.grid(True)
+    plt.savefig(os.path.join(out_dir, f"{ticker}.png"))
+    plt.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render prediction plots headlessly, downsampled and in parallel.")
+    parser.add_argument('predictions', nargs='?', help="predictions.csv written by trading_runner.py")
+    parser.add_argument('--out', default='plots')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-points', type=int, default=MAX_POINTS)
+    parser.add_argument('--bench', action='store_true', help="compare with full-resolution serial pyplot")
+    parser.add_argument('--tickers', type=int, default=40)
+    parser.add_argument('--points', type=int, default=200_000)
+    args = parser.parse_args()
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import pandas as pd
+
+    if not args.bench:
+        if not args.predictions:
+            parser.error("give a predictions.csv or --bench")
+        predictions = pd.read_csv(args.predictions, parse_dates=['date'])
+        paths = render_many(jobs_from_predictions(predictions, args.out, args.max_points), args.workers)
+        print(f"Wrote {len(paths)} plots to {args.out}/")
+        return
+
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('2015-01-01', periods=args.points, freq='min').to_numpy()
+    jobs = []
+    for i in range(args.tickers):
+        actual = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, args.points)))
+        jobs.append({'out_dir': os.path.join(args.out, 'lttb'), 'ticker': f"SYN{i:04d}", 'dates': dates,
+                     'actual': actual, 'predicted': actual * (1 + rng.normal(0, 0.002, args.points)),
+                     'max_points': args.max_points})
+
+    os.makedirs(os.path.join(args.out, 'full'), exist_ok=True)
+    sample = jobs[:max(1, args.tickers // 10)]
+    start = time.perf_counter()
+    for job in sample:
+        _render_full_pyplot(**dict(job, out_dir=os.path.join(args.out, 'full')))
+    full_seconds = (time.perf_counter() - start) / len(sample) * len(jobs)
+
+    start = time.perf_counter()
+    for job in sample:
+        _render_job(job)
+    serial_seconds = (time.perf_counter() - start) / len(sample) * len(jobs)
+
+    start = time.perf_counter()
+    render_many(jobs, args.workers)
+    parallel_seconds = time.perf_counter() - start
+
+    print(f"{len(jobs)} tickers x {args.points} points:")
+    print(f"  full resolution, serial pyplot (est): {full_seconds:8.2f} s")
+    print(f"  LTTB {args.max_points} points, serial (est):   {serial_seconds:8.2f} s")
+    print(f"  LTTB {args.max_points} points, parallel:       {parallel_seconds:8.2f} s "
+          f"({args.workers or os.cpu_count()} workers)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# Per-stage timing and memory instrumentation for the trading pipeline
+#
+# Profiler.stage() wraps one numbered step of trading_ai.py and records:
+#   wall_s        elapsed wall-clock time
+#   cpu_s         CPU time of this process (all threads)
+#   rss_peak_mb   highest resident memory seen during the stage (sampled every
+#                 few ms from /proc, so it includes TensorFlow's native memory)
+#   rss_delta_mb  resident memory at the end minus at the start
+# and optionally, per stage:
+#   cProfile      the hottest functions (and a .prof file for snakeviz etc.)
+#   tracemalloc   peak Python/NumPy allocations and the top allocation sites
+#
+# The report is plain JSON:
+#   python trading_ai.py --profile report.json [--cprofile] [--tracemalloc]
+#
+# Running this file benchmarks the whole pipeline on synthetic price series of
+# increasing length and prints how each stage scales:
+#   python trading_profiling.py --rows 1000 2000 5000 10000 --out bench.json
+
+import argparse
+import contextlib
+import cProfile
+import io
+import json
+import multiprocessing
+import os
+import platform
+import pstats
+import queue
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+
+
+def current_rss_mb():
+    # Resident set size right now; falls back to the lifetime peak off Linux
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_anon_mb():
+    # Anonymous resident memory only, i.e. without pages of mapped files that
+    # the kernel can drop; falls back to the full RSS off Linux
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('RssAnon:'):
+                    return int(line.split()[1]) / 1e3
+    except OSError:
+        pass
+    return current_rss_mb()
+
+
+class RssSampler(threading.Thread):
+    """Polls RSS (or another reading) in the background, so short spikes are caught.
+
+    >>> sampler = RssSampler(read=current_anon_mb)
+    >>> sampler.start()
+    >>> peak_mb = sampler.stop()
+    """
+
+    def __init__(self, interval=0.005, read=current_rss_mb):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.read = read
+        self.peak = read()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, self.read())
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, self.read())
+        return self.peak
+
+
+def run_in_process(target, *args, poll=1.0, timeout=None):
+    """Run target(*args, queue) in a fresh spawned process; return what it puts on the queue.
+
+    Benchmarks use this so every measurement starts from a clean process.
+    Raises RuntimeError if the process exits without a result (a crash, or
+    the OOM killer) and TimeoutError after `timeout` seconds, instead of
+    waiting on the queue forever.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=target, args=(*args, results))
+    process.start()
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    try:
+        while True:
+            try:
+                return results.get(timeout=poll)
+            except queue.Empty:
+                pass
+            if process.exitcode is not None:
+                try: # It may have put its result just before exiting
+                    return results.get(timeout=poll)
+                except queue.Empty:
+                    raise RuntimeError(f"{target.__name__} exited with code {process.exitcode} "
+                                       "without a result") from None
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"{target.__name__} gave no result within {timeout} s")
+    finally:
+        if process.exitcode is None:
+            process.join(poll)
+            if process.is_alive():
+                process.terminate()
+        process.join()
+
+
+class Profiler:
+    """Collects per-stage metrics; use one instance per pipeline run.
+
+    >>> profiler = Profiler(cprofile=True)
+    >>> with profiler.stage('2. Feature Engineering'):
+    ...     data = add_indicators(df)
+    >>> profiler.write_report('report.json')
+    """
+
+    def __init__(self, cprofile=False, trace_memory=False, profile_dir=None, top=15):
+        self.cprofile = cprofile
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        self.top = top
+        self.stages = []
+        self.metadata = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+    @contextlib.contextmanager
+    def stage(self, name, **info):
+        record = {'stage': name, **info}
+        sampler = RssSampler()
+        rss_start = current_rss_mb()
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        profile = cProfile.Profile() if self.cprofile else None
+
+        sampler.start()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        if profile:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile:
+                profile.disable()
+            record['wall_s'] = time.perf_counter() - wall_start
+            record['cpu_s'] = time.process_time() - cpu_start
+            record['rss_peak_mb'] = sampler.stop()
+            record['rss_delta_mb'] = current_rss_mb() - rss_start
+
+            if self.trace_memory:
+                record['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / 1e6
+                snapshot = tracemalloc.take_snapshot()
+                record['top_allocations'] = [
+                    {'where': str(stat.traceback), 'size_mb': stat.size / 1e6}
+                    for stat in snapshot.statistics('lineno')[:self.top]
+                ]
+            if profile:
+                record['hotspots'] = self._hotspots(profile)
+                if self.profile_dir:
+                    os.makedirs(self.profile_dir, exist_ok=True)
+                    path = os.path.join(self.profile_dir, f"{len(self.stages):02d}.prof")
+                    profile.dump_stats(path)
+                    record['cprofile_file'] = path
+            self.stages.append(record)
+
+    def _hotspots(self, profile):
+        # Top functions by cumulative time, as plain dicts for the JSON report
+        stats = pstats.Stats(profile, stream=io.StringIO())
+        rows = []
+        for (filename, line, function), (_, calls, own, cumulative, _) in stats.stats.items():
+            rows.append({'function': f"{os.path.basename(filename)}:{line}({function})",
+                         'calls': calls, 'own_s': own, 'cumulative_s': cumulative})
+        rows.sort(key=lambda row: row['cumulative_s'], reverse=True)
+        return rows[:self.top]
+
+    def report(self):
+        total = sum(stage['wall_s'] for stage in self.stages)
+        return {'metadata': self.metadata, 'total_wall_s': total, 'stages': self.stages}
+
+    def write_report(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2, default=str)
+
+    def summary(self):
+        total = sum(stage['wall_s'] for stage in self.stages) or 1.0
+        lines = [f"{'stage':<32} {'wall s':>8} {'cpu s':>8} {'share':>6} {'peak MB':>8}"]
+        for stage in self.stages:
+            lines.append(f"{stage['stage']:<32} {stage['wall_s']:>8.2f} {stage['cpu_s']:>8.2f} "
+                         f"{stage['wall_s'] / total:>6.0%} {stage['rss_peak_mb']:>8.0f}")
+        return '\n'.join(lines)
+
+
+def run_synthetic_pipeline(rows, epochs=1, profiler=None, workdir=None):
+    """Run every trading_ai.py stage on `rows` synthetic daily bars under a Profiler.
+
+    The price cache and plot go in workdir; without one, in a temporary
+    directory that is removed afterwards.
+    """
+    profiler = profiler or Profiler()
+    if workdir is None:
+        with tempfile.TemporaryDirectory(prefix='trading_bench_') as workdir:
+            return _pipeline_stages(rows, epochs, profiler, workdir)
+    return _pipeline_stages(rows, epochs, profiler, workdir)
+
+
+def _pipeline_stages(rows, epochs, profiler, workdir):
+    import matplotlib
+    matplotlib.use('Agg')
+    import pandas as pd
+    import trading_ai
+    from trading_data import PriceCache, SyntheticSource
+
+    # A fixed past end date, so PriceCache never trims the range at "today"
+    days = pd.bdate_range(end='2020-01-01', periods=rows)
+    start, end = days[0], days[-1] + pd.Timedelta(days=1)
+
+    with profiler.stage('1. Fetch Historical Data', rows=rows):
+        df = PriceCache(os.path.join(workdir, 'cache'), SyntheticSource()).get('SYN', start, end)
+    with profiler.stage('2. Feature Engineering', rows=rows):
+        data = trading_ai.add_indicators(df)
+    with profiler.stage('3. Data Preprocessing', rows=rows):
+        scaler, scaled_data, X, y = trading_ai.preprocess(data, trading_ai.PREDICTION_DAYS)
+        X_train, X_test, y_train, y_test = trading_ai.split_train_test(X, y, 0.8)
+    with profiler.stage('4. Build LSTM Model', rows=rows):
+        model = trading_ai.build_model((X.shape[1], X.shape[2]))
+    with profiler.stage('5. Train Model', rows=rows, epochs=epochs):
+        trading_ai.train_model(model, scaled_data, len(X_train), trading_ai.PREDICTION_DAYS,
+                               epochs, trading_ai.BATCH_SIZE, verbose=0)
+    with profiler.stage('6. Make Predictions', rows=rows):
+        predictions, actual = trading_ai.predict_prices(model, scaler, X_test, y_test)
+    with profiler.stage('7. Visualize Results', rows=rows):
+        # The headless path trading_ai.py takes with --plot-dir; the default
+        # one ends in plt.show(), which waits for a window to be closed
+        test_dates = data.index[len(data) - len(actual):].values
+        trading_ai.plot_predictions(test_dates, actual, predictions, 'SYN', out_dir=workdir)
+    return profiler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic series of increasing length.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 2000, 5000, 10000])
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--out', help="also write the results as JSON")
+    parser.add_argument('--tracemalloc', action='store_true')
+    args = parser.parse_args()
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+    # Throw-away first run so one-off import and tracing costs (sklearn,
+    # TensorFlow) don't land in the smallest series' numbers
+    print("Warm-up run...")
+    run_synthetic_pipeline(min(args.rows), 1)
+
+    runs = []
+    for rows in args.rows:
+        print(f"Running pipeline on {rows} synthetic bars...")
+        profiler = run_synthetic_pipeline(rows, args.epochs, Profiler(trace_memory=args.tracemalloc))
+        runs.append({'rows': rows, **profiler.report()})
+
+    # Scaling table: wall seconds per stage (rows) for each series length (columns)
+    stage_names = [stage['stage'] for stage in runs[0]['stages']]
+    print(f"\n{'stage':<28}" + ''.join(f"{rows:>10}" for rows in args.rows))
+    for i, name in enumerate(stage_names):
+        print(f"{name:<28}" + ''.join(f"{run['stages'][i]['wall_s']:>10.3f}" for run in runs))
+    print(f"{'total':<28}" + ''.join(f"{run['total_wall_s']:>10.3f}" for run in runs))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'epochs': args.epochs, 'runs': runs}, f, indent=2, default=str)
+        print(f"\nWrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
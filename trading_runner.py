@@ -0,0 +1,224 @@
+# Parallel multi-ticker runner for the trading_ai.py pipeline
+#
+# Runs fetch -> indicators -> windows -> training -> prediction for many tickers
+# at once, one ticker per task, spread over a pool of worker processes. Each
+# worker caps TensorFlow (and the BLAS libraries under NumPy) to a few threads
+# so that N workers on an N-core box don't fight over the same cores. The
+# thread variables are set in this process while the pool starts, because a
+# spawned worker imports NumPy (via this module) before its initializer runs,
+# and OpenBLAS/MKL read them only once, at import.
+#
+# Per-ticker metrics end up in one table (metrics.csv) and every test-set
+# prediction in another (predictions.csv), both in --out.
+#
+# Usage:
+#   python trading_runner.py AAPL MSFT GOOG --workers 4 --tf-threads 1
+#   python trading_runner.py --tickers-file tickers.txt --epochs 10
+#   python trading_runner.py AAPL MSFT GOOG NVDA --benchmark   # scaling table
+#   python trading_runner.py --tickers-file tickers.txt --plots runner_results/plots
+
+import argparse
+import contextlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import trading_ai
+
+
+THREAD_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+               'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS')
+
+
+@contextlib.contextmanager
+def worker_threads(tf_threads):
+    # Thread limits in os.environ while worker processes are spawned (they
+    # inherit it), restored afterwards so this process isn't affected
+    saved = {var: os.environ.get(var) for var in THREAD_VARS + ('TF_CPP_MIN_LOG_LEVEL',)}
+    os.environ.update({var: str(tf_threads) for var in THREAD_VARS})
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def init_worker(tf_threads):
+    # Runs once in every worker process, before TensorFlow is first imported
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(tf_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(tf_threads)
+
+
+def run_ticker(ticker, config):
+    """Run the whole pipeline for one ticker and return (metrics, predictions).
+
+    Failures are reported in the metrics row instead of raised, so one bad
+    symbol doesn't abort a run over hundreds of them.
+    """
+    started = time.perf_counter()
+    metrics = {'ticker': ticker, 'status': 'ok', 'error': ''}
+    try:
+        df = trading_ai.fetch_data(ticker, config['start'], config['end'], config['cache_dir'])
+        if df.empty:
+            raise ValueError("no data fetched")
+
+        data = trading_ai.add_indicators(df, ticker, trading_ai.FeatureStore(config['feature_dir']))
+        scaler, scaled_data, X, y = trading_ai.preprocess(data, config['prediction_days'])
+        X_train, X_test, y_train, y_test = trading_ai.split_train_test(X, y, 0.8)
+
+        model = trading_ai.build_model((X_train.shape[1], X_train.shape[2]))
+        history = trading_ai.train_model(model, scaled_data, len(X_train), config['prediction_days'],
+                                         config['epochs'], config['batch_size'], verbose=0)
+        predictions, actual = trading_ai.predict_prices(model, scaler, X_test, y_test,
+                                                        config['batch_size'])
+    except Exception as e:
+        metrics.update(status='failed', error=f"{type(e).__name__}: {e}",
+                       seconds=time.perf_counter() - started)
+        return metrics, pd.DataFrame()
+
+    errors = predictions - actual
+    metrics.update(
+        rows=len(data),
+        train_samples=len(X_train),
+        test_samples=len(X_test),
+        train_loss=history.history['loss'][-1],
+        val_loss=history.history['val_loss'][-1],
+        test_rmse=float(np.sqrt(np.mean(errors ** 2))),
+        test_mae=float(np.mean(np.abs(errors))),
+        seconds=time.perf_counter() - started,
+    )
+    predictions_table = pd.DataFrame({
+        'ticker': ticker,
+        'date': data.index[-len(actual):],
+        'actual': actual,
+        'predicted': predictions,
+    })
+    return metrics, predictions_table
+
+
+def run_tickers(tickers, workers=None, tf_threads=1, **config):
+    """Run many tickers over a process pool; returns (metrics_df, predictions_df)."""
+    settings = {
+        'start': trading_ai.START_DATE,
+        'end': trading_ai.END_DATE,
+        'cache_dir': trading_ai.CACHE_DIR,
+        'feature_dir': trading_ai.FEATURE_DIR,
+        'prediction_days': trading_ai.PREDICTION_DAYS,
+        'epochs': trading_ai.EPOCHS,
+        'batch_size': trading_ai.BATCH_SIZE,
+    }
+    settings.update(config)
+    if tf_threads < 1:
+        raise ValueError(f"tf_threads must be at least 1, got {tf_threads}")
+    workers = min(workers or max(1, (os.cpu_count() or 1) // tf_threads), len(tickers))
+
+    rows, frames = [], []
+    # TensorFlow is not fork-safe, so always start clean interpreter processes
+    context = multiprocessing.get_context('spawn')
+    with worker_threads(tf_threads), ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                         initializer=init_worker, initargs=(tf_threads,)) as pool:
+        futures = {pool.submit(run_ticker, ticker, settings): ticker for ticker in tickers}
+        for future in as_completed(futures):
+            metrics, predictions = future.result()
+            print(f"  {metrics['ticker']:<8} {metrics['status']:<7} {metrics.get('seconds', 0):6.1f}s {metrics['error']}")
+            rows.append(metrics)
+            if not predictions.empty:
+                frames.append(predictions)
+
+    metrics_df = pd.DataFrame(rows).set_index('ticker').loc[list(dict.fromkeys(tickers))].reset_index()
+    predictions_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=['ticker', 'date', 'actual', 'predicted'])
+    return metrics_df, predictions_df
+
+
+def benchmark(tickers, tf_threads=1, **config):
+    # Time the same ticker list with 1, 2, 4, ... workers up to the core count
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= min(cores, len(tickers)):
+        counts.append(counts[-1] * 2)
+
+    # Warm the price cache and the feature store first so every run starts from
+    # the same state; otherwise the 1-worker run fills the store and the later
+    # runs read from it, which inflates the speedup
+    store = trading_ai.FeatureStore(config.get('feature_dir', trading_ai.FEATURE_DIR))
+    for ticker in tickers:
+        df = trading_ai.fetch_data(ticker, config.get('start', trading_ai.START_DATE),
+                                   config.get('end', trading_ai.END_DATE),
+                                   config.get('cache_dir', trading_ai.CACHE_DIR))
+        if not df.empty:
+            trading_ai.add_indicators(df, ticker, store)
+
+    results = []
+    for workers in counts:
+        print(f"Running {len(tickers)} tickers with {workers} worker(s)...")
+        start = time.perf_counter()
+        run_tickers(tickers, workers=workers, tf_threads=tf_threads, **config)
+        results.append((workers, time.perf_counter() - start))
+
+    baseline = results[0][1]
+    print(f"\n{'workers':>8} {'seconds':>9} {'speedup':>8} {'efficiency':>11}")
+    for workers, seconds in results:
+        print(f"{workers:>8} {seconds:>9.1f} {baseline / seconds:>8.2f} {baseline / seconds / workers:>11.0%}")
+
+
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the trading_ai.py pipeline for many tickers in parallel.")
+    parser.add_argument('tickers', nargs='*', help="ticker symbols, e.g. AAPL MSFT")
+    parser.add_argument('--tickers-file', help="text file with one ticker per line")
+    parser.add_argument('--workers', type=positive_int, default=None,
+                        help="worker processes (default: cores / tf-threads)")
+    parser.add_argument('--tf-threads', type=positive_int, default=1, help="TensorFlow threads per worker")
+    parser.add_argument('--start', default=trading_ai.START_DATE)
+    parser.add_argument('--end', default=trading_ai.END_DATE)
+    parser.add_argument('--epochs', type=int, default=trading_ai.EPOCHS)
+    parser.add_argument('--out', default='runner_results', help="directory for metrics.csv and predictions.csv")
+    parser.add_argument('--benchmark', action='store_true', help="time the run at 1, 2, 4, ... workers")
+    parser.add_argument('--plots', metavar='DIR', help="render a prediction plot per ticker into DIR")
+    args = parser.parse_args()
+
+    tickers = list(args.tickers)
+    if args.tickers_file:
+        with open(args.tickers_file) as f:
+            tickers += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    if not tickers:
+        parser.error("no tickers given")
+
+    config = {'start': args.start, 'end': args.end, 'epochs': args.epochs}
+    if args.benchmark:
+        benchmark(tickers, tf_threads=args.tf_threads, **config)
+        return
+
+    print(f"Running {len(tickers)} tickers...")
+    metrics, predictions = run_tickers(tickers, workers=args.workers, tf_threads=args.tf_threads, **config)
+
+    os.makedirs(args.out, exist_ok=True)
+    metrics.to_csv(os.path.join(args.out, 'metrics.csv'), index=False)
+    predictions.to_csv(os.path.join(args.out, 'predictions.csv'), index=False)
+    print(metrics.to_string(index=False))
+    print(f"Results written to {args.out}/")
+
+    if args.plots and not predictions.empty:
+        from trading_plots import jobs_from_predictions, render_many
+        paths = render_many(jobs_from_predictions(predictions, args.plots), args.workers)
+        print(f"{len(paths)} plots written to {args.plots}/")
+
+
+if __name__ == "__main__":
+    main()
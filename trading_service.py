@@ -0,0 +1,312 @@
+# Warm-model asyncio inference service for the trading_ai.py LSTM
+#
+# The trained model and its MinMaxScaler are loaded once and kept in memory.
+# Every ticker gets a StreamingIndicators state (see trading_indicators.py)
+# and a ring buffer holding its last PREDICTION_DAYS scaled feature rows, so a
+# new bar costs O(1) and a prediction never recomputes history. Prediction
+# requests that arrive close together are grouped into one micro-batch and
+# scored with a single model call.
+#
+# Usage:
+#   python trading_service.py --load-test                  # synthetic feed, random weights
+#   python trading_service.py --load-test --model m.keras --scaler s.pkl
+#   python trading_service.py --serve --model m.keras --scaler s.pkl --port 8765
+#   python trading_service.py --serve --weights weights.float32.npz   # NumPy only, no TensorFlow
+#
+# The --serve protocol is one JSON object per line over TCP:
+#   {"ticker": "AAPL", "close": 187.2}    -> {"ok": true}
+#   {"ticker": "AAPL", "predict": true}   -> {"ticker": "AAPL", "prediction": 188.1}
+
+import argparse
+import asyncio
+import json
+import pickle
+import time
+
+import numpy as np
+
+from trading_indicators import StreamingIndicators
+
+FEATURES = ['Close', 'SMA_20', 'SMA_50', 'RSI'] # Same column order as trading_ai.py
+
+
+class TickerState:
+    # Indicator state plus a ring buffer of the last `window` scaled feature rows
+    def __init__(self, window, n_features):
+        self.indicators = StreamingIndicators()
+        self.rows = np.zeros((window, n_features), dtype=np.float32)
+        self.count = 0
+
+    def push(self, row):
+        self.rows[self.count % len(self.rows)] = row
+        self.count += 1
+
+    def ready(self):
+        return self.count >= len(self.rows)
+
+    def window(self):
+        # Oldest row first, as the model saw during training
+        start = self.count % len(self.rows)
+        return np.concatenate([self.rows[start:], self.rows[:start]])
+
+
+class InferenceService:
+    """Keeps a model warm and answers predictions for many tickers.
+
+    on_bar(ticker, close) feeds a new bar; `await predict(ticker)` returns the
+    next-bar 'Close' forecast in price units. Requests are micro-batched: the
+    first request waits at most `max_wait_ms` for others to join, and at most
+    `max_batch` windows go into one model call.
+    """
+
+    def __init__(self, model, scaler, prediction_days=60, max_batch=64, max_wait_ms=2.0):
+        self.model = model
+        self.prediction_days = prediction_days
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        # MinMaxScaler.transform is x * scale_ + min_; doing it by hand avoids
+        # sklearn's per-call validation overhead on single rows
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+        self.offset = np.asarray(scaler.min_, dtype=np.float64)
+        self.tickers = {}
+        self.batch_sizes = []
+        self._queue = None
+        self._batcher = None
+
+    def on_bar(self, ticker, close):
+        state = self.tickers.get(ticker)
+        if state is None:
+            state = self.tickers[ticker] = TickerState(self.prediction_days, len(FEATURES))
+        values = state.indicators.update(close)
+        row = np.array([values[name][0] for name in FEATURES])
+        if np.isfinite(row).all(): # Skip bars while the indicators are still warming up
+            state.push(row * self.scale + self.offset)
+
+    def warm_up(self, ticker, closes):
+        # Replay past closes so the ticker can be predicted right away
+        for close in closes:
+            self.on_bar(ticker, close)
+
+    async def start(self):
+        # Trace every padded batch shape up front so the first real requests
+        # don't pay TensorFlow's graph-building cost
+        for size in self._padded_sizes():
+            self._predict_batch(np.zeros((size, self.prediction_days, len(FEATURES)), dtype=np.float32))
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batches())
+
+    async def stop(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher = None
+
+    async def predict(self, ticker):
+        if self._batcher is None:
+            raise RuntimeError("InferenceService.predict() called before start()")
+        state = self.tickers.get(ticker)
+        if state is None or not state.ready():
+            raise KeyError(f"{ticker} has fewer than {self.prediction_days} complete bars")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((state.window(), future))
+        scaled = await future
+        # Inverse of the scaler for the 'Close' column (index 0)
+        return float((scaled - self.offset[0]) / self.scale[0])
+
+    def _padded_sizes(self):
+        # The powers of two below max_batch, then max_batch itself
+        sizes = [1 << i for i in range(self.max_batch.bit_length()) if 1 << i < self.max_batch]
+        return sizes + [self.max_batch]
+
+    def _predict_batch(self, windows):
+        # Pad to a power of two (capped at max_batch) so the model only ever sees
+        # the shapes start() traced and TensorFlow doesn't retrace per batch size
+        n = len(windows)
+        padded = min(1 << (n - 1).bit_length(), self.max_batch)
+        if padded > n:
+            windows = np.concatenate([windows, np.repeat(windows[-1:], padded - n, axis=0)])
+        return np.asarray(self.model.predict_on_batch(windows)).reshape(-1)[:n]
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            windows = np.stack([window for window, _ in batch])
+            self.batch_sizes.append(len(batch))
+            try:
+                # Run the model off the event loop so bars keep flowing meanwhile
+                outputs = await loop.run_in_executor(None, self._predict_batch, windows)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(output)
+
+
+def load_service(model_path, scaler_path, **kwargs):
+    # Load a saved Keras model and a pickled MinMaxScaler once
+    from tensorflow.keras.models import load_model
+    with open(scaler_path, 'rb') as f:
+        scaler = pickle.load(f)
+    return InferenceService(load_model(model_path), scaler, **kwargs)
+
+
+def load_numpy_service(weights_path, **kwargs):
+    # Exported weights with their scaler (see trading_numpy_model.py); never imports TensorFlow
+    from types import SimpleNamespace
+    from trading_numpy_model import NumpyLSTM
+    model = NumpyLSTM.load(weights_path)
+    if model.scale is None:
+        raise ValueError(f"{weights_path} was exported without a scaler")
+    return InferenceService(model, SimpleNamespace(scale_=model.scale, min_=model.offset), **kwargs)
+
+
+async def serve(service, host='127.0.0.1', port=8765):
+    async def handle(reader, writer):
+        while line := await reader.readline():
+            try:
+                message = json.loads(line)
+                if message.get('predict'):
+                    reply = {'ticker': message['ticker'],
+                             'prediction': await service.predict(message['ticker'])}
+                else:
+                    service.on_bar(message['ticker'], float(message['close']))
+                    reply = {'ok': True}
+            except Exception as e:
+                reply = {'error': f"{type(e).__name__}: {e}"}
+            writer.write((json.dumps(reply) + '\n').encode())
+            await writer.drain()
+        writer.close()
+
+    await service.start()
+    server = await asyncio.start_server(handle, host, port)
+    print(f"Serving predictions on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+async def load_test(service, tickers=200, requests=5000, concurrency=256, bars_per_second=2000, seed=0):
+    """Drive the service with a synthetic bar feed and concurrent clients.
+
+    Returns a dict with p50/p99 latency (ms), throughput and mean batch size.
+    """
+    rng = np.random.default_rng(seed)
+    names = [f"SYN{i:04d}" for i in range(tickers)]
+    prices = 100 * np.exp(rng.normal(0, 0.2, tickers))
+    for i, name in enumerate(names):
+        history = prices[i] * np.exp(np.cumsum(rng.normal(0, 0.01, service.prediction_days + 60)))
+        service.warm_up(name, history)
+        prices[i] = history[-1]
+
+    await service.start()
+    stop_feed = asyncio.Event()
+
+    async def feed():
+        # Random-walk bars for random tickers while clients are querying
+        while not stop_feed.is_set():
+            i = rng.integers(tickers)
+            prices[i] *= np.exp(rng.normal(0, 0.01))
+            service.on_bar(names[i], prices[i])
+            await asyncio.sleep(1.0 / bars_per_second)
+
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def client():
+        for _ in remaining:
+            start = time.perf_counter()
+            await service.predict(names[rng.integers(tickers)])
+            latencies.append(time.perf_counter() - start)
+
+    feeder = asyncio.create_task(feed())
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop_feed.set()
+    await feeder
+    await service.stop()
+
+    latencies_ms = np.array(latencies) * 1e3
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'throughput_rps': requests / elapsed,
+        'mean_batch': float(np.mean(service.batch_sizes)),
+    }
+
+
+def _untrained_service(prediction_days, **kwargs):
+    # A randomly initialised model of the trading_ai.py shape: latency doesn't
+    # depend on the weights, so load tests don't need a trained model
+    from sklearn.preprocessing import MinMaxScaler
+    import trading_ai
+
+    model = trading_ai.build_model((prediction_days, len(FEATURES)))
+    scaler = MinMaxScaler().fit(np.array([[50, 50, 50, 0], [200, 200, 200, 100]], dtype=float))
+    return InferenceService(model, scaler, prediction_days, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm-model LSTM inference service with micro-batching.")
+    parser.add_argument('--model', help="saved Keras model (default: untrained model for load tests)")
+    parser.add_argument('--scaler', help="pickled MinMaxScaler fitted on the training features")
+    parser.add_argument('--weights', help="NumPy weights from trading_numpy_model.py export (instead of --model)")
+    parser.add_argument('--prediction-days', type=int, default=60)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    parser.add_argument('--serve', action='store_true')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--load-test', action='store_true')
+    parser.add_argument('--tickers', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=256)
+    args = parser.parse_args()
+    if args.model and not args.scaler:
+        parser.error("--model needs --scaler (the MinMaxScaler fitted with it)")
+    if args.max_batch < 1:
+        parser.error("--max-batch must be at least 1")
+
+    options = {'max_batch': args.max_batch, 'max_wait_ms': args.max_wait_ms}
+    if args.weights:
+        service = load_numpy_service(args.weights, prediction_days=args.prediction_days, **options)
+    elif args.model:
+        service = load_service(args.model, args.scaler, prediction_days=args.prediction_days, **options)
+    else:
+        service = _untrained_service(args.prediction_days, **options)
+
+    if args.serve:
+        asyncio.run(serve(service, port=args.port))
+    elif args.load_test:
+        report = asyncio.run(load_test(service, args.tickers, args.requests, args.concurrency))
+        print(f"{report['requests']} requests, {report['concurrency']} concurrent clients")
+        print(f"  p50 latency: {report['p50_ms']:8.2f} ms")
+        print(f"  p99 latency: {report['p99_ms']:8.2f} ms")
+        print(f"  throughput:  {report['throughput_rps']:8.0f} predictions/s")
+        print(f"  mean batch:  {report['mean_batch']:8.1f}")
+    else:
+        parser.error("choose --serve or --load-test")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# Parallel hyperparameter sweep for the trading_ai.py LSTM
+#
+# LSTM units, dropout, PREDICTION_DAYS, BATCH_SIZE and EPOCHS are constants
+# in trading_ai.py. This sweep searches over them without repeating the
+# download and feature pipeline per trial:
+#
+#   1. Fetch, compute indicators and scale once; save the scaled features to
+#      <sweep dir>/data-<key>/features.npy, where key is a hash of the ticker,
+#      date range and feature spec, so a sweep over other data never reuses
+#      them. Workers open it with mmap_mode='r' rather than recomputing it or
+#      being sent a pickled copy per trial, and train from window views over
+#      the mapping (trading_ai.train_model's default input), so each batch is
+#      read from the page cache instead of a per-worker copy of the array.
+#   2. Schedule trials with successive halving: every config trains for
+#      `min_epochs`, the best 1/eta by validation loss continue to eta times
+#      as many epochs, and so on up to `max_epochs`. Promoted trials resume
+#      from the weights saved at the end of the previous rung (one file per
+#      trial and rung, weights/<trial>.e<epochs>.weights.h5, never
+#      overwritten by a later rung). Inside a rung, Keras EarlyStopping ends
+#      trials whose validation loss stops improving.
+#   3. Every finished (trial, rung) is appended to results.jsonl next to the
+#      features (and weights go in the same folder). Re-running the same
+#      sweep skips work already in the log, so an interrupted sweep picks up
+#      where it stopped.
+#
+# At the end it compares the time taken with exhaustive serial search (every
+# config trained for max_epochs, one after another). By default that is an
+# estimate from the seconds per epoch measured for each config, and labelled
+# as such; --measure-exhaustive actually runs it.
+#
+# Usage:
+#   python trading_sweep.py --ticker AAPL --workers 4 --max-epochs 27
+#   python trading_sweep.py --ticker AAPL --measure-exhaustive   # slow: trains every config in full
+
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+SEARCH_SPACE = {
+    'units': [32, 50, 64],
+    'dropout': [0.1, 0.2, 0.3],
+    'prediction_days': [30, 60],
+    'batch_size': [32, 64],
+}
+
+
+def trial_id(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:10]
+
+
+def data_key(ticker, start, end):
+    # Everything that decides the feature array; the sweep's features, log and weights are kept under it
+    from trading_features import FEATURE_SPEC
+
+    config = {'ticker': ticker, 'start': str(start), 'end': str(end), 'features': FEATURE_SPEC,
+              'scaling': 'minmax'}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:10]
+
+
+def prepare_features(data_dir, ticker, start, end):
+    """Fetch, engineer and scale once; returns the path of the shared .npy file in data_dir."""
+    import trading_ai
+
+    path = os.path.join(data_dir, 'features.npy')
+    if os.path.exists(path):
+        return path
+    df = trading_ai.fetch_data(ticker, start, end)
+    if df.empty:
+        raise ValueError(f"No data fetched for {ticker}")
+    data = trading_ai.add_indicators(df)
+    scaler, scaled_data, _, _ = trading_ai.preprocess(data, 1)
+    np.save(path, scaled_data.astype(np.float32))
+    return path
+
+
+def run_trial(params, features_path, weights_dir, epochs_done, epochs_target, patience):
+    """Train one config from epochs_done up to epochs_target; returns a log record."""
+    from tensorflow.keras.callbacks import EarlyStopping
+    import trading_ai
+
+    started = time.perf_counter()
+    scaled_data = np.load(features_path, mmap_mode='r')
+    window = params['prediction_days']
+    train_size = int((len(scaled_data) - window) * 0.8) # Same 80/20 split as trading_ai.py
+
+    model = trading_ai.build_model((window, scaled_data.shape[1]), params['units'], params['dropout'])
+    # One checkpoint per rung: rerunning a rung whose log record never got
+    # written starts again from the previous rung's weights, not its own
+    if epochs_done:
+        model.load_weights(os.path.join(weights_dir, f"{trial_id(params)}.e{epochs_done}.weights.h5"))
+
+    stopper = EarlyStopping(monitor='val_loss', patience=patience, restore_best_weights=True)
+    # Window views over the memory map (not tf_data, whose tf.constant would copy it into every worker)
+    history = trading_ai.train_model(model, scaled_data, train_size, window, epochs_target - epochs_done,
+                                     params['batch_size'], verbose=0, callbacks=[stopper], tf_data=False)
+    model.save_weights(os.path.join(weights_dir, f"{trial_id(params)}.e{epochs_target}.weights.h5"))
+
+    epochs_run = len(history.history['loss'])
+    seconds = time.perf_counter() - started
+    return {
+        'trial': trial_id(params),
+        'params': params,
+        'epochs': epochs_target,
+        'epochs_run': epochs_run,
+        'early_stopped': epochs_run < epochs_target - epochs_done,
+        'val_loss': float(min(history.history['val_loss'])),
+        'seconds': seconds,
+        'seconds_per_epoch': seconds / max(epochs_run, 1),
+    }
+
+
+def load_log(log_path):
+    # {(trial, epochs): record} for every rung already finished
+    done = {}
+    if os.path.exists(log_path):
+        with open(log_path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    done[(record['trial'], record['epochs'])] = record
+    return done
+
+
+def rung_schedule(min_epochs, max_epochs, eta):
+    # e.g. 3, 9, 27 for min_epochs=3, max_epochs=27, eta=3
+    rungs = [min_epochs]
+    while rungs[-1] * eta <= max_epochs:
+        rungs.append(rungs[-1] * eta)
+    if rungs[-1] != max_epochs:
+        rungs.append(max_epochs)
+    return rungs
+
+
+def sweep(sweep_dir, ticker, start, end, space=SEARCH_SPACE, min_epochs=3, max_epochs=27, eta=3,
+          workers=None, tf_threads=1, patience=3, measure_exhaustive=False):
+    """Run (or resume) a successive-halving sweep; returns the final rung's records, best first.
+
+    Features, results log and weights live in <sweep_dir>/data-<data_key()>.
+    """
+    from trading_runner import init_worker, worker_threads
+
+    data_dir = os.path.join(sweep_dir, f"data-{data_key(ticker, start, end)}")
+    os.makedirs(os.path.join(data_dir, 'weights'), exist_ok=True)
+    log_path = os.path.join(data_dir, 'results.jsonl')
+    features_path = prepare_features(data_dir, ticker, start, end)
+
+    names = sorted(space)
+    candidates = [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+    rungs = rung_schedule(min_epochs, max_epochs, eta)
+    done = load_log(log_path)
+    resumed = bool(done)
+    workers = workers or max(1, (os.cpu_count() or 1) // tf_threads)
+
+    sweep_started = time.perf_counter()
+    context = multiprocessing.get_context('spawn')
+    with worker_threads(tf_threads), ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                         initializer=init_worker, initargs=(tf_threads,)) as pool:
+        previous = 0
+        for rung, epochs in enumerate(rungs):
+            pending = [p for p in candidates if (trial_id(p), epochs) not in done]
+            print(f"Rung {rung}: {len(candidates)} configs at {epochs} epochs "
+                  f"({len(candidates) - len(pending)} already in the log)")
+            futures = [pool.submit(run_trial, p, features_path, os.path.join(data_dir, 'weights'),
+                                   previous, epochs, patience) for p in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                done[(record['trial'], epochs)] = record
+                with open(log_path, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+                print(f"  {record['trial']} {record['params']} val_loss={record['val_loss']:.6f}"
+                      f"{' (early stop)' if record['early_stopped'] else ''}")
+
+            records = sorted((done[(trial_id(p), epochs)] for p in candidates), key=lambda r: r['val_loss'])
+            if epochs == rungs[-1]:
+                break
+            keep = max(1, math.ceil(len(candidates) / eta))
+            candidates = [r['params'] for r in records[:keep]]
+            previous = epochs
+    wall_clock = time.perf_counter() - sweep_started
+
+    trial_seconds = sum(record['seconds'] for record in done.values())
+    if measure_exhaustive:
+        exhaustive = measure_exhaustive_search(features_path, data_dir, space, max_epochs, tf_threads)
+        label = "measured"
+    else:
+        # Every config for max_epochs at its measured speed; not run
+        speeds = {}
+        for record in done.values():
+            speeds.setdefault(record['trial'], []).append(record['seconds_per_epoch'])
+        exhaustive = sum(np.mean(s) * max_epochs for s in speeds.values())
+        label = "estimated from the measured seconds per epoch, not run"
+    configs = len(list(itertools.product(*space.values())))
+    print(f"\nExhaustive serial search: {exhaustive:.0f} s for {configs} configs x {max_epochs} epochs ({label})")
+    print(f"Successive halving, serial compute: {trial_seconds:.0f} s ({exhaustive / trial_seconds:.1f}x less)")
+    if not resumed:
+        # Wall-clock only means something when the whole sweep ran in this process
+        print(f"Successive halving, wall-clock with {workers} workers: {wall_clock:.0f} s "
+              f"({exhaustive / wall_clock:.1f}x less)")
+    return records
+
+
+def measure_exhaustive_search(features_path, data_dir, space, max_epochs, tf_threads=1):
+    # Train every config for max_epochs, one after another in one worker, without early stopping; returns seconds
+    from trading_runner import init_worker, worker_threads
+
+    weights_dir = os.path.join(data_dir, 'exhaustive_weights')
+    os.makedirs(weights_dir, exist_ok=True)
+    names = sorted(space)
+    configs = [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+    print(f"\nMeasuring exhaustive serial search: {len(configs)} configs x {max_epochs} epochs...")
+    context = multiprocessing.get_context('spawn')
+    with worker_threads(tf_threads), ProcessPoolExecutor(max_workers=1, mp_context=context,
+                                                         initializer=init_worker, initargs=(tf_threads,)) as pool:
+        pool.submit(time.sleep, 0).result() # Start the worker (and TensorFlow) before timing
+        started = time.perf_counter()
+        for params in configs:
+            pool.submit(run_trial, params, features_path, weights_dir, 0, max_epochs, max_epochs).result()
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Successive-halving LSTM hyperparameter sweep.")
+    parser.add_argument('--ticker', default='AAPL')
+    parser.add_argument('--start', default='2018-01-01')
+    parser.add_argument('--end', default='2023-01-01')
+    parser.add_argument('--dir', default=None, help="sweep directory (default: sweeps/<ticker>)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--tf-threads', type=int, default=1)
+    parser.add_argument('--min-epochs', type=int, default=3)
+    parser.add_argument('--max-epochs', type=int, default=27)
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--patience', type=int, default=3)
+    parser.add_argument('--measure-exhaustive', action='store_true',
+                        help="also time exhaustive serial search instead of estimating it (slow)")
+    args = parser.parse_args()
+
+    sweep_dir = args.dir or os.path.join('sweeps', args.ticker)
+    records = sweep(sweep_dir, args.ticker, args.start, args.end, min_epochs=args.min_epochs,
+                    max_epochs=args.max_epochs, eta=args.eta, workers=args.workers,
+                    tf_threads=args.tf_threads, patience=args.patience,
+                    measure_exhaustive=args.measure_exhaustive)
+    best = records[0]
+    print(f"\nBest config: {best['params']} val_loss={best['val_loss']:.6f}")
+
+
+if __name__ == "__main__":
+    main()
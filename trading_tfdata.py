@@ -0,0 +1,122 @@
+# tf.data input pipeline for training the trading_ai.py LSTM
+#
+# Instead of handing model.fit() a fully materialized X_train (every window
+# copied), the scaled series is put into TensorFlow once as float32 and each
+# batch of windows is gathered from it on the fly:
+#
+#   sample indices -> shuffle (training span only) -> batch
+#                  -> gather windows (parallel map) -> prefetch
+#
+# The train/validation split stays chronological: validation is the last 10%
+# of the training span, the same samples validation_split=0.1 picks, and it is
+# never shuffled. Only sample indices are ever cached, never gathered windows,
+# which would materialize them again.
+#
+# On CPU this measured slower and larger than trading_ai.train_model()'s default
+# of copying shuffled batches from strided views, so trading_ai uses it only
+# with --tf-data (train_model(..., tf_data=True)).
+#
+# Run this file directly to compare samples/sec and peak RSS with the old
+# array-based fit on a synthetic series:
+#   python trading_tfdata.py --rows 20000 --epochs 2
+
+import argparse
+import resource
+import time
+
+import numpy as np
+
+from trading_profiling import run_in_process
+
+
+def make_datasets(scaled_data, window, train_size, batch_size=32, validation_fraction=0.1,
+                  shuffle_buffer=None, seed=None, horizon=1):
+    """Return (train_ds, val_ds) of (windows, next 'Close') batches.
+
+    Sample k is scaled_data[k:k+window] with target scaled_data[k+window, 0],
+    exactly as in trading_windows.sliding_windows(). Only samples below
+    `train_size` are used, so the test span never leaks into training.
+    With horizon > 1 the target is the next `horizon` closes instead, shape
+    (batch, horizon); the caller must leave room for them after train_size.
+    """
+    import tensorflow as tf
+
+    series = tf.constant(np.asarray(scaled_data, dtype=np.float32))
+    offsets = tf.range(window, dtype=tf.int64)
+    target_offsets = tf.range(window, window + horizon, dtype=tf.int64)
+    split_at = int(train_size * (1 - validation_fraction)) # Floor, like Keras's validation_split
+
+    def gather(indices):
+        # (batch,) sample indices -> (batch, window, features) windows and (batch,) targets
+        windows = tf.gather(series, indices[:, None] + offsets[None, :])
+        if horizon == 1:
+            targets = tf.gather(series[:, 0], indices + window)
+        else:
+            targets = tf.gather(series[:, 0], indices[:, None] + target_offsets[None, :])
+        return windows, targets
+
+    train_ds = (tf.data.Dataset.range(split_at)
+                .shuffle(shuffle_buffer or split_at, seed=seed, reshuffle_each_iteration=True)
+                .batch(batch_size)
+                .map(gather, num_parallel_calls=tf.data.AUTOTUNE)
+                .prefetch(tf.data.AUTOTUNE))
+    val_ds = (tf.data.Dataset.range(split_at, train_size)
+              .batch(batch_size)
+              .cache() # The index batches; windows are gathered again each epoch
+              .map(gather, num_parallel_calls=tf.data.AUTOTUNE)
+              .prefetch(tf.data.AUTOTUNE))
+    return train_ds, val_ds
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _benchmark_mode(mode, rows, window, epochs, batch_size, queue):
+    # Runs in a fresh process so peak RSS only reflects one input pipeline
+    import os
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    import trading_ai
+
+    rng = np.random.default_rng(0)
+    scaled_data = rng.random((rows, 4))
+    train_size = int((rows - window) * 0.8)
+    model = trading_ai.build_model((window, 4))
+    baseline_rss = _peak_rss_mb()
+
+    start = time.perf_counter()
+    if mode == 'arrays':
+        # The original trading_ai.py path: copy every window, then fit on arrays
+        X = np.array([scaled_data[i-window:i] for i in range(window, rows)])
+        y = scaled_data[window:, 0]
+        model.fit(X[:train_size], y[:train_size], epochs=epochs, batch_size=batch_size,
+                  validation_split=0.1, verbose=0)
+    else:
+        # train_model()'s default (batches copied from window views) or its tf_data=True path
+        trading_ai.train_model(model, scaled_data, train_size, window, epochs, batch_size, verbose=0,
+                               tf_data=mode == 'tf.data')
+    elapsed = time.perf_counter() - start
+
+    queue.put({'mode': mode, 'samples_per_sec': train_size * 0.9 * epochs / elapsed,
+               'seconds': elapsed, 'peak_rss_mb': _peak_rss_mb(),
+               'pipeline_rss_mb': _peak_rss_mb() - baseline_rss})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tf.data input against array-based model.fit.")
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--window', type=int, default=60)
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    print(f"{'input':>8} {'samples/s':>10} {'seconds':>8} {'peak RSS MB':>12} {'growth MB':>10}")
+    for mode in ('arrays', 'views', 'tf.data'):
+        result = run_in_process(_benchmark_mode, mode, args.rows, args.window, args.epochs, args.batch_size)
+        print(f"{result['mode']:>8} {result['samples_per_sec']:>10.0f} {result['seconds']:>8.1f} "
+              f"{result['peak_rss_mb']:>12.0f} {result['pipeline_rss_mb']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
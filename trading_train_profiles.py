@@ -0,0 +1,148 @@
+# CPU training profiles for the trading_ai.py LSTM
+#
+# model.fit() normally runs with TensorFlow's defaults: thread pools sized by
+# TensorFlow itself, no XLA, float32 everywhere. A profile picks those
+# settings explicitly:
+#
+#   default    TensorFlow defaults (what trading_ai.py did before)
+#   threads    intra-op threads = cores, inter-op threads = 2
+#   xla        threads + jit_compile=True, so each train step is compiled
+#              into fused XLA kernels instead of running op by op
+#   bf16       threads + mixed_bfloat16: bfloat16 compute, float32 weights.
+#              Only fast on CPUs with native bf16 (AVX512_BF16 / AMX); on
+#              other CPUs the profile keeps float32 and says so.
+#   xla-bf16   both
+#
+# Threading can only be set before TensorFlow runs its first op, so
+# apply_profile() has to come first (trading_ai.py --train-profile does it
+# at startup). The output layer always computes in float32, so predictions
+# and the loss keep full precision under mixed precision.
+#
+# Run this file to compare the profiles on a fixed synthetic dataset, each
+# in a fresh process with the same seed:
+#   python trading_train_profiles.py --rows 5000 --epochs 4
+
+import argparse
+import json
+import os
+import time
+
+from trading_profiling import run_in_process
+
+PROFILES = {
+    'default': {},
+    'threads': {'threads': True},
+    'xla': {'threads': True, 'jit_compile': True},
+    'bf16': {'threads': True, 'mixed_precision': 'mixed_bfloat16'},
+    'xla-bf16': {'threads': True, 'jit_compile': True, 'mixed_precision': 'mixed_bfloat16'},
+}
+
+
+def cpu_supports_bfloat16():
+    # Native bf16 arithmetic; without it TensorFlow emulates bf16 and gets slower
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return ' avx512_bf16' in flags or ' amx_bf16' in flags
+
+
+def apply_profile(name):
+    """Configure TensorFlow for a profile; returns the settings actually applied.
+
+    Call before anything runs on TensorFlow. Returns a dict with 'profile',
+    'intra_op', 'inter_op', 'jit_compile' and 'precision' (plus 'note' when
+    something couldn't be applied). Pass jit_compile on to build_model().
+    """
+    import tensorflow as tf
+
+    options = PROFILES[name]
+    applied = {'profile': name, 'intra_op': None, 'inter_op': None,
+               'jit_compile': bool(options.get('jit_compile')), 'precision': 'float32'}
+    if options.get('threads'):
+        cores = os.cpu_count() or 1
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(cores)
+            tf.config.threading.set_inter_op_parallelism_threads(2)
+            applied.update(intra_op=cores, inter_op=2)
+        except RuntimeError:
+            applied['note'] = "TensorFlow was already initialised; thread settings unchanged"
+
+    policy = options.get('mixed_precision')
+    if policy:
+        if cpu_supports_bfloat16():
+            tf.keras.mixed_precision.set_global_policy(policy)
+            applied['precision'] = policy
+        else:
+            applied['note'] = "CPU has no native bfloat16; training stays in float32"
+    return applied
+
+
+def _synthetic_features(rows):
+    # The same scaled feature matrix in every process: seeded random walk -> indicators -> MinMaxScaler
+    import pandas as pd
+    import trading_ai
+    from trading_data import SyntheticSource
+
+    days = pd.bdate_range(end='2020-01-01', periods=rows)
+    df = SyntheticSource(seed=42).fetch('BENCH', days[0], days[-1] + pd.Timedelta(days=1))
+    data = trading_ai.add_indicators(df)
+    _, scaled_data, X, _ = trading_ai.preprocess(data, trading_ai.PREDICTION_DAYS)
+    return scaled_data, int(len(X) * 0.8)
+
+
+def _benchmark_profile(name, rows, epochs, batch_size, seed, queue):
+    # Runs in a fresh process: thread pools and the precision policy are process-wide
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    applied = apply_profile(name)
+    import tensorflow as tf
+    import trading_ai
+
+    class EpochTimer(tf.keras.callbacks.Callback):
+        def on_epoch_begin(self, epoch, logs=None):
+            self.started = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            times.append(time.perf_counter() - self.started)
+
+    times = []
+    tf.keras.utils.set_random_seed(seed)
+    scaled_data, train_size = _synthetic_features(rows)
+    model = trading_ai.build_model((trading_ai.PREDICTION_DAYS, scaled_data.shape[1]),
+                                   jit_compile=applied['jit_compile'])
+    history = trading_ai.train_model(model, scaled_data, train_size, trading_ai.PREDICTION_DAYS, epochs,
+                                     batch_size, verbose=0, callbacks=[EpochTimer()], seed=seed)
+    queue.put(dict(applied, first_epoch_s=times[0],
+                   epoch_s=sum(times[1:]) / max(len(times) - 1, 1),
+                   val_loss=float(history.history['val_loss'][-1])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CPU training profiles on a fixed synthetic dataset.")
+    parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--epochs', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'profile':<10} {'threads':>8} {'precision':>15} {'1st epoch s':>12} {'epoch s':>8} {'val_loss':>10}")
+    for name in args.profiles:
+        result = run_in_process(_benchmark_profile, name, args.rows, args.epochs, args.batch_size, args.seed)
+        results.append(result)
+        threads = f"{result['intra_op']}/{result['inter_op']}" if result['intra_op'] else 'auto'
+        print(f"{name:<10} {threads:>8} {result['precision']:>15} {result['first_epoch_s']:>12.2f} "
+              f"{result['epoch_s']:>8.2f} {result['val_loss']:>10.2e}" + (f"  ({result['note']})" if 'note' in result else ''))
+    print("'1st epoch' includes graph tracing and XLA compilation; 'epoch' is the mean of the rest.")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'rows': args.rows, 'epochs': args.epochs, 'batch_size': args.batch_size,
+                       'seed': args.seed, 'cpu_count': os.cpu_count(), 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Sliding-window dataset builder for trading_ai.py
+#
+# The original loop in trading_ai.py copies every PREDICTION_DAYS-long window
+# into a Python list and then into one big array, so X ends up roughly
+# PREDICTION_DAYS times the size of scaled_data. The helpers below hand out
+# strided views over scaled_data instead and only copy one batch at a time
+# when feeding the model.
+#
+# Run this file directly for a memory/time benchmark against the old loop:
+#   python trading_windows.py
+
+import math
+import time
+import tracemalloc
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def sliding_windows(data, window, target_col=0):
+    """Return (X, y) for an LSTM as zero-copy views over `data`.
+
+    X[k] == data[k:k+window] and y[k] == data[k+window, target_col], exactly
+    the samples the original `for i in range(window, len(data))` loop builds.
+    X has shape (samples, window, features) and is read-only.
+    """
+    data = np.asarray(data)
+    if data.ndim != 2:
+        raise ValueError(f"Expected a 2D (rows, features) array, got shape {data.shape}")
+    if len(data) <= window:
+        raise ValueError(f"Need more than {window} rows to build windows, got {len(data)}")
+
+    # sliding_window_view puts the window axis last: (rows - window + 1, features, window).
+    # Drop the final window (it has no next-day target) and swap to (samples, window, features).
+    X = sliding_window_view(data, window, axis=0)[:-1].transpose(0, 2, 1)
+    y = data[window:, target_col]
+    return X, y
+
+
+def iter_window_batches(X, y=None, batch_size=32, shuffle=False, rng=None):
+    """Yield one epoch of (X_batch, y_batch) copies taken from window views.
+
+    With y=None only X batches are yielded (for prediction).
+    """
+    n_samples = len(X)
+    if shuffle:
+        rng = rng if rng is not None else np.random.default_rng()
+        order = rng.permutation(n_samples)
+    for start in range(0, n_samples, batch_size):
+        if shuffle:
+            idx = np.sort(order[start:start + batch_size])
+        else:
+            idx = slice(start, start + batch_size)
+        X_batch = np.array(X[idx])
+        yield X_batch if y is None else (X_batch, np.array(y[idx]))
+
+
+def window_batches(X, y, batch_size=32, shuffle=True, seed=None):
+    """Endless batch generator for `model.fit(..., steps_per_epoch=...)`.
+
+    Reshuffles sample order every epoch, like fit() does for in-memory arrays.
+    """
+    rng = np.random.default_rng(seed)
+    while True:
+        yield from iter_window_batches(X, y, batch_size, shuffle=shuffle, rng=rng)
+
+
+def steps_for(n_samples, batch_size):
+    # Number of batches needed to cover n_samples once
+    return math.ceil(n_samples / batch_size)
+
+
+def predict_windows(model, X, batch_size=32):
+    # Predict batch by batch so the full test set is never materialized at once
+    outputs = [model.predict_on_batch(X_batch) for X_batch in iter_window_batches(X, batch_size=batch_size)]
+    return np.concatenate([np.asarray(out) for out in outputs]).reshape(-1, 1)
+
+
+def _legacy_windows(scaled_data, window):
+    # The original trading_ai.py loop, kept here only for the benchmark
+    X, y = [], []
+    for i in range(window, len(scaled_data)):
+        X.append(scaled_data[i-window:i])
+        y.append(scaled_data[i, 0])
+    return np.array(X), np.array(y)
+
+
+def _measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+if __name__ == "__main__":
+    WINDOW = 60
+    FEATURES = 4
+    rng = np.random.default_rng(0)
+
+    print(f"{'rows':>10} {'loop s':>9} {'loop MB':>9} {'view s':>9} {'view MB':>9}")
+    for rows in (10_000, 50_000, 200_000):
+        scaled_data = rng.random((rows, FEATURES))
+
+        (X_old, y_old), old_time, old_peak = _measure(_legacy_windows, scaled_data, WINDOW)
+        (X_new, y_new), new_time, new_peak = _measure(sliding_windows, scaled_data, WINDOW)
+
+        # Same samples and targets, in the same order
+        assert X_old.shape == X_new.shape
+        assert np.array_equal(X_old, X_new) and np.array_equal(y_old, y_new)
+        del X_old, y_old
+
+        print(f"{rows:>10} {old_time:>9.3f} {old_peak / 1e6:>9.1f} "
+              f"{new_time:>9.5f} {new_peak / 1e6:>9.3f}")
+
+    # A shuffled training epoch only ever holds one batch plus its index permutation
+    batches = iter_window_batches(X_new, y_new, batch_size=32, shuffle=True)
+    (X_batch, y_batch), batch_time, batch_peak = _measure(next, batches)
+    print(f"First shuffled batch {X_batch.shape}: {batch_peak / 1e3:.1f} KB peak")